@@ -0,0 +1,140 @@
+"""Benchmark `polars_hopper.apply_many` against a serial loop, across thread counts.
+
+Builds `--frames` same-schema frames of `--rows` rows and a `HopperSpec` of
+`--exprs` expressions (alternating filters and addcols), then times:
+
+- `serial_s`: `spec.attach(df).hopper.apply_ready_exprs()` for each frame in a
+  Python loop;
+- `many_s`: `polars_hopper.apply_many(frames, spec)`, which runs every frame's
+  query together with `pl.collect_all`.
+
+Each thread count runs in a fresh process with `POLARS_MAX_THREADS` set, so the
+scaling of `many_s` across cores shows (the serial loop runs one query at a time,
+so only gains from the parallelism within each query). Results are printed and
+written as JSON (see `--output`). Run with:
+
+    just bench-many
+    just bench-many --frames 500 --rows 100000 --threads 1 2 4 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import polars as pl
+from suite import environment
+
+import polars_hopper
+from polars_hopper import HopperSpec
+
+
+def make_spec(exprs: int) -> HopperSpec:
+    """Return a spec of alternating filters and addcols, all applying."""
+    filters = [pl.col("c0") > -1 - i for i in range(0, exprs, 2)]
+    addcols = [(pl.col("c1") * i).alias(f"a{i}") for i in range(1, exprs, 2)]
+    return HopperSpec(filters=filters, addcols=addcols)
+
+
+def make_frames(frames: int, rows: int) -> list[pl.DataFrame]:
+    """Return `frames` frames of `rows` rows, with the same schema."""
+    return [
+        pl.select(
+            (pl.int_range(rows) + i).alias("c0"),
+            (pl.int_range(rows) % 1000).alias("c1"),
+        )
+        for i in range(frames)
+    ]
+
+
+def best_of(repeat: int, func) -> float:
+    """Return the best wall time of `repeat` calls to `func`."""
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def run_case(frames: int, rows: int, exprs: int, repeat: int) -> dict:
+    """Time the serial loop and `apply_many`, checking they give the same frames."""
+    spec = make_spec(exprs)
+    data = make_frames(frames, rows)
+    serial = [spec.attach(df).hopper.apply_ready_exprs() for df in data]
+    many = polars_hopper.apply_many(data, spec)
+    assert all(a.equals(b) for a, b in zip(serial, many))
+
+    serial_s = best_of(
+        repeat,
+        lambda: [spec.attach(df).hopper.apply_ready_exprs() for df in data],
+    )
+    many_s = best_of(repeat, lambda: polars_hopper.apply_many(data, spec))
+    return {
+        "threads": pl.thread_pool_size(),
+        "serial_s": serial_s,
+        "many_s": many_s,
+    }
+
+
+def _run_with_threads(threads: int, *args) -> dict:
+    """Run a case in a fresh process using `threads` Polars threads."""
+    os.environ["POLARS_MAX_THREADS"] = str(threads)
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        return pool.submit(run_case, *args).result()
+
+
+def main() -> None:
+    """Run the benchmark for each thread count and write the results as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--exprs", type=int, default=20)
+    parser.add_argument(
+        "--threads",
+        type=int,
+        nargs="+",
+        default=sorted({1, 2, 4, os.cpu_count() or 1}),
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--output",
+        type=Path,
+        help="JSON results file (default: benchmarks/results/many-<commit>.json)",
+    )
+    args = parser.parse_args()
+    env = environment()
+    case = {"frames": args.frames, "rows": args.rows, "exprs": args.exprs}
+
+    results = []
+    print(f"{'threads':>7} {'serial':>8} {'many':>8} {'speedup':>7}")
+    for threads in args.threads:
+        result = _run_with_threads(
+            threads,
+            args.frames,
+            args.rows,
+            args.exprs,
+            args.repeat,
+        )
+        result["speedup_x"] = result["serial_s"] / result["many_s"]
+        results.append({"case": case, **result})
+        print(
+            f"{result['threads']:>7} {result['serial_s']:>8.4f} "
+            f"{result['many_s']:>8.4f} {result['speedup_x']:>7.2f}",
+        )
+
+    default = f"many-{env['commit']}.json"
+    output = args.output or Path(__file__).parent / "results" / default
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({"environment": env, "results": results}, indent=2))
+    print(f"Wrote {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Compare two benchmark result files (from `benchmarks/suite.py`) case by case.
+
+Prints the new/old ratio of each hopper metric for the cases both files have,
+marking those slower (or bigger) than `--threshold`, and exits with status 1 if
+there are any. Run with:
+
+    just bench-compare benchmarks/results/abc1234.json benchmarks/results/def5678.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+
+METRICS = ["add_s", "apply_s", "parquet_s", "peak_rss_mb"]
+
+
+def load(path: Path) -> tuple[dict, dict[tuple, dict]]:
+    """Return a results file's environment, and its records keyed by case."""
+    data = json.loads(path.read_text())
+    records = {
+        tuple(sorted(record["case"].items())): record for record in data["results"]
+    }
+    return data["environment"], records
+
+
+def main() -> None:
+    """Print the ratios and exit non-zero on regressions."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("old", type=Path)
+    parser.add_argument("new", type=Path)
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.2,
+        help="new/old ratio above which a metric counts as a regression",
+    )
+    args = parser.parse_args()
+
+    old_env, old = load(args.old)
+    new_env, new = load(args.new)
+    print(f"old: {old_env['commit']} (polars {old_env['polars']})")
+    print(f"new: {new_env['commit']} (polars {new_env['polars']})")
+    print(f"{'case':<40} " + " ".join(f"{m:>12}" for m in METRICS))
+
+    regressions = 0
+    for key in old.keys() & new.keys():
+        cells = []
+        for metric in METRICS:
+            before = old[key]["hopper"].get(metric)
+            after = new[key]["hopper"].get(metric)
+            if not before or after is None:
+                cells.append(f"{'-':>12}")
+                continue
+            ratio = after / before
+            flag = "!" if ratio > args.threshold else " "
+            regressions += ratio > args.threshold
+            cells.append(f"{ratio:>11.2f}{flag}")
+        case = " ".join(f"{k}={v}" for k, v in key)
+        print(f"{case:<40} " + " ".join(cells))
+
+    if regressions:
+        print(f"{regressions} metric(s) regressed by more than {args.threshold}x")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
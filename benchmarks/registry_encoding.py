@@ -0,0 +1,170 @@
+"""Benchmark the registry encodings: JSON vs. Arrow IPC (binary expressions).
+
+For each number of registered expressions (a mix of comparisons, string
+functions, `is_in` against a list of `--values` literals, and addcols), reports
+per encoding:
+
+- `bytes`: the size of the encoded registry (`ExprRegistry.encode`);
+- `encode_s`: encoding the registry;
+- `decode_s`: decoding it and deserialising every expression;
+- `parquet_bytes`/`parquet_s`: the size of a 1k-row parquet file written with
+  `df.hopper.write_parquet`, and the time to write and read it back with
+  `polars_hopper.read_parquet` (JSON and zstd IPC only, needs pyarrow).
+
+Results are printed and written as JSON (see `--output`). Run with:
+
+    just bench-registry
+    just bench-registry --exprs 10 10000 --values 1000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import polars as pl
+from suite import HAS_PYARROW, environment
+
+import polars_hopper
+from polars_hopper.registry import ExprRegistry, RegistryEntry
+
+
+ENCODINGS = {
+    "json": {"format": "json"},
+    "ipc": {"format": "ipc", "compression": "uncompressed"},
+    "ipc_lz4": {"format": "ipc", "compression": "lz4"},
+    "ipc_zstd": {"format": "ipc", "compression": "zstd"},
+}
+PARQUET_FORMATS = {"json": {"format": "json"}, "ipc_zstd": {"format": "binary"}}
+
+
+def make_hopper(exprs: int, values: int) -> pl.DataFrame:
+    """Return a 1k-row frame with `exprs` pending expressions of mixed shapes."""
+    df = pl.DataFrame({"n": range(1000), "s": [str(i) for i in range(1000)]})
+    literals = [f"value-{i}" for i in range(values)]
+    filters, addcols = [], []
+    for i in range(exprs):
+        shape = i % 4
+        if shape == 0:
+            filters.append(pl.col("n") > -i)
+        elif shape == 1:
+            filters.append(pl.col("s").str.contains(f"^{i}") | (pl.col("n") >= 0))
+        elif shape == 2:
+            filters.append(pl.col("s").is_in(literals).not_())
+        else:
+            addcols.append((pl.col("n") * i + 1).alias(f"a{i}"))
+    df.hopper.add_filters(*filters)
+    df.hopper.add_addcols(*addcols)
+    return df
+
+
+def best_of(repeat: int, func, setup=lambda: None) -> tuple[float, object]:
+    """Return the best wall time of `repeat` calls to `func`, and its last result.
+
+    Each call is passed the result of an (untimed) call to `setup`.
+    """
+    times = []
+    for _ in range(repeat):
+        arg = setup()
+        t0 = time.perf_counter()
+        result = func(arg)
+        times.append(time.perf_counter() - t0)
+    return min(times), result
+
+
+def decode_all(encoded: str) -> int:
+    """Decode a registry and deserialise all its expressions."""
+    registry = ExprRegistry.decode(encoded)
+    return sum(len(registry.exprs(kind)) for kind in "fsa")
+
+
+def fresh_registry(registry: ExprRegistry) -> ExprRegistry:
+    """Return a copy of the registry holding only its live expressions."""
+    return ExprRegistry(
+        RegistryEntry.from_expr(entry.idx, entry.kind, entry.pl_expr)
+        for entry in registry
+    )
+
+
+def run_case(exprs: int, values: int, repeat: int) -> dict:
+    """Measure every encoding for one number of expressions."""
+    df = make_hopper(exprs, values)
+    registry = df.config_meta.get_metadata()["hopper_expr_register"]
+    result = {}
+    for name, options in ENCODINGS.items():
+        # A fresh copy each time, so no serialisation is reused between runs
+        encode_s, encoded = best_of(
+            repeat,
+            lambda fresh, options=options: fresh.encode(**options),
+            setup=lambda: fresh_registry(registry),
+        )
+        decode_s, _ = best_of(repeat, lambda _, encoded=encoded: decode_all(encoded))
+        result[name] = {
+            "bytes": len(encoded),
+            "encode_s": encode_s,
+            "decode_s": decode_s,
+        }
+
+    if HAS_PYARROW:
+        with tempfile.TemporaryDirectory() as tmp:
+            for name, options in PARQUET_FORMATS.items():
+                path = Path(tmp) / f"{name}.parquet"
+
+                def roundtrip(_, path=path, options=options):
+                    df.hopper.write_parquet(str(path), **options)
+                    return polars_hopper.read_parquet(path).hopper.list_filters()
+
+                parquet_s, _ = best_of(repeat, roundtrip)
+                result[name]["parquet_bytes"] = path.stat().st_size
+                result[name]["parquet_s"] = parquet_s
+    return result
+
+
+def main() -> None:
+    """Run the benchmark and write the results as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--exprs", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    parser.add_argument(
+        "--values",
+        type=int,
+        default=100,
+        help="number of literals in each is_in filter",
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--output",
+        type=Path,
+        help="JSON results file (default: benchmarks/results/registry-<commit>.json)",
+    )
+    args = parser.parse_args()
+    env = environment()
+
+    results = []
+    print(
+        f"{'exprs':>6} {'encoding':>9} {'bytes':>11} {'x json':>7} "
+        f"{'encode':>8} {'decode':>8} {'parquet':>8}",
+    )
+    for exprs in args.exprs:
+        result = run_case(exprs, args.values, args.repeat)
+        results.append({"exprs": exprs, "values": args.values, **result})
+        for name, metrics in result.items():
+            ratio = result["json"]["bytes"] / metrics["bytes"]
+            parquet_s = metrics.get("parquet_s")
+            print(
+                f"{exprs:>6} {name:>9} {metrics['bytes']:>11} {ratio:>7.1f} "
+                f"{metrics['encode_s']:>8.4f} {metrics['decode_s']:>8.4f} "
+                + (f"{parquet_s:>8.4f}" if parquet_s is not None else f"{'-':>8}"),
+            )
+
+    default = f"registry-{env['commit']}.json"
+    output = args.output or Path(__file__).parent / "results" / default
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({"environment": env, "results": results}, indent=2))
+    print(f"Wrote {output}")
+
+
+if __name__ == "__main__":
+    main()
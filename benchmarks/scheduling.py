@@ -0,0 +1,133 @@
+"""Benchmark the filters-first schedule against idx order, when addcols are costly.
+
+Builds a `--rows` frame whose hopper holds two costly addcols (a regex replace
+and a Python `map_elements`) registered before a cheap filter keeping a
+fraction `--keep` of the rows, then a filter on one of the new columns. For
+each schedule (`idx`, `filters_first`) reports:
+
+- `addcol_rows`: the rows the addcols were computed on (from `record_stats`);
+- `unfused_s`: `apply_ready_exprs(fuse=False, schedule=...)`, each step run
+  on its own;
+- `fused_s`: `apply_ready_exprs(schedule=...)`, the default single lazy query
+  (where Polars' predicate pushdown may already filter first).
+
+Results are printed and written as JSON (see `--output`). Run with:
+
+    just bench-schedule
+    just bench-schedule --rows 1000000 --keep 0.001 0.1
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+import polars as pl
+from suite import environment
+
+import polars_hopper
+
+
+SCHEDULES = ("idx", "filters_first")
+
+
+def make_hopper(data: pl.DataFrame, keep: float) -> pl.DataFrame:
+    """Return `data` with costly addcols registered ahead of a selective filter."""
+    df = data.clone()
+    df.hopper.add_addcols(
+        pl.col("s").str.replace(r"item-(\d+)", "id$1").alias("id"),
+        pl.col("s").map_elements(len, return_dtype=pl.Int64).alias("length"),
+    )
+    df.hopper.add_filters(pl.col("n") < int(df.height * keep), pl.col("length") > 0)
+    return df
+
+
+def best_of(repeat: int, func, setup) -> float:
+    """Return the best wall time of `repeat` calls to `func` on `setup()`'s result."""
+    times = []
+    for _ in range(repeat):
+        arg = setup()
+        t0 = time.perf_counter()
+        func(arg)
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def run_case(data: pl.DataFrame, keep: float, repeat: int) -> dict:
+    """Measure both schedules for one selectivity, checking the results match."""
+    result = {}
+    outputs = []
+    for schedule in SCHEDULES:
+        with polars_hopper.record_stats() as stats:
+            hopper = make_hopper(data, keep).hopper
+            outputs.append(hopper.apply_ready_exprs(schedule=schedule))
+        addcol_rows = sum(s.rows_in for s in stats.records if s.kind == "a")
+
+        def setup():
+            return make_hopper(data, keep)
+
+        unfused_s = best_of(
+            repeat,
+            lambda df, schedule=schedule: df.hopper.apply_ready_exprs(
+                fuse=False,
+                schedule=schedule,
+            ),
+            setup,
+        )
+        fused_s = best_of(
+            repeat,
+            lambda df, schedule=schedule: df.hopper.apply_ready_exprs(
+                schedule=schedule,
+            ),
+            setup,
+        )
+        result[schedule] = {
+            "addcol_rows": addcol_rows,
+            "unfused_s": unfused_s,
+            "fused_s": fused_s,
+        }
+    assert outputs[0].equals(outputs[1])
+    return result
+
+
+def main() -> None:
+    """Run the benchmark and write the results as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--keep", type=float, nargs="+", default=[0.01, 0.1, 0.5])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--output",
+        type=Path,
+        help="JSON results file (default: benchmarks/results/schedule-<commit>.json)",
+    )
+    args = parser.parse_args()
+    env = environment()
+
+    data = pl.DataFrame(
+        {"n": range(args.rows), "s": [f"item-{i}" for i in range(args.rows)]},
+    )
+    results = []
+    print(
+        f"{'keep':>5} {'schedule':>13} {'addcol_rows':>11} {'unfused':>8} {'fused':>8}",
+    )
+    for keep in args.keep:
+        result = run_case(data, keep, args.repeat)
+        results.append({"rows": args.rows, "keep": keep, **result})
+        for schedule, metrics in result.items():
+            print(
+                f"{keep:>5} {schedule:>13} {metrics['addcol_rows']:>11} "
+                f"{metrics['unfused_s']:>8.4f} {metrics['fused_s']:>8.4f}",
+            )
+
+    default = f"schedule-{env['commit']}.json"
+    output = args.output or Path(__file__).parent / "results" / default
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({"environment": env, "results": results}, indent=2))
+    print(f"Wrote {output}")
+
+
+if __name__ == "__main__":
+    main()
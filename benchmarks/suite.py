@@ -0,0 +1,315 @@
+"""Benchmark what the hopper costs on top of the same expressions in plain Polars.
+
+Each case builds a frame of `rows` rows and registers `exprs` expressions of a
+given kind mix, then times the hopper against a hand-written Polars baseline
+applying the same expressions in one lazy query:
+
+- `add_s`: registering the expressions (`add_filters`/`add_addcols`/...);
+- `apply_s`: `apply_ready_exprs()` vs. the baseline query;
+- `parquet_s`: writing the frame (with its pending hopper metadata) to parquet
+  and reading it back, vs. a plain `write_parquet`/`read_parquet` (needs pyarrow,
+  else null; if the hopper cannot write the frame, `parquet_error` says why);
+- `peak_rss_mb`: the peak resident memory of the process running the case.
+
+Each (case, variant) runs in a fresh process so peak memory is its own. Cases
+vary:
+
+- `exprs`: the number of expressions registered;
+- `rows`: the number of rows in the frame;
+- `mix`: the kinds of expression, "f" (filters), "a" (addcols), "fa" (both,
+  alternating) or "fas" (as "fa", with every 10th a select);
+- `depth`: the length of a cascade of addcols, each creating the column the next
+  one and a filter need, registered in reverse so each takes its own pass;
+- `pending`: the fraction of the expressions that stay pending (they reference
+  a column that never appears).
+
+The filters keep every row, so the frame size is the same for every expression.
+Results are printed and written as JSON (see `--output`), which
+`benchmarks/compare.py` compares across commits. Run with:
+
+    just bench                  # the quick grid
+    just bench --preset full    # 1 -> 10k exprs, 1k -> 50M rows
+    just bench --exprs 1000 --rows 1000 --pending 0.5
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+import polars as pl
+
+import polars_hopper
+
+
+try:
+    import pyarrow  # noqa: F401
+
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+
+PRESETS = {
+    "quick": {
+        "exprs": [1, 100, 1000],
+        "rows": [1_000, 100_000],
+        "mix": ["f", "fa"],
+        "depth": [0, 4],
+        "pending": [0.0],
+    },
+    "full": {
+        "exprs": [1, 10, 100, 1000, 10_000],
+        "rows": [1_000, 100_000, 1_000_000, 10_000_000, 50_000_000],
+        "mix": ["f", "a", "fa", "fas"],
+        "depth": [0, 4, 16],
+        "pending": [0.0, 0.5],
+    },
+}
+N_COLUMNS = 10
+
+
+def make_frame(rows: int) -> pl.DataFrame:
+    """Return a frame of `rows` rows and N_COLUMNS integer columns c0, c1, ..."""
+    return pl.select(
+        ((pl.int_range(rows) * (j + 1)) % 1000).alias(f"c{j}") for j in range(N_COLUMNS)
+    )
+
+
+def make_exprs(
+    exprs: int,
+    mix: str,
+    depth: int,
+    pending: float,
+) -> tuple[list[tuple[str, pl.Expr]], list[tuple[str, pl.Expr]]]:
+    """Return the (kind, expr) pairs to register, and the baseline's query steps.
+
+    The baseline applies the ready expressions in an order where each one's
+    columns already exist, as someone writing the query by hand would.
+    """
+    n_pending = round(exprs * pending)
+    hopper: list[tuple[str, pl.Expr]] = []
+    baseline: list[tuple[str, pl.Expr]] = []
+    for i in range(exprs):
+        if i < n_pending:
+            hopper.append(("f", pl.col("missing") > i))
+            continue
+        kind = mix[i % len(mix)] if mix != "fas" else "fa"[i % 2]
+        if mix == "fas" and i % 10 == 9:
+            kind = "s"
+        column = f"c{i % N_COLUMNS}"
+        if kind == "f":
+            expr = pl.col(column) > -1 - i
+        elif kind == "a":
+            expr = (pl.col(column) + i).alias(f"a{i}")
+        else:
+            expr = pl.all()
+        hopper.append((kind, expr))
+        baseline.append((kind, expr))
+
+    chain = [
+        (pl.col("c0") if k == 0 else pl.col(f"d{k - 1}")) + 1 for k in range(depth)
+    ]
+    for k in reversed(range(depth)):
+        hopper.append(("f", pl.col(f"d{k}") > -1))
+        hopper.append(("a", chain[k].alias(f"d{k}")))
+    for k in range(depth):
+        baseline.append(("a", chain[k].alias(f"d{k}")))
+        baseline.append(("f", pl.col(f"d{k}") > -1))
+    return hopper, baseline
+
+
+def register(df: pl.DataFrame, exprs: list[tuple[str, pl.Expr]]) -> None:
+    """Register the expressions on the frame's hopper, in order."""
+    add = {
+        "f": df.hopper.add_filters,
+        "s": df.hopper.add_selects,
+        "a": df.hopper.add_addcols,
+    }
+    for kind, group in itertools.groupby(exprs, key=lambda pair: pair[0]):
+        add[kind](*(expr for _, expr in group))
+
+
+def baseline_query(df: pl.DataFrame, steps: list[tuple[str, pl.Expr]]) -> pl.DataFrame:
+    """Apply the steps as one hand-written lazy query."""
+    lf = df.lazy()
+    for kind, expr in steps:
+        if kind == "f":
+            lf = lf.filter(expr)
+        elif kind == "s":
+            lf = lf.select(expr)
+        else:
+            lf = lf.with_columns(expr)
+    return lf.collect()
+
+
+def peak_rss_mb() -> float | None:
+    """Return the peak resident memory of this process in MB (None if unknown)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024**2 if sys.platform == "darwin" else 1024)
+
+
+def run_case(case: dict, variant: str, repeat: int) -> dict:
+    """Time one case for the "hopper" or "baseline" variant (best of `repeat`)."""
+    hopper_exprs, baseline_steps = make_exprs(
+        case["exprs"],
+        case["mix"],
+        case["depth"],
+        case["pending"],
+    )
+    add_s, apply_s, parquet_s = [], [], []
+    parquet_error = None
+    for _ in range(repeat):
+        df = make_frame(case["rows"])
+        with tempfile.TemporaryDirectory() as tmp:
+            path = str(Path(tmp) / "frame.parquet")
+            if variant == "hopper":
+                t0 = time.perf_counter()
+                register(df, hopper_exprs)
+                add_s.append(time.perf_counter() - t0)
+
+                if HAS_PYARROW and parquet_error is None:
+                    t0 = time.perf_counter()
+                    try:
+                        df.hopper.write_parquet(path)
+                        polars_hopper.read_parquet(path)
+                    except (TypeError, ValueError) as exc:
+                        parquet_error = f"{type(exc).__name__}: {exc}"
+                    else:
+                        parquet_s.append(time.perf_counter() - t0)
+
+                t0 = time.perf_counter()
+                out = df.hopper.apply_ready_exprs()
+                apply_s.append(time.perf_counter() - t0)
+            else:
+                if HAS_PYARROW:
+                    t0 = time.perf_counter()
+                    df.write_parquet(path)
+                    pl.read_parquet(path)
+                    parquet_s.append(time.perf_counter() - t0)
+
+                t0 = time.perf_counter()
+                out = baseline_query(df, baseline_steps)
+                apply_s.append(time.perf_counter() - t0)
+
+    result = {
+        "apply_s": min(apply_s),
+        "parquet_s": min(parquet_s, default=None),
+        "peak_rss_mb": peak_rss_mb(),
+        "out_shape": list(out.shape),
+    }
+    if variant == "hopper":
+        result["add_s"] = min(add_s)
+        if parquet_error is not None:
+            result["parquet_error"] = parquet_error
+        result["pending"] = sum(
+            len(exprs)
+            for exprs in (
+                out.hopper.list_filters(),
+                out.hopper.list_selects(),
+                out.hopper.list_addcols(),
+            )
+        )
+    return result
+
+
+def _run_isolated(case: dict, variant: str, repeat: int) -> dict:
+    """Run a case in a fresh process, so its peak memory is its own."""
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        return pool.submit(run_case, case, variant, repeat).result()
+
+
+def environment() -> dict:
+    """Describe the commit and environment the results come from."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "polars": pl.__version__,
+        "platform": platform.platform(),
+    }
+
+
+def main() -> None:
+    """Run the benchmark grid and write the results as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--preset", choices=PRESETS, default="quick")
+    parser.add_argument("--exprs", type=int, nargs="+")
+    parser.add_argument("--rows", type=int, nargs="+")
+    parser.add_argument("--mix", nargs="+", choices=["f", "a", "fa", "fas"])
+    parser.add_argument("--depth", type=int, nargs="+")
+    parser.add_argument("--pending", type=float, nargs="+")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--no-isolate",
+        action="store_true",
+        help="run all cases in this process (faster, but peak memory is shared)",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        help="JSON results file (default: benchmarks/results/<commit>.json)",
+    )
+    args = parser.parse_args()
+
+    grid = {
+        key: getattr(args, key) or values
+        for key, values in PRESETS[args.preset].items()
+    }
+    cases = [dict(zip(grid, values)) for values in itertools.product(*grid.values())]
+    env = environment()
+
+    results = []
+    header = f"{'exprs':>6} {'rows':>9} {'mix':>4} {'depth':>5} {'pending':>7}"
+    print(f"{header} {'add':>8} {'apply':>8} {'base':>8} {'x':>6} {'rss MB':>7}")
+    for case in cases:
+        record = {"case": case}
+        for variant in ("hopper", "baseline"):
+            if args.no_isolate:
+                record[variant] = run_case(case, variant, args.repeat)
+            else:
+                record[variant] = _run_isolated(case, variant, args.repeat)
+        hopper, baseline = record["hopper"], record["baseline"]
+        record["apply_overhead_x"] = hopper["apply_s"] / baseline["apply_s"]
+        results.append(record)
+        print(
+            f"{case['exprs']:>6} {case['rows']:>9} {case['mix']:>4} "
+            f"{case['depth']:>5} {case['pending']:>7} "
+            f"{hopper['add_s']:>8.4f} {hopper['apply_s']:>8.4f} "
+            f"{baseline['apply_s']:>8.4f} {record['apply_overhead_x']:>6.1f} "
+            f"{hopper['peak_rss_mb'] or float('nan'):>7.0f}",
+        )
+
+    output = args.output or Path(__file__).parent / "results" / f"{env['commit']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({"environment": env, "results": results}, indent=2))
+    print(f"Wrote {output}")
+
+
+if __name__ == "__main__":
+    main()
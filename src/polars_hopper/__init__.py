@@ -6,27 +6,76 @@ stored as metadata in `df.config_meta`. They apply themselves when the
 necessary columns exist, removing themselves once used.
 """
 
+from __future__ import annotations
+
+import base64
+import functools
 import io
+import re
+import threading
+import time
+import uuid
+from collections.abc import Callable, Iterable, Iterator, Mapping
+from pathlib import Path
 from typing import Literal, Union
 
 import polars as pl
 import polars_config_meta  # noqa: F401
-from polars.api import register_dataframe_namespace
+from polars.api import register_dataframe_namespace, register_lazyframe_namespace
+from polars_config_meta import read_parquet_with_meta, scan_parquet_with_meta
+
+from .instrument import (
+    ExprStats,
+    StatsRecorder,
+    add_listener,
+    emit,
+    listeners,
+    record_stats,
+    remove_listener,
+)
+from .lifetime import MemoryReport, memory_report, set_max_hoppers, track
+from .locking import hopper_lock, hopper_lock_key
+from .ordering import (
+    expr_cost,
+    hoist_filters,
+    is_row_separable,
+    order_filters,
+    push_down_filters,
+)
+from .pipeline import FanOut, Pipeline, StageStats, fan_out
+from .planner import (
+    Aggregation,
+    HopperPlan,
+    Join,
+    PlanBatch,
+    PlanStep,
+    Record,
+    aggregation,
+    apply_aggregation,
+    apply_join,
+    build_plan,
+    join,
+    record_expr,
+    record_id,
+)
+from .registry import ExprRegistry, RegistryEntry, reg_schema
+from .spec import HopperSpec
+from .streaming import check_streamable, iter_source_batches, peek_schema
 
 
-reg_schema = {
-    "idx": pl.Int64,
-    "kind": pl.String,  # 'f','s','a'
-    "expr": pl.String,  # JSON-serialized expression
-    "applied": pl.Boolean,  # whether we've successfully used it
-    "root_names": pl.List(pl.String),
-}
 hopper_reg_key = "hopper_expr_register"
 hopper_idx_key = "hopper_max_idx"
+hopper_version_key = "hopper_version"
+hopper_spec_key = "hopper_spec"
+hopper_auto_key = "hopper_auto"
+hopper_prune_key = "hopper_prune"
+hopper_records_key = "hopper_records"
 meta_key_lookup = {
     "f": "hopper_filters",
     "s": "hopper_selects",
     "a": "hopper_addcols",
+    "g": "hopper_aggregations",
+    "j": "hopper_joins",
 }
 debug = False
 
@@ -42,59 +91,140 @@ class HopperPlugin:
     """
 
     def __init__(self, df: pl.DataFrame):
-        """Ensure required metadata keys exist if not present."""
+        """Ensure required metadata keys exist if not present.
+
+        A hopper read back from parquet (see `read_parquet`) only has its registry:
+        the per-kind lists are then rebuilt from it when first needed (see
+        `_pending_exprs`), so that its expressions are not all deserialised up front.
+
+        The frame is tracked (see `polars_hopper.lifetime`), so its hopper state is
+        released with it, and counts towards any `set_max_hoppers` bound (every read
+        of its hopper state marks it as recently used).
+        """
         self._df = df
+        track(df)
         meta = df.config_meta.get_metadata()
+        hopper_lock(meta)
 
-        if "hopper_filters" not in meta:
-            meta["hopper_filters"] = []
-        if "hopper_selects" not in meta:
-            meta["hopper_selects"] = []
-        if "hopper_addcols" not in meta:
-            meta["hopper_addcols"] = []
+        if hopper_reg_key not in meta:
+            for key in meta_key_lookup.values():
+                if key not in meta:
+                    meta[key] = []
 
         df.config_meta.update(meta)
 
+    def _lock(self) -> threading.RLock:
+        """Return the lock of this frame's hopper state (see `polars_hopper.locking`)."""
+        return hopper_lock(self._df.config_meta.get_metadata())
+
+    def _pending_exprs(self, kind: str) -> list[pl.Expr]:
+        """Return the metadata list of pending expressions of one kind.
+
+        If the list is absent (the hopper was read back from parquet), it is
+        rebuilt from the registry, deserialising that kind's expressions.
+        """
+        track(self._df)
+        with self._lock():
+            meta = self._df.config_meta.get_metadata()
+            key = meta_key_lookup[kind]
+            if key not in meta:
+                registry = self._get_expr_registry()
+                meta[key] = [] if registry is None else registry.exprs(kind)
+            return meta[key]
+
     # -------------------------------------------------------------------------
     # Expression registration
     # -------------------------------------------------------------------------
+    def _get_expr_registry(self) -> ExprRegistry | None:
+        """Return the live registry from self._df.config_meta (None if absent).
+
+        A registry persisted as a string (JSON or base64 Arrow IPC, e.g. read back
+        from a parquet file) is parsed once here and replaced by the live object in
+        the metadata.
+
+        The registry is shared with the frames this one was derived from (or to),
+        and may have been mutated by its owner since: if so, this frame gets a
+        snapshot of it at the version recorded in its own metadata.
+        """
+        track(self._df)
+        with self._lock():
+            meta = self._df.config_meta.get_metadata()
+            registry = meta.get(hopper_reg_key)
+            if isinstance(registry, str):
+                registry = ExprRegistry.decode(registry)
+                self._write_expr_registry(registry)
+            elif registry is not None:
+                version = meta.get(hopper_version_key, registry.version)
+                if version != registry.version:
+                    registry = registry.snapshot(version)
+                    self._write_expr_registry(registry)
+            return registry
+
+    def _claim_expr_registry(self) -> ExprRegistry:
+        """Return the registry for mutation, copying it if another DF owns it."""
+        registry = self._get_expr_registry()
+        if registry is None:
+            registry = ExprRegistry()
+        claimed = registry.claim(self._df)
+        if claimed is not registry:
+            self._write_expr_registry(claimed)
+        return claimed
+
     def _read_expr_registry(self) -> pl.DataFrame:
-        """Parse the NDJSON or JSON registry from self._df.config_meta.
+        """Return the registry as a Polars DataFrame.
 
-        Return a Polars DataFrame with columns: idx, kind, expr, applied, root_names.
+        Columns: idx, kind, expr, applied, root_names.
         If none present, return an empty DF with the same schema.
         """
-        meta = self._df.config_meta.get_metadata()
+        registry = self._get_expr_registry()
         return (
-            pl.read_json(meta[hopper_reg_key].encode(), schema=reg_schema)
-            if hopper_reg_key in meta
+            registry.to_frame()
+            if registry is not None
             else pl.DataFrame(schema=reg_schema)
         )
 
-    def _write_expr_registry(self, registry: pl.DataFrame) -> None:
-        """Store the given DF in self._df.config_meta as NDJSON/JSON under 'hopper_expr_register'."""
-        self._df.config_meta.update({hopper_reg_key: registry.write_json()})
+    def _write_expr_registry(self, registry: ExprRegistry | pl.DataFrame) -> None:
+        """Store the given registry in self._df.config_meta under 'hopper_expr_register'.
+
+        Its current version is stored alongside, under 'hopper_version': call this
+        again after mutating the registry, so this frame sees the mutations.
+        """
+        if isinstance(registry, pl.DataFrame):
+            registry = ExprRegistry.from_frame(registry)
+        self._df.config_meta.update(
+            {hopper_reg_key: registry, hopper_version_key: registry.version},
+        )
 
-    def _refresh_expr_registry(self) -> None:
-        """Refresh the given DF in self._df.config_meta as NDJSON/JSON under 'hopper_expr_register'."""
-        self._write_expr_registry(self._read_expr_registry())
+    @property
+    def version(self) -> int:
+        """The version of the hopper state this frame sees (0 if it has none).
 
-    def add_exprs(self, *exprs: pl.Expr, kind: Literal["f", "s", "a"]) -> None:
+        It increases with every expression added to or removed from the hopper, so
+        two frames sharing a registry and a version see the same expressions.
+        """
+        registry = self._get_expr_registry()
+        return 0 if registry is None else registry.version
+
+    def add_exprs(
+        self, *exprs: pl.Expr, kind: Literal["f", "s", "a", "g", "j"]
+    ) -> None:
         """Add one or more Polars expressions to the hopper.
 
-        We maintain a monotonically increasing `hopper_max_idx` and also serialise each
-        expression to JSON (using ``expr.meta.serialize(format="json")``) for
-        JSON-compatibility in expr registry metadata (stored in the
-        `hopper_expr_register` key).
+        We maintain a monotonically increasing `hopper_max_idx` and register each
+        expression in the expr registry metadata (stored in the `hopper_expr_register`
+        key) under its idx, along with its root names, output name and fingerprint (a
+        hash of its binary serialisation), so these are computed once per expression.
 
 
         Parameters
         ----------
-        kind : {'f', 's', 'a'}
+        kind : {'f', 's', 'a', 'g', 'j'}
             Specifies which list in metadata we update:
             - 'f' => hopper_filters
             - 's' => hopper_selects
             - 'a' => hopper_addcols
+            - 'g' => hopper_aggregations (see `add_aggregations`)
+            - 'j' => hopper_joins (see `add_joins`)
         exprs : pl.Expr
             The actual Polars expressions to add.
 
@@ -102,99 +232,96 @@ class HopperPlugin:
         if not exprs:
             return
 
-        meta = self._df.config_meta.get_metadata()
-
-        # Ensure the correct list in metadata
-        hopper_kind_meta_key = {
-            "f": "hopper_filters",
-            "s": "hopper_selects",
-            "a": "hopper_addcols",
-        }[kind]
-
-        # Append expressions to the chosen list
-        kind_exprs = meta.get(hopper_kind_meta_key, [])
-        kind_exprs.extend(exprs)
-        meta[hopper_kind_meta_key] = kind_exprs
-
-        # Initialize hopper_max_idx to -1 if not already present
-        pre_idx = meta.get(hopper_idx_key, -1)
-        pre_reg = self._read_expr_registry()
-        # Increment hopper_max_idx for each newly added expression
-        post_idx = pre_idx + len(exprs)
-        registrands = [
-            {
-                "idx": expr_offset + pre_idx + 1,
-                "kind": kind,
-                "expr": expr.meta.serialize(format="json"),
-                "applied": False,
-                "root_names": expr.meta.root_names(),
-            }
-            for expr_offset, expr in enumerate(exprs)
-        ]
-        registry = pl.concat(
-            [pre_reg, pl.DataFrame(registrands, schema=reg_schema)],
-        )
-        self._write_expr_registry(registry)
-        meta[hopper_idx_key] = post_idx
+        # Compute the entries' static properties before taking the lock: only
+        # their idxs depend on the hopper state
+        entries = [RegistryEntry.from_expr(-1, kind, expr) for expr in exprs]
+        with self._lock():
+            meta = self._df.config_meta.get_metadata()
+
+            # Append expressions to (a copy of) the chosen list: the list itself may
+            # be shared with frames derived from this one
+            pending = [*self._pending_exprs(kind), *exprs]
+
+            # Initialize hopper_max_idx to -1 if not already present
+            pre_idx = meta.get(hopper_idx_key, -1)
+            registry = self._claim_expr_registry()
+            # Increment hopper_max_idx for each newly added expression
+            post_idx = pre_idx + len(exprs)
+            for expr_offset, entry in enumerate(entries):
+                entry.idx = expr_offset + pre_idx + 1
+                registry.append(entry)
+
+            # Write updated metadata back in one update, so that a frame derived
+            # meanwhile (which copies the metadata without the lock) sees the
+            # list and the registry either both before or both after the add
+            self._df.config_meta.update(
+                {
+                    meta_key_lookup[kind]: pending,
+                    hopper_reg_key: registry,
+                    hopper_idx_key: post_idx,
+                    hopper_version_key: registry.version,
+                },
+            )
 
-        # Write updated metadata back
-        self._df.config_meta.update(meta)
+    def use(self, spec: HopperSpec) -> None:
+        """Attach a `HopperSpec`: its expressions become this frame's hopper.
+
+        This stores references to the spec's precompiled registry, lists, records and plans,
+        so takes O(1) time whatever the number of expressions. Any hopper state the
+        frame already had is replaced.
+        """
+        track(self._df)
+        with self._lock():
+            self._df.config_meta.update(
+                {
+                    **{key: spec.lists[kind] for kind, key in meta_key_lookup.items()},
+                    hopper_reg_key: spec.registry,
+                    hopper_version_key: spec.registry.version,
+                    hopper_idx_key: spec.max_idx,
+                    hopper_records_key: spec.records,
+                    hopper_spec_key: spec,
+                    hopper_lock_key: spec.lock,
+                },
+            )
 
     def pop_expr_from_registry(self, expr: pl.Expr) -> bool:
         """Remove earliest row from 'hopper_expr_register' that matches given pl.Expr.
 
-        Do so by comparing JSON-serialised expressions.
+        Do so by comparing expression fingerprints.
 
         Returns
         -------
         True if a matching row was found and removed; False if no match was found.
 
         """
-        meta = self._df.config_meta.get_metadata()
-        hopper_reg_key = "hopper_expr_register"
+        with self._lock():
+            registry = self._get_expr_registry()
+            if registry is None:
+                return False  # No registry at all => nothing to remove
 
-        if hopper_reg_key not in meta:
-            return False  # No registry at all => nothing to remove
-
-        # 1) Convert the JSON string back into a DataFrame
-        reg_json = meta[hopper_reg_key].encode()
-        registry_df = pl.read_json(reg_json, schema=reg_schema)
-
-        # 2) Serialize the incoming expr
-        serialized_expr = expr.meta.serialize(format="json")
-
-        # 3) Find all rows whose 'expr' matches, e.g. ignoring 'applied' or 'kind'
-        #    If you want to consider 'kind' or only rows where 'applied'==False,
-        #    you can refine this filter accordingly.
-        matching = registry_df.filter(pl.col("expr") == serialized_expr).limit(1)
-
-        if matching.is_empty():
-            return False  # No match found => do nothing
-
-        # 4) Identify the earliest match by lowest idx
-        #    (If you prefer first added or first in insertion order, 'idx' is that.)
-        earliest_idx = matching["idx"].min()
-
-        # 5) Remove that row from the registry
-        updated_df = registry_df.filter(pl.col("idx") != earliest_idx)
+            match = registry.find(expr)
+            if match is None:
+                return False  # No match found => do nothing
 
-        # 6) Write the updated DF back to NDJSON
-        meta[hopper_reg_key] = updated_df.write_json()
-        self._df.config_meta.set(**meta)
-
-        return True
+            registry = self._claim_expr_registry()
+            registry.pop(match.idx)
+            self._write_expr_registry(registry)
+            return True
 
     def _apply_expression(
         self,
         df: pl.DataFrame,
         kind: str,
         expr: pl.Expr,
+        pushdown: Iterable[pl.Expr] = (),
     ) -> pl.DataFrame:
         """Apply the given expression to df depending on 'kind'.
 
         'f' => df.filter(expr)
         's' => df.select(expr)
         'a' => df.with_columns(expr)
+        'g' => df.group_by(keys).agg(aggs) (see `planner.apply_aggregation`)
+        'j' => df.join(other.filter(*pushdown), ...) (see `planner.apply_join`)
         """
         if kind == "f":
             return df.filter(expr)
@@ -202,42 +329,363 @@ class HopperPlugin:
             return df.select(expr)
         elif kind == "a":
             return df.with_columns(expr)
+        elif kind == "g":
+            return apply_aggregation(df, expr, self._records())
+        elif kind == "j":
+            return apply_join(df, expr, self._records(), pushdown)
         else:
             raise ValueError(f"Unknown expression kind '{kind}'")
 
-    def apply_ready_exprs(self, *kinds: Literal["f", "s", "a"]) -> pl.DataFrame:
-        """Apply any expressions of all kind(s), if the needed columns exist.
+    def _collect(self, lf: pl.LazyFrame) -> pl.DataFrame:
+        """Execute a lazy query built on self._df (the LazyFrame plugin returns it as is)."""
+        return lf.collect()
 
-          - Filters: we pop from the registry if the expression is successfully applied.
-          - Selects/Addcols: we do NOT remove from the registry (tests expect that logic).
+    def _execute_plan(
+        self,
+        plan: HopperPlan,
+        *,
+        fuse: bool,
+        df: pl.DataFrame | None = None,
+        columns: list[str] | None = None,
+    ) -> pl.DataFrame:
+        """Apply the plan's steps to self._df (or the given `df`), in order.
 
-        Each expression is tried in turn:
+        With `fuse`, the steps are chained on one lazy query and executed once, which
+        Polars optimises as a whole (e.g. consecutive filters become one predicate,
+        except where that would change the result, such as a filter that aggregates
+        over the frame), so the frame is scanned and gathered once. Otherwise each
+        step is applied in turn. Either way, each batch of independent addcols steps
+        (see `HopperPlan.batches`) is applied in a single `with_columns` call.
+
+        If `columns` are given, only those are kept at the end (which, in a fused
+        query, Polars projects as early as it can).
+        """
+        df = self._df if df is None else df
+        if listeners and isinstance(df, pl.DataFrame):
+            out = self._execute_plan_instrumented(plan, df)
+        elif fuse:
+            lf = self._apply_plan(df.lazy(), plan)
+            return self._collect(lf if columns is None else lf.select(columns))
+        else:
+            out = self._apply_plan(df, plan)
+        return out if columns is None else out.select(columns)
+
+    def _apply_plan(self, df: pl.DataFrame, plan: HopperPlan) -> pl.DataFrame:
+        """Apply the plan's batches to a DataFrame, or add them to a LazyFrame's query."""
+        for batch in plan.batches:
+            if debug:
+                print(f"Applying {batch}")
+            if batch.kind == "a":
+                df = df.with_columns(*batch.exprs)
+                if batch.reorder is not None:
+                    df = df.select(batch.reorder)
+            else:
+                for step in batch.steps:
+                    df = self._apply_expression(
+                        df, batch.kind, step.expr, step.pushdown
+                    )
+        return df
+
+    def _sample(self, n: int) -> pl.DataFrame:
+        """Return a random sample of at most `n` rows of self._df."""
+        if self._df.height <= n:
+            return self._df
+        return self._df.sample(n, seed=0)
+
+    def _plan_inputs(
+        self,
+        order: Literal["idx", "selectivity"],
+        schedule: Literal["idx", "filters_first"],
+    ) -> tuple[pl.Schema, dict[str, Record]]:
+        """Check the plan options, and read what planning needs, before locking.
+
+        Returns the frame's schema, and the records of its aggregations and joins
+        with stand-ins for the frames to join (see `_record_stand_ins`), as
+        resolving either may read a file or run a query.
+        """
+        if schedule not in ("idx", "filters_first"):
+            raise ValueError(f"Unknown schedule '{schedule}'")
+        if order not in ("idx", "selectivity"):
+            raise ValueError(f"Unknown filter order '{order}'")
+        return self._df.collect_schema(), _record_stand_ins(self._records())
+
+    def _build_plan(
+        self,
+        registry: ExprRegistry,
+        schema: pl.Schema,
+        kinds: tuple[str, ...],
+        order: Literal["idx", "selectivity"],
+        schedule: Literal["idx", "filters_first"],
+        records: dict[str, Record],
+    ) -> HopperPlan:
+        """Plan the ready expressions of `kinds`, scheduling filters as requested.
+
+        Called holding the hopper's lock, with what `_plan_inputs` read. Filters
+        are then ordered by selectivity (if asked) by `_order_plan`, without it.
+
+        A frame whose hopper is still exactly an attached `HopperSpec` reuses the
+        spec's plan for its schema (only in idx order, as a selectivity order is
+        chosen from each frame's own data).
+        """
+        spec = self._df.config_meta.get_metadata().get(hopper_spec_key)
+        if order == "idx" and spec is not None and spec.registry is registry:
+            return spec.plan(schema, kinds, schedule)
+        # Records added since the stand-ins were made
+        records = {**_record_stand_ins(self._records(), skip=records), **records}
+        plan = build_plan(registry, schema, kinds, records)
+        if records:
+            plan = push_down_filters(plan, records)
+        if schedule == "filters_first":
+            plan = hoist_filters(plan)
+        return plan
+
+    def _order_plan(
+        self,
+        plan: HopperPlan,
+        order: Literal["idx", "selectivity"],
+        sample_size: int,
+    ) -> HopperPlan:
+        """Order the plan's filters by selectivity, if asked, on a sample of the frame."""
+        if order == "selectivity" and sum(step.kind == "f" for step in plan) > 1:
+            plan = order_filters(plan, self._sample(sample_size), self._records())
+        return plan
+
+    def _execute_plan_instrumented(
+        self,
+        plan: HopperPlan,
+        df: pl.DataFrame,
+    ) -> pl.DataFrame:
+        """Apply the plan's steps one at a time, reporting each to the listeners.
+
+        Used instead of `_execute_plan`'s fused/batched execution while any
+        `instrument` listener is registered, so that every expression is timed and
+        measured on its own. The result is the same.
+        """
+        for step in plan:
+            rows_in, size_in = df.height, df.estimated_size()
+            start = time.perf_counter()
+            df = self._apply_expression(df, step.kind, step.expr, step.pushdown)
+            wall_s = time.perf_counter() - start
+            emit(
+                ExprStats(
+                    idx=step.idx,
+                    kind=step.kind,
+                    expr=str(step.expr),
+                    pass_no=step.pass_no,
+                    wall_s=wall_s,
+                    rows_in=rows_in,
+                    rows_out=df.height,
+                    size_in=size_in,
+                    size_out=df.estimated_size(),
+                ),
+            )
+        return df
+
+    def plan(
+        self,
+        *kinds: Literal["f", "s", "a", "g", "j"],
+        order: Literal["idx", "selectivity"] = "idx",
+        sample_size: int = 2000,
+        schedule: Literal["idx", "filters_first"] = "idx",
+    ) -> HopperPlan:
+        """Plan what applying the ready expressions of `kinds` would do, without doing it.
+
+        The plan is worked out from the schema alone, following cascades (e.g. an
+        addcols creating the column a pending filter needs), and lists the steps in
+        the order they would run, the dependencies between them, the idxs that would
+        stay pending, and the resulting schema. If no kinds are given, all are planned.
+
+        With `order="selectivity"`, the plan shows the filter order chosen by
+        `apply_ready_filters(order="selectivity")`, and the estimates behind it
+        (see `ordering.order_filters`). This evaluates the filters on a sample of
+        up to `sample_size` rows. With `schedule="filters_first"`, it shows the
+        filters moved ahead of the addcols they do not need (see
+        `apply_ready_exprs_kinds`).
+        """
+        schema, records = self._plan_inputs(order, schedule)
+        with self._lock():
+            registry = self._get_expr_registry()
+            if registry is None:
+                registry = ExprRegistry()
+            plan = self._build_plan(
+                registry,
+                schema,
+                kinds or tuple(meta_key_lookup),
+                order,
+                schedule,
+                records,
+            )
+        return self._order_plan(plan, order, sample_size)
+
+    def explain(
+        self,
+        *kinds: Literal["f", "s", "a", "g", "j"],
+        order: Literal["idx", "selectivity"] = "idx",
+        sample_size: int = 2000,
+        optimized: bool = True,
+        schedule: Literal["idx", "filters_first"] = "idx",
+    ) -> str:
+        """Describe what applying the ready expressions of `kinds` would do.
+
+        This is a dry run of `apply_ready_exprs_kinds` (all kinds if none are
+        given), from the registry and the current schema, leaving the hopper and
+        its metadata as they are. The report lists:
+
+          - the ready expressions, in the order they would apply, with the batch
+            and cascade pass each runs in, its static cost (see
+            `ordering.expr_cost`) and the steps it depends on;
+          - the expressions that would stay pending, and the columns they lack;
+          - the resulting schema;
+          - the Polars query plan the steps would run as (`LazyFrame.explain`,
+            optimized unless `optimized=False`).
+
+        With `order="selectivity"`, the filters are shown in the order chosen for
+        `apply_ready_filters(order="selectivity")`, with their estimated
+        selectivity (this evaluates them on a sample of `sample_size` rows), and
+        with `schedule="filters_first"`, in the order that schedule gives.
+        The same information is available as objects from `plan`.
+        """
+        kinds = kinds or tuple(meta_key_lookup)
+        registry = self._get_expr_registry() or ExprRegistry()
+        plan = self.plan(
+            *kinds,
+            order=order,
+            sample_size=sample_size,
+            schedule=schedule,
+        )
+
+        lines = [f"HOPPER PLAN: {len(plan)} ready, {len(plan.pending)} pending"]
+        if isinstance(self._df, pl.DataFrame):
+            lines.append(
+                f"input: {self._df.height} rows x {self._df.width} columns "
+                f"({self._df.estimated_size()} bytes)",
+            )
+
+        lines += ["", "READY (in order of application)"]
+        lines.append("  batch  pass  idx  kind   cost  selectivity  depends_on  expr")
+        for batch_no, batch in enumerate(plan.batches):
+            for step in batch.steps:
+                selectivity = (
+                    "-" if step.selectivity is None else f"{step.selectivity:.3f}"
+                )
+                depends_on = ",".join(map(str, step.depends_on)) or "-"
+                lines.append(
+                    f"  {batch_no:>5}  {step.pass_no:>4}  {step.idx:>3}  "
+                    f"{step.kind:>4}  {expr_cost(step.expr):>5}  {selectivity:>11}  "
+                    f"{depends_on:>10}  {step.expr}",
+                )
+
+        lines += ["", "PENDING"]
+        lines.append("  idx  kind  missing  expr")
+        for idx, missing in plan.blocked.items():
+            entry = registry.get(idx)
+            lines.append(
+                f"  {idx:>3}  {entry.kind:>4}  {','.join(missing):>7}  {entry.pl_expr}",
+            )
+
+        lines += ["", "RESULTING SCHEMA"]
+        lines += [f"  {name}: {dtype}" for name, dtype in plan.schema.items()]
+
+        query = self._apply_plan(self._df.lazy(), plan)
+        lines += ["", f"POLARS PLAN ({'optimized' if optimized else 'naive'})"]
+        lines.append(query.explain(optimized=optimized))
+        return "\n".join(lines)
+
+    def apply_ready_exprs(
+        self,
+        *kinds: Literal["f", "s", "a", "g", "j"],
+        fuse: bool = True,
+        order: Literal["idx", "selectivity"] = "idx",
+        sample_size: int = 2000,
+        schedule: Literal["idx", "filters_first"] = "idx",
+    ) -> pl.DataFrame:
+        """Apply any expressions of all kinds, if the needed columns exist.
+
+        Each expression applies as:
           - kind == 'f' => df.filter(expr)
           - kind == 's' => df.select(expr)
           - kind == 'a' => df.with_columns(expr)
-
-        If needed columns are missing, that expression remains pending. If we successfully
-        apply a filter expression (kind='f'), we call pop_expr_from_registry(expr).
-        The original code never used the registry for selects/addcols, so we skip it there.
+          - kind == 'g' => df.group_by(keys).agg(aggs) (see `add_aggregations`)
+          - kind == 'j' => df.join(other, ...) (see `add_joins`)
+
+        If needed columns are missing, that expression remains pending. The ready
+        ones, and those that become ready as others apply, are planned from the
+        schema in idx order (see `plan`) and applied in one go, and each applied
+        expression of any kind is popped from the registry and its pending list
+        (along with an aggregation's or join's record). Ready filters may run
+        before a join, or on the frame it joins with, where the result is the same
+        (see `add_joins`).
+
+        With `fuse=True` (the default), filters that become ready together are applied
+        in a single pass (see `apply_ready_exprs_kinds`), as are consecutive filters
+        with `order="selectivity"`, which reorders them by estimated cost. With
+        `schedule="filters_first"`, filters run before the addcols they do not need.
 
         Returns
         -------
-        A new (possibly transformed) DataFrame. If it differs from self._df,
-        polars-config-meta merges metadata automatically.
+        A new (possibly transformed) DataFrame, with the expressions still pending in
+        its metadata, or this frame if nothing was ready.
 
         """
-        return self.apply_ready_exprs_kinds("f", "s", "a")
+        return self.apply_ready_exprs_kinds(
+            "f",
+            "s",
+            "a",
+            "g",
+            "j",
+            fuse=fuse,
+            order=order,
+            sample_size=sample_size,
+            schedule=schedule,
+        )
 
-    def apply_ready_exprs_kinds(self, *kinds: Literal["f", "s", "a"]) -> pl.DataFrame:
+    def apply_ready_exprs_kinds(
+        self,
+        *kinds: Literal["f", "s", "a", "g", "j"],
+        fuse: bool = True,
+        order: Literal["idx", "selectivity"] = "idx",
+        sample_size: int = 2000,
+        schedule: Literal["idx", "filters_first"] = "idx",
+    ) -> pl.DataFrame:
         """Apply any expressions of the specified kind(s), if the needed columns exist.
 
         Each expression is tried in turn:
           - kind == 'f' => df.filter(expr)
           - kind == 's' => df.select(expr)
           - kind == 'a' => df.with_columns(expr)
+          - kind == 'g' => df.group_by(keys).agg(aggs) (see `add_aggregations`)
+          - kind == 'j' => df.join(other, ...) (see `add_joins`)
 
         If needed columns are missing, that expression remains pending. If we successfully
-        apply an expression, we call pop_expr_from_registry(expr).
+        apply an expression, we pop it from the registry.
+
+        Expressions that become ready as others apply (e.g. a filter on a column that
+        an addcols creates) cascade within the same call. The whole cascade is first
+        planned from the schema (see `plan`), using the registry's column ->
+        expression index so that only expressions depending on changed columns are
+        re-checked, and then executed once.
+
+        If `fuse` is True, the planned steps run as a single lazy query, so the ready
+        filters are applied together as one fused predicate where possible, and the
+        frame is filtered once rather than once per filter. The result is the same as
+        applying them one by one.
+
+        With `order="idx"` (the default), filters apply in registry order. With
+        `order="selectivity"`, each run of consecutive row-separable filters is
+        reordered to remove the most rows per unit of cost first, estimated from a
+        sample of up to `sample_size` rows (see `ordering.order_filters`; inspect
+        the chosen order with `plan(order="selectivity")`). The filters are then
+        applied one at a time rather than fused, so that the costly ones only see
+        the rows the cheap ones kept. The result is the same either way.
+
+        With `schedule="idx"` (the default), steps run in the order above. With
+        `schedule="filters_first"`, each ready filter runs ahead of the addcols
+        before it that it does not read from, as long as they compute each row
+        from that row alone (see `ordering.hoist_filters`), so that expensive
+        addcols (e.g. regexes or `map_elements`) only run on the rows the filters
+        keep. The result is the same. (A fused query gets this from Polars'
+        predicate pushdown too; the schedule also makes it hold when unfused, with
+        `order="selectivity"` or with stats listeners, and shows it in `plan`.)
 
         Returns
         -------
@@ -247,91 +695,190 @@ class HopperPlugin:
         """
         if not kinds:
             raise ValueError(
-                "No expression kinds specified. Provide at least one of 'f','s','a'.",
+                "No expression kinds specified. "
+                "Provide at least one of 'f','s','a','g','j'.",
             )
 
-        # We'll apply them in the order the user specified
-        new_df = self._df
-
-        while True:
-            registry = self._read_expr_registry()
-            candidates = registry.filter(pl.col("kind").is_in(kinds)).sort("idx")
-
-            if candidates.is_empty():
-                break
-
-            # Which metadata key do we read/write (hopper_filters, hopper_selects, or hopper_addcols)?
+        # Plan the whole cascade from the schema and consume it from the registry
+        # (atomically), then execute it once
+        taken = self._take_plan(kinds, order, sample_size, schedule)
+        if taken is None:
+            return self._df
+        plan, pending, columns = taken
+
+        # A fused predicate evaluates every filter on every row, whatever the order
+        new_df = self._execute_plan(
+            plan,
+            fuse=fuse and order == "idx",
+            columns=columns,
+        )
+        if id(new_df) != id(self._df):
+            new_df.config_meta.update(pending)
+        return new_df
 
-            meta_pre = self._df.config_meta.get_metadata()
+    def _take_plan(
+        self,
+        kinds: tuple[str, ...],
+        order: Literal["idx", "selectivity"] = "idx",
+        sample_size: int = 2000,
+        schedule: Literal["idx", "filters_first"] = "idx",
+    ) -> tuple[HopperPlan, dict, list[str] | None] | None:
+        """Plan the ready `kinds` and consume them from the registry, atomically.
+
+        Returns the plan, the metadata to set on the frame it produces (see
+        `_consume_plan`), and the columns to keep under `auto_prune` (None to keep
+        them all), or None if there is nothing to do. Only planning and consuming
+        take the hopper's lock (see `_build_plan`).
+        """
+        schema, records = self._plan_inputs(order, schedule)
+        with self._lock():
+            registry = self._get_expr_registry()
+            if registry is None:
+                return None
+            plan = self._build_plan(registry, schema, kinds, order, schedule, records)
+            pending = self._consume_plan(plan, kinds) if plan.steps else {}
+            columns = self._auto_pruned_columns(
+                plan.schema.names(),
+                pending.get(hopper_reg_key, registry),
+            )
+        if not plan.steps and columns is None:
+            return None
+        return self._order_plan(plan, order, sample_size), pending, columns
+
+    def _consume_plan(self, plan: HopperPlan, kinds: tuple[str, ...]) -> dict:
+        """Pop the plan's steps from the registry, and record what stays pending.
+
+        The frame's own metadata is updated, and the metadata to set on the frame
+        the plan produces is returned: the pending lists (those the frame has: lists
+        not yet rebuilt from a registry read from parquet stay that way), the
+        registry at its version right after the pops, and after an aggregation or
+        join, the records of those still pending.
+        """
+        with self._lock():
+            registry = self._claim_expr_registry()
+            for step in plan:
+                if registry.pop(step.idx) is None:
+                    raise ValueError(f"Inconsistent registry: {step.expr} not found")
+            self._write_expr_registry(registry)
+            meta = self._df.config_meta.get_metadata()
+            pending = {
+                meta_key_lookup[k]: registry.exprs(k)
+                for k in kinds
+                if meta_key_lookup[k] in meta
+            }
+            self._df.config_meta.update(pending)
+            if any(step.kind in ("g", "j") for step in plan):
+                # Let go of the applied records (and the frames they join with)
+                pending_ids = {
+                    record_id(e) for k in ("g", "j") for e in registry.exprs(k)
+                }
+                pending[hopper_records_key] = {
+                    rid: record
+                    for rid, record in self._records().items()
+                    if rid in pending_ids
+                }
+            return {
+                **pending,
+                hopper_reg_key: registry,
+                hopper_version_key: registry.version,
+            }
 
-            still_pending = {k: [] for k in kinds}
-            changed_any = False
+    # -------------------------------------------------------------------------
+    # Batch-by-batch application
+    # -------------------------------------------------------------------------
+    def apply_batches(
+        self,
+        source: pl.LazyFrame | pl.DataFrame | Iterable[pl.DataFrame] | None = None,
+        *,
+        batch_size: int = 100_000,
+    ) -> Iterator[pl.DataFrame]:
+        """Apply this hopper's ready expressions to `source`, one batch at a time.
+
+        The source is read batch by batch (see `streaming.iter_source_batches`): a
+        LazyFrame such as `pl.scan_csv(...)` is streamed in batches of about
+        `batch_size` rows, a DataFrame is sliced, and a `pl.read_csv_batched` reader
+        or any iterable of DataFrames is read as it comes. If no source is given,
+        this hopper's own frame is used.
+
+        The plan (see `plan`) is built once from the source's schema, and each
+        output batch carries the hopper metadata of the expressions left pending
+        (as if `apply_ready_exprs` had been called on the whole source). This
+        hopper itself is not modified.
+
+        Raises a ValueError up front if a ready expression aggregates or looks
+        across rows (e.g. a window or aggregate select), as it would see one batch
+        rather than the whole frame (see `streaming.check_streamable`).
+        """
+        source = self._df if source is None else source
+        batches = iter_source_batches(source, batch_size)
+        schema, batches = peek_schema(source, batches)
+        if schema is None:
+            return iter(())
+
+        records = _record_stand_ins(self._records())
+        with self._lock():
+            registry = self._get_expr_registry()
+            if registry is None:
+                registry = ExprRegistry()
+            records = {**_record_stand_ins(self._records(), skip=records), **records}
+            plan = build_plan(registry, schema, tuple(meta_key_lookup), records)
+            check_streamable(plan)
+
+            pending = registry.copy()
+            for step in plan:
+                pending.pop(step.idx)
+            own_meta = self._df.config_meta.get_metadata()
+            meta = {
+                key: pending.exprs(kind)
+                for kind, key in meta_key_lookup.items()
+                if key in own_meta
+            }
+            meta[hopper_reg_key] = pending
+            meta[hopper_version_key] = pending.version
+            meta[hopper_idx_key] = own_meta.get(hopper_idx_key, -1)
+        return self._apply_plan_batches(plan, batches, meta)
 
-            for row in candidates.iter_rows(named=True):
-                expr_str = row["expr"]
-                row_kind = row["kind"]
-                meta_key = meta_key_lookup[row_kind]
-                current_exprs = meta_pre.get(meta_key, [])
-                assert current_exprs, f"Registry is inconsistent with {meta_key}"
-                expr = next(
-                    (
-                        ck
-                        for ck in current_exprs
-                        if ck.meta.serialize(format="json") == expr_str
-                    ),
-                    None,
-                )
-                assert expr is not None, f"Registry is inconsistent with {meta_key}"
-                needed_cols = set(expr.meta.root_names())
-                # We'll track available columns after each expression is applied
-                avail_cols = set(new_df.collect_schema())
-                if needed_cols <= avail_cols:
-                    r0 = self._read_expr_registry()
-                    removed = self.pop_expr_from_registry(expr)
-                    if debug:
-                        print(f"Popped {expr}")
-                    assert removed, f"Expr {expr} was not popped from registry"
-                    r1 = self._read_expr_registry()
-                    assert (n_popped := len(r0) - len(r1)) == 1, (
-                        f"Registry popped {n_popped} items"
-                    )
-                    if not removed:
-                        raise ValueError(f"Inconsistent registry: {expr} not found")
-
-                    # Actually apply the expression
-                    new_df = self._apply_expression(new_df, row_kind, expr)
-                    changed_any = True
-                    # Update available columns in case columns changed
-                    avail_cols = set(new_df.collect_schema())
-                else:
-                    # Missing columns => keep it pending
-                    if debug:
-                        print(f"Appending {expr} to still_pending {row_kind}")
-                    still_pending[row_kind].append(expr)
-
-            # Update old DF's metadata list (filters/selects/addcols)
-            pending_updates = {meta_key_lookup[k]: p for k, p in still_pending.items()}
-            meta_pre.update(pending_updates)
-            self._df.config_meta.update(meta_pre)
-
-            if not changed_any:
-                break
-
-            # If new_df is indeed a new object, also update that DF's metadata
-            if id(new_df) != id(self._df):
-                self._refresh_expr_registry()
-                meta_post = new_df.config_meta.get_metadata()
-
-                pending_updates = {
-                    meta_key_lookup[k]: p for k, p in still_pending.items()
-                }
-                meta_post.update(pending_updates)
+    def _apply_plan_batches(
+        self,
+        plan: HopperPlan,
+        batches: Iterator[pl.DataFrame],
+        meta: dict,
+    ) -> Iterator[pl.DataFrame]:
+        """Yield each batch with the plan applied and the pending metadata set."""
+        for batch in batches:
+            out = self._execute_plan(plan, fuse=True, df=batch)
+            if isinstance(out, pl.LazyFrame):
+                out = out.collect()
+            out.config_meta.update(meta)
+            yield out
+
+    def apply_streaming(
+        self,
+        source: pl.LazyFrame | pl.DataFrame | Iterable[pl.DataFrame] | None,
+        sink: str | Path | Callable[[pl.DataFrame], object],
+        *,
+        batch_size: int = 100_000,
+    ) -> int:
+        """Apply the ready expressions to `source` batch by batch, writing to `sink`.
 
-                fresh_registry = self._df.config_meta.get_metadata()[hopper_reg_key]
-                meta_post[hopper_reg_key] = fresh_registry
-                new_df.config_meta.update(meta_post)
+        Each output batch of `apply_batches(source, batch_size=...)` is passed to
+        `sink` if it is a callable, or else written (with its hopper metadata, as
+        by `write_parquet`) to a numbered parquet file in the `sink` directory,
+        which can be read back with `pl.scan_parquet(f"{sink}/*.parquet")`. Only
+        one batch is held in memory at a time.
 
-        return new_df
+        Returns the number of rows written.
+        """
+        if not callable(sink):
+            Path(sink).mkdir(parents=True, exist_ok=True)
+        rows = 0
+        for part, out in enumerate(self.apply_batches(source, batch_size=batch_size)):
+            if callable(sink):
+                sink(out)
+            else:
+                out.hopper.write_parquet(str(Path(sink) / f"part-{part:05d}.parquet"))
+            rows += out.height
+        return rows
 
     # -------------------------------------------------------------------------
     # Filter storage and application
@@ -347,13 +894,22 @@ class HopperPlugin:
 
     def list_filters(self) -> list[pl.Expr]:
         """Return the list of pending Polars filter expressions."""
-        return self._df.config_meta.get_metadata().get("hopper_filters", [])
+        return self._pending_exprs("f")
 
-    def apply_ready_filters(self) -> pl.DataFrame:
+    def apply_ready_filters(
+        self,
+        fuse: bool = True,
+        order: Literal["idx", "selectivity"] = "idx",
+        sample_size: int = 2000,
+    ) -> pl.DataFrame:
         """Apply any stored filter expressions if referenced columns exist.
 
         Each expression is tried in turn with `df.filter(expr)`. If missing
-        columns, that expression remains pending for later.
+        columns, that expression remains pending for later. With `fuse=True`
+        (the default), all the ready filters are applied in a single pass.
+        With `order="selectivity"`, they are instead applied one by one, cheapest
+        and most selective first, as estimated on a sample of `sample_size` rows
+        (see `apply_ready_exprs_kinds`).
 
         Returns
         -------
@@ -361,7 +917,12 @@ class HopperPlugin:
         polars-config-meta merges metadata automatically.
 
         """
-        return self.apply_ready_exprs_kinds("f")
+        return self.apply_ready_exprs_kinds(
+            "f",
+            fuse=fuse,
+            order=order,
+            sample_size=sample_size,
+        )
 
     # -------------------------------------------------------------------------
     # Select storage and application
@@ -377,9 +938,9 @@ class HopperPlugin:
 
     def list_selects(self) -> list[pl.Expr]:
         """Return the list of pending Polars select expressions."""
-        return self._df.config_meta.get_metadata().get("hopper_selects", [])
+        return self._pending_exprs("s")
 
-    def apply_ready_selects(self) -> pl.DataFrame:
+    def apply_ready_selects(self, fuse: bool = True) -> pl.DataFrame:
         """Apply any stored select expressions if columns exist.
 
         We attempt each select expression in turn. Because `df.select(expr)`
@@ -393,7 +954,7 @@ class HopperPlugin:
         A new DataFrame with the successfully selected/transformed columns.
 
         """
-        return self.apply_ready_exprs_kinds("s")
+        return self.apply_ready_exprs_kinds("s", fuse=fuse)
 
     # -------------------------------------------------------------------------
     # With columns storage and application
@@ -409,9 +970,9 @@ class HopperPlugin:
 
     def list_addcols(self) -> list[pl.Expr]:
         """Return the list of pending Polars with_columns expressions."""
-        return self._df.config_meta.get_metadata().get("hopper_addcols", [])
+        return self._pending_exprs("a")
 
-    def apply_ready_addcols(self) -> pl.DataFrame:
+    def apply_ready_addcols(self, fuse: bool = True) -> pl.DataFrame:
         """Apply any stored with_columns expressions if columns exist.
 
         We attempt each with_columns expression in turn. Because `df.with_columns(expr)`
@@ -425,90 +986,223 @@ class HopperPlugin:
         A new DataFrame with the successfully added/overwritten columns.
 
         """
-        return self.apply_ready_exprs_kinds("a")
+        return self.apply_ready_exprs_kinds("a", fuse=fuse)
+
+    # -------------------------------------------------------------------------
+    # Aggregation storage and application
+    # -------------------------------------------------------------------------
+    def add_aggregations(
+        self,
+        by: str | pl.Expr | Iterable[str | pl.Expr],
+        aggs: pl.Expr | Iterable[pl.Expr],
+    ) -> None:
+        """Add a group-by aggregation to the hopper.
+
+        It applies as `df.group_by(by, maintain_order=True).agg(aggs)` as soon as
+        the key columns and the columns the aggregations read all exist, replacing
+        the frame with one row per group (so, like a select, it changes the
+        columns that later expressions see). Filters on the aggregated columns
+        (e.g. `pl.col("total") > 10`) then apply in the same cascade.
+        """
+        self._add_record(aggregation(by, aggs), kind="g")
+
+    def list_aggregations(self) -> list[pl.Expr]:
+        """Return the expressions registered for the pending aggregations.
+
+        Each is a struct of the keys and aggregations, named after the id of the
+        aggregation's record (see `planner.record_expr`).
+        """
+        return self._pending_exprs("g")
+
+    def apply_ready_aggregations(self, fuse: bool = True) -> pl.DataFrame:
+        """Apply any stored aggregations whose columns exist.
+
+        Returns
+        -------
+        A new DataFrame with one row per group of each applied aggregation.
+
+        """
+        return self.apply_ready_exprs_kinds("g", fuse=fuse)
+
+    # -------------------------------------------------------------------------
+    # Join storage and application
+    # -------------------------------------------------------------------------
+    def add_joins(
+        self,
+        other: pl.DataFrame | pl.LazyFrame,
+        on: str | pl.Expr | Iterable[str | pl.Expr],
+        how: Literal["inner", "left", "right", "full", "semi", "anti"] = "inner",
+    ) -> None:
+        """Add a join with `other` on the `on` keys to the hopper.
+
+        It applies as `df.join(other, on=on, how=how)` (keeping the rows' order) as
+        soon as the key columns exist, in idx order with the other expressions.
+        Where the result is the same, filters run before it instead, so that it
+        matches fewer rows (see `ordering.push_down_filters`): ready filters on the
+        frame's own columns that look at each row alone run ahead of an inner,
+        left, semi or anti join, and such filters on columns that only `other` has
+        (e.g. `pl.col("country") == "FR"` for a column the join brings in) are also
+        applied to `other` before an inner or right join. Those still apply after
+        the join, where they cascade.
+
+        `other` is held by reference (as a LazyFrame, which for a DataFrame copies
+        nothing), so pass a `pl.scan_parquet(...)` or similar to keep it out of
+        memory until the join runs. Only such a scan can be written to parquet
+        with the hopper (as its query plan): `write_parquet` refuses a pending
+        join with an in-memory frame.
+        """
+        self._add_record(join(other, on, how), kind="j")
+
+    def list_joins(self) -> list[pl.Expr]:
+        """Return the expressions registered for the pending joins.
+
+        Each is a struct of the join keys, named after the id of the join's record
+        (see `planner.record_expr`).
+        """
+        return self._pending_exprs("j")
+
+    def apply_ready_joins(self, fuse: bool = True) -> pl.DataFrame:
+        """Apply any stored joins whose key columns exist.
+
+        Returns
+        -------
+        A new DataFrame joined with the other side of each applied join.
+
+        """
+        return self.apply_ready_exprs_kinds("j", fuse=fuse)
+
+    def _add_record(self, record: Record, kind: Literal["g", "j"]) -> None:
+        """Store an aggregation or join record under a new id, and register it.
+
+        The records mapping is replaced rather than updated, as frames derived from
+        this one share it.
+        """
+        rid = uuid.uuid4().hex[:12]
+        with self._lock():
+            meta = self._df.config_meta.get_metadata()
+            records = {**meta.get(hopper_records_key, {}), rid: record}
+            self._df.config_meta.update({hopper_records_key: records})
+            self.add_exprs(record_expr(rid, record), kind=kind)
+
+    def _records(self) -> dict[str, Record]:
+        """Return the records of the hopper's aggregations and joins, by id."""
+        return self._df.config_meta.get_metadata().get(hopper_records_key, {})
 
     # -------------------------------------------------------------------------
     # Serialization override when writing parquet
     # -------------------------------------------------------------------------
+    def compact(
+        self,
+        format: Literal["json", "ipc"] = "ipc",
+        compression: Literal["uncompressed", "lz4", "zstd"] = "zstd",
+    ) -> None:
+        """Keep the hopper in the metadata encoded, rather than as live objects.
+
+        The registry is replaced by its `ExprRegistry.encode` string (by default
+        zstd-compressed Arrow IPC with binary expressions), and the per-kind lists
+        are dropped. Both are restored on first use, as for a hopper read back
+        from parquet, so a frame holding a large hopper it does not use yet costs
+        little memory. Other frames sharing the live registry are unaffected.
+        """
+        with self._lock():
+            registry = self._get_expr_registry()
+            if registry is None:
+                return
+            meta = self._df.config_meta.get_metadata()
+            meta[hopper_reg_key] = registry.encode(format, compression=compression)
+            for key in meta_key_lookup.values():
+                meta.pop(key, None)
+            self._df.config_meta.update(meta)
+
     def _write_parquet_plugin(
         self,
         file: str,
         *,
         format: Literal["binary", "json"] = "json",
+        registry_compression: Literal["uncompressed", "lz4", "zstd"] = "zstd",
         **kwargs,
     ) -> None:
         """Intercept df.config_meta.write_parquet(...).
 
         Steps:
-          1. Convert in-memory pl.Expr (both filters and selects)
-             to a safe storable format (json/binary).
-          2. Remove the original pl.Expr objects from their queues.
-          3. Call the real config_meta write_parquet.
-          4. Restore the original in-memory expressions after writing.
-        """
-        meta = self._df.config_meta.get_metadata()
-
-        # 1) Convert each filter expression
-        exprs_filters = meta.get("hopper_filters", [])
-        serialized_filters = [
-            expr.meta.serialize(format=format) for expr in exprs_filters
-        ]
-
-        # 1b) Convert each select expression
-        exprs_selects = meta.get("hopper_selects", [])
-        serialized_selects = [
-            expr.meta.serialize(format=format) for expr in exprs_selects
-        ]
-
-        # 2) Store them in side keys, remove original expression objects
-        meta["hopper_filters_serialised"] = (serialized_filters, format)
-        meta["hopper_filters"] = []
-        meta["hopper_selects_serialised"] = (serialized_selects, format)
-        meta["hopper_selects"] = []
-        self._df.config_meta.update(meta)
+          1. Under the hopper's lock, copy the metadata and snapshot the registry.
+          2. In the copy, convert the in-memory pl.Expr of every kind (filters,
+             selects, addcols, aggregations and joins) to a safe storable format
+             (json/binary), stored under `hopper_<kind>s_serialised` in place of
+             the lists, and the registry to JSON.
+          3. Call the real config_meta write_parquet on a copy of the frame (which
+             shares its data) holding the converted metadata.
+
+        The frame's own metadata is left as it is, and the lock is not held while
+        writing, so other threads can use the hopper meanwhile.
+
+        With `format="binary"`, the registry is instead stored as base64 Arrow IPC
+        with binary-serialised expressions, compressed with `registry_compression`
+        (see `ExprRegistry.to_ipc`), and the per-kind lists (which the registry
+        already holds) are not stored at all: a much smaller footer for large
+        hoppers, readable by the same Polars version. Without a registry, the
+        lists are stored as base64 binary expressions.
+
+        Read the file back with `polars_hopper.read_parquet` (or `scan_parquet`)
+        to restore the hopper.
+        """
+        # 1) Snapshot the state (the lists are replaced rather than mutated, and
+        # the registry snapshot holds the entries as they are now)
+        with self._lock():
+            meta = dict(self._df.config_meta.get_metadata())
+            registry = self._get_expr_registry()
+            if registry is not None:
+                registry = registry.snapshot()
+        binary = format == "binary"
+
+        # An attached spec is not persisted (the registry holds its expressions),
+        # nor is the lock
+        meta.pop(hopper_spec_key, None)
+        meta.pop(hopper_lock_key, None)
+
+        # 2) Convert each kind's expressions (reusing the registry's serialisations
+        # for lists not yet rebuilt from it)
+        for kind, key in meta_key_lookup.items():
+            exprs = meta.pop(key, None)
+            if binary and registry is not None:
+                continue
+            if exprs is not None:
+                serialised = [expr.meta.serialize(format=format) for expr in exprs]
+            elif registry is None:
+                serialised = []
+            else:
+                serialised = [entry.expr for entry in registry.entries(kind)]
+            if binary:
+                # The footer metadata is JSON, so bytes go in as base64 text
+                serialised = [base64.b64encode(item).decode() for item in serialised]
+            meta[f"{key}_serialised"] = (serialised, format)
+
+        # 2b) Persist the aggregation and join records (the frames to join as
+        # serialised query plans: for a scan, just the plan, not the data)
+        records = meta.pop(hopper_records_key, None)
+        if records is not None:
+            meta[f"{hopper_records_key}_serialised"] = (
+                {rid: _serialise_record(rec, format) for rid, rec in records.items()},
+                format,
+            )
+
+        # 2c) Persist the registry as a string
+        if registry is not None:
+            meta[hopper_reg_key] = registry.encode(
+                "ipc" if binary else "json",
+                compression=registry_compression,
+            )
 
         # 3) Actually write parquet using polars_config_meta's fallback
-        original_write_parquet = getattr(self._df.config_meta, "write_parquet", None)
+        out = self._df.clone()
+        out_meta = out.config_meta.get_metadata()
+        out_meta.clear()
+        out_meta.update(meta)
+        original_write_parquet = getattr(out.config_meta, "write_parquet", None)
         if original_write_parquet is None:
             raise AttributeError("No write_parquet found in df.config_meta.")
         original_write_parquet(file, **kwargs)
 
-        # 4) Restore the original in-memory expressions
-        meta_after = self._df.config_meta.get_metadata()
-        f_ser_data, f_ser_fmt = meta_after["hopper_filters_serialised"]
-        s_ser_data, s_ser_fmt = meta_after["hopper_selects_serialised"]
-
-        restored_filters = []
-        for item in f_ser_data:
-            if f_ser_fmt == "json":
-                restored_filters.append(
-                    pl.Expr.deserialize(io.StringIO(item), format="json"),
-                )
-            else:  # "binary"
-                restored_filters.append(
-                    pl.Expr.deserialize(io.BytesIO(item), format="binary"),
-                )
-
-        restored_selects = []
-        for item in s_ser_data:
-            if s_ser_fmt == "json":
-                restored_selects.append(
-                    pl.Expr.deserialize(io.StringIO(item), format="json"),
-                )
-            else:  # "binary"
-                restored_selects.append(
-                    pl.Expr.deserialize(io.BytesIO(item), format="binary"),
-                )
-
-        meta_after["hopper_filters"] = restored_filters
-        meta_after["hopper_selects"] = restored_selects
-
-        # Cleanup
-        del meta_after["hopper_filters_serialised"]
-        del meta_after["hopper_selects_serialised"]
-
-        self._df.config_meta.update(meta_after)
-
     def __getattr__(self, name: str):
         """Fallback for calls like df.hopper.select(...), etc.
 
@@ -518,11 +1212,379 @@ class HopperPlugin:
         if name == "write_parquet":
             return self._write_parquet_plugin
 
-        df_meta_attr = getattr(self._df.config_meta, name, None)
-        if df_meta_attr is not None:
-            return df_meta_attr
+        # The plugin's own methods (e.g. `update`) take precedence over the frame's
+        if hasattr(type(self._df.config_meta), name):
+            return getattr(self._df.config_meta, name)
+        attr = getattr(self._df, name, None)
+        if attr is None:
+            raise AttributeError(
+                f"Polars {type(self._df).__name__} has no attribute '{name}'",
+            )
+        if not callable(attr):
+            return attr
+
+        with self._lock():
+            kinds = self._df.config_meta.get_metadata().get(hopper_auto_key)
+        method = self._passing_metadata(attr)
+        if kinds:
+            return self._auto_applying(method, tuple(kinds))
+        return method
+
+    def _passing_metadata(self, method: Callable) -> Callable:
+        """Wrap a proxied method to give its result a copy of this frame's metadata.
+
+        The metadata is copied under the hopper's lock, so the result never sees
+        the hopper state halfway through an update from another thread.
+        """
+
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            with self._lock():
+                meta = dict(self._df.config_meta.get_metadata())
+            out = method(*args, **kwargs)
+            if (
+                isinstance(out, (pl.DataFrame, pl.LazyFrame, pl.Series))
+                and out is not self._df
+            ):
+                out.config_meta.clear_metadata()
+                out.config_meta.update(meta)
+            return out
+
+        return wrapper
+
+    # -------------------------------------------------------------------------
+    # Auto-apply mode
+    # -------------------------------------------------------------------------
+    def auto_apply(
+        self,
+        *kinds: Literal["f", "s", "a", "g", "j"],
+        enabled: bool = True,
+    ) -> None:
+        """Apply ready expressions automatically after proxied calls (opt-in).
+
+        Once enabled, a method called through the hopper (e.g.
+        `df.hopper.with_columns(...)`, `df.hopper.join(...)`) that returns a frame
+        with new columns which pending expressions of `kinds` (filters, if none
+        are given) need, returns it with its ready expressions of `kinds` applied,
+        as by `apply_ready_exprs_kinds`. A result with no new columns, or only new
+        columns nothing pending needs, is returned as is, without planning (and
+        without any schema check if the hopper is empty).
+
+        The setting is kept in the metadata, so frames derived from this one keep
+        it. Turn it off with `enabled=False`.
+        """
+        with self._lock():
+            meta = self._df.config_meta.get_metadata()
+            if enabled:
+                meta[hopper_auto_key] = list(kinds or ("f",))
+            else:
+                meta.pop(hopper_auto_key, None)
+            self._df.config_meta.update(meta)
+
+    def _auto_applying(self, method: Callable, kinds: tuple[str, ...]) -> Callable:
+        """Wrap a proxied method to auto-apply the ready `kinds` to its result."""
+
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            out = method(*args, **kwargs)
+            if isinstance(out, (pl.DataFrame, pl.LazyFrame)) and out is not self._df:
+                return self._auto_apply(out, kinds)
+            return out
+
+        return wrapper
+
+    def _auto_apply(
+        self,
+        out: pl.DataFrame | pl.LazyFrame,
+        kinds: tuple[str, ...],
+    ) -> pl.DataFrame | pl.LazyFrame:
+        """Apply `out`'s ready `kinds` if it gained columns they need."""
+        registry = out.hopper._get_expr_registry()
+        if registry is None or not len(registry):
+            return out
+        gained = set(out.collect_schema().names()).difference(
+            self._df.collect_schema().names(),
+        )
+        if not gained:
+            return out
+        with out.hopper._lock():
+            if not registry.waiting_on(gained, kinds):
+                return out
+        return out.hopper.apply_ready_exprs_kinds(*kinds)
+
+    # -------------------------------------------------------------------------
+    # Column pruning
+    # -------------------------------------------------------------------------
+    def needed_columns(self, keep: Iterable[str] = ()) -> list[str]:
+        """Return the frame's columns that pending expressions or `keep` need.
+
+        The columns are those read by any expression still in the hopper (their
+        root names), plus those listed in `keep`, in the frame's column order. If
+        a pending expression may read any column (e.g. one on `pl.all()`, a regex
+        or a selector), every column is needed.
+        """
+        columns = self._df.collect_schema().names()
+        with self._lock():
+            registry = self._get_expr_registry()
+            return _live_columns(columns, registry, keep)
+
+    def prune_columns(self, *, keep: Iterable[str]) -> pl.DataFrame:
+        """Drop the columns that no pending expression needs, except those in `keep`.
+
+        `keep` lists the columns wanted in the final output (names not in the
+        frame, e.g. ones a pending addcols will create, are ignored). On a wide
+        frame, this saves the memory of the dropped columns and the cost of
+        carrying them through later filters (see `needed_columns`). Returns the
+        frame as is if there is nothing to drop.
+        """
+        columns = self.needed_columns(keep)
+        if columns == self._df.collect_schema().names():
+            return self._df
+        return self._df.select(columns)
+
+    def auto_prune(self, keep: Iterable[str] = (), *, enabled: bool = True) -> None:
+        """Prune columns automatically whenever the hopper applies (opt-in).
+
+        Once enabled, every application of the hopper (`apply_ready_*`, and frames
+        applied by `apply_many`) also drops the columns that neither the
+        expressions left pending nor `keep` need, as by `prune_columns` (on a
+        LazyFrame, this projection is pushed down into the query). The setting is
+        kept in the metadata, so frames derived from this one keep it. Turn it off
+        with `enabled=False`.
+        """
+        with self._lock():
+            meta = self._df.config_meta.get_metadata()
+            if enabled:
+                meta[hopper_prune_key] = list(keep)
+            else:
+                meta.pop(hopper_prune_key, None)
+            self._df.config_meta.update(meta)
+
+    def _auto_pruned_columns(
+        self,
+        columns: list[str],
+        registry: ExprRegistry,
+    ) -> list[str] | None:
+        """Return the `columns` kept under `auto_prune` (None: no pruning needed)."""
+        keep = self._df.config_meta.get_metadata().get(hopper_prune_key)
+        if keep is None:
+            return None
+        live = _live_columns(columns, registry, keep)
+        return None if live == columns else live
+
+
+@register_lazyframe_namespace("hopper")
+class LazyHopperPlugin(HopperPlugin):
+    """Hopper plugin for LazyFrames, with the same API as on DataFrames.
+
+    Readiness is checked against the LazyFrame's `collect_schema()`, and ready
+    expressions are appended to the query plan rather than executed: the
+    `apply_ready_*` methods return a new LazyFrame and nothing runs until it is
+    collected (or sunk), so Polars can push the hopper's filters and projections
+    down into the scan. Expressions still pending stay in the hopper metadata,
+    and carry through to the DataFrame from `lf.hopper.collect()`.
+    """
+
+    def __init__(self, lf: pl.LazyFrame):
+        """Ensure required metadata keys exist if not present."""
+        super().__init__(lf)
+
+    def _collect(self, lf: pl.LazyFrame) -> pl.LazyFrame:
+        """Leave the query plan unexecuted."""
+        return lf
+
+    def _sample(self, n: int) -> pl.DataFrame:
+        """Return the first `n` rows of the query (the only part that is executed).
 
-        df_attr = getattr(self._df, name, None)
-        if df_attr is None:
-            raise AttributeError(f"Polars DataFrame has no attribute '{name}'")
-        return df_attr
+        Note that Polars' optimiser may still combine the ordered filters into one
+        predicate when the LazyFrame is collected.
+        """
+        return self._df.head(n).collect()
+
+
+def _record_stand_ins(
+    records: Mapping[str, Record],
+    skip: Iterable[str] = (),
+) -> dict[str, Record]:
+    """Return the records (except `skip`), joins with an empty frame to join.
+
+    Planning only needs the schema of the other side of each join, and resolving
+    it may read a file or run a query, so it is done before taking a hopper's
+    lock, and the plan is built against these stand-ins.
+    """
+    skip = set(skip)
+    return {
+        rid: (
+            record._replace(other=pl.LazyFrame(schema=record.other.collect_schema()))
+            if isinstance(record, Join)
+            else record
+        )
+        for rid, record in records.items()
+        if rid not in skip
+    }
+
+
+def _live_columns(
+    columns: list[str],
+    registry: ExprRegistry | None,
+    keep: Iterable[str],
+) -> list[str]:
+    """Return the `columns` read by the registry's expressions or listed in `keep`."""
+    needed = set() if registry is None else registry.needed_columns()
+    if needed is None:
+        return list(columns)
+    needed.update(keep)
+    return [name for name in columns if name in needed]
+
+
+# A node of a query plan reading an in-memory DataFrame, as `explain` shows it
+_IN_MEMORY_SCAN = re.compile(r"^\s*DF \[", re.MULTILINE)
+
+
+def _serialise(expr: pl.Expr, format: Literal["binary", "json"]) -> str:
+    """Serialise one expression as text, for `_deserialise` to read back."""
+    if format == "json":
+        return expr.meta.serialize(format="json")
+    return base64.b64encode(expr.meta.serialize(format="binary")).decode()
+
+
+def _serialise_record(record: Record, format: Literal["binary", "json"]) -> dict:
+    """Serialise an aggregation or join record, for `_deserialise_record`."""
+    if isinstance(record, Aggregation):
+        return {
+            "by": [_serialise(e, format) for e in record.by],
+            "aggs": [_serialise(e, format) for e in record.aggs],
+        }
+    if _IN_MEMORY_SCAN.search(record.other.explain(optimized=False)):
+        raise ValueError(
+            "Cannot write a pending join with an in-memory frame to parquet (its "
+            "data would be copied into the file's metadata): join with a scan "
+            "such as pl.scan_parquet(...), or apply the join first"
+        )
+    return {
+        "other": base64.b64encode(record.other.serialize()).decode(),
+        "on": [_serialise(e, format) for e in record.on],
+        "how": record.how,
+    }
+
+
+def _deserialise_record(item: dict, format: Literal["binary", "json"]) -> Record:
+    """Deserialise one record stored by `_write_parquet_plugin`."""
+    if "aggs" in item:
+        return Aggregation(
+            [_deserialise(e, format) for e in item["by"]],
+            [_deserialise(e, format) for e in item["aggs"]],
+        )
+    return Join(
+        pl.LazyFrame.deserialize(io.BytesIO(base64.b64decode(item["other"]))),
+        [_deserialise(e, format) for e in item["on"]],
+        item["how"],
+    )
+
+
+def _deserialise(item: str | bytes, format: Literal["binary", "json"]) -> pl.Expr:
+    """Deserialise one expression stored by `_write_parquet_plugin`."""
+    if format == "json":
+        return pl.Expr.deserialize(io.StringIO(item), format="json")
+    if isinstance(item, str):
+        item = base64.b64decode(item)
+    return pl.Expr.deserialize(io.BytesIO(item), format="binary")
+
+
+def _restore_hopper(frame: pl.DataFrame | pl.LazyFrame) -> None:
+    """Restore the hopper metadata of a frame read from a parquet file.
+
+    The registry (with `hopper_max_idx`) is kept as the string it was stored as: it
+    is parsed on first use, and each expression is only deserialised when it is
+    applied or listed. The per-kind lists are rebuilt from it on demand. A file
+    written without a registry has its lists deserialised up front instead.
+    """
+    meta = frame.config_meta.get_metadata()
+    stored = {
+        key: meta.pop(f"{key}_serialised", None) for key in meta_key_lookup.values()
+    }
+    for key, serialised in stored.items():
+        if hopper_reg_key in meta:
+            meta.pop(key, None)
+        elif serialised is not None:
+            items, format = serialised
+            meta[key] = [_deserialise(item, format) for item in items]
+    records = meta.pop(f"{hopper_records_key}_serialised", None)
+    if records is not None:
+        items, format = records
+        meta[hopper_records_key] = {
+            rid: _deserialise_record(item, format) for rid, item in items.items()
+        }
+    frame.config_meta.update(meta)
+
+
+def read_parquet(source: str | Path, **kwargs) -> pl.DataFrame:
+    """Read a parquet file written by `df.hopper.write_parquet`, with its hopper.
+
+    All expression kinds (filters, selects, addcols, aggregations and joins),
+    their records, the registry and `hopper_max_idx` are restored, lazily: nothing
+    is deserialised until it is needed (see `_restore_hopper`). A pending join is
+    stored as the query plan of the frame it joins with, so only one with a scan
+    (e.g. `pl.scan_parquet(...)`) can have been written: `write_parquet` refuses
+    a pending join with an in-memory frame. Keyword arguments go to
+    `pl.read_parquet`.
+    """
+    df = read_parquet_with_meta(str(source), **kwargs)
+    _restore_hopper(df)
+    return df
+
+
+def scan_parquet(source: str | Path, **kwargs) -> pl.LazyFrame:
+    """Scan a parquet file written by `df.hopper.write_parquet`, with its hopper.
+
+    As `read_parquet`, but returns a LazyFrame (see `LazyHopperPlugin`). Keyword
+    arguments go to `pl.scan_parquet`.
+    """
+    lf = scan_parquet_with_meta(str(source), **kwargs)
+    _restore_hopper(lf)
+    return lf
+
+
+def apply_many(
+    frames: Iterable[pl.DataFrame],
+    spec: HopperSpec | None = None,
+    *,
+    kinds: tuple[str, ...] = tuple(meta_key_lookup),
+) -> list[pl.DataFrame]:
+    """Apply the ready expressions of many DataFrames' hoppers, in parallel.
+
+    With `spec`, it is first attached to each frame (replacing its hopper, see
+    `HopperSpec.attach`), so frames of the same schema share one plan. Each frame's
+    plan is then added to a lazy query on it, and all the queries run together
+    with `pl.collect_all`, which executes them in parallel on Polars' thread pool.
+
+    Returns the frames in order, each as `df.hopper.apply_ready_exprs_kinds(*kinds)`
+    would (a frame with nothing to apply is returned as is), with the same
+    pending-expression metadata. While instrumentation listeners are registered,
+    the frames are applied one by one instead, so each expression is measured.
+    """
+    frames = list(frames)
+    if spec is not None:
+        for df in frames:
+            spec.attach(df)
+    if listeners:
+        return [df.hopper.apply_ready_exprs_kinds(*kinds) for df in frames]
+
+    results: list[pl.DataFrame] = list(frames)
+    planned: list[tuple[int, dict]] = []
+    queries: list[pl.LazyFrame] = []
+    for i, df in enumerate(frames):
+        hopper = df.hopper
+        taken = hopper._take_plan(kinds)
+        if taken is None:
+            continue
+        plan, pending, columns = taken
+        with hopper._lock():
+            planned.append((i, {**df.config_meta.get_metadata(), **pending}))
+        query = hopper._apply_plan(df.lazy(), plan)
+        queries.append(query if columns is None else query.select(columns))
+
+    for (i, meta), out in zip(planned, pl.collect_all(queries)):
+        out.config_meta.update(meta)
+        results[i] = out
+    return results
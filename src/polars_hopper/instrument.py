@@ -0,0 +1,114 @@
+"""Per-expression statistics for applied hopper expressions.
+
+Register a listener (any callable taking an `ExprStats`) with `add_listener`, or
+collect the stats of a block of code with `record_stats`:
+
+    with polars_hopper.record_stats() as stats:
+        df = df.hopper.apply_ready_exprs()
+    stats.to_frame()  # one row per applied expression
+
+While no listener is registered, applying a hopper is not instrumented at all.
+While any is, DataFrame hoppers apply their ready expressions one at a time (not
+fused into one query), so each can be timed and measured on its own. LazyFrame
+hoppers only add expressions to the query plan, so there is nothing to measure
+and no stats are reported (use `LazyFrame.profile()` instead).
+"""
+
+from __future__ import annotations
+
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from typing import NamedTuple
+
+import polars as pl
+
+
+class ExprStats(NamedTuple):
+    """Statistics of one applied hopper expression.
+
+    Attributes
+    ----------
+    idx
+        The registry idx of the expression.
+    kind
+        The kind of the expression ('f', 's', 'a', 'g' or 'j').
+    expr
+        The expression's repr.
+    pass_no
+        The cascade pass the expression was applied in (see `HopperPlan`).
+    wall_s
+        Wall time to apply the expression, in seconds.
+    rows_in, rows_out
+        The height of the frame before and after the expression.
+    size_in, size_out
+        The `estimated_size()` of the frame before and after, in bytes.
+
+    """
+
+    idx: int
+    kind: str
+    expr: str
+    pass_no: int
+    wall_s: float
+    rows_in: int
+    rows_out: int
+    size_in: int
+    size_out: int
+
+
+stats_schema = {
+    "idx": pl.Int64,
+    "kind": pl.String,
+    "expr": pl.String,
+    "pass_no": pl.Int64,
+    "wall_s": pl.Float64,
+    "rows_in": pl.Int64,
+    "rows_out": pl.Int64,
+    "size_in": pl.Int64,
+    "size_out": pl.Int64,
+}
+
+listeners: list[Callable[[ExprStats], object]] = []
+
+
+def add_listener(listener: Callable[[ExprStats], object]) -> None:
+    """Call `listener` with the `ExprStats` of every expression applied from now on."""
+    listeners.append(listener)
+
+
+def remove_listener(listener: Callable[[ExprStats], object]) -> None:
+    """Stop calling a listener added by `add_listener`."""
+    listeners.remove(listener)
+
+
+def emit(stats: ExprStats) -> None:
+    """Pass one expression's stats to every listener."""
+    for listener in list(listeners):
+        listener(stats)
+
+
+class StatsRecorder:
+    """A listener that keeps the stats it is given, for inspection."""
+
+    def __init__(self):
+        """Start with no stats recorded."""
+        self.records: list[ExprStats] = []
+
+    def __call__(self, stats: ExprStats) -> None:
+        """Record the stats of an applied expression."""
+        self.records.append(stats)
+
+    def to_frame(self) -> pl.DataFrame:
+        """Return the recorded stats as a DataFrame, one row per expression."""
+        return pl.DataFrame(self.records, schema=stats_schema, orient="row")
+
+
+@contextmanager
+def record_stats() -> Iterator[StatsRecorder]:
+    """Record the stats of the expressions applied within the `with` block."""
+    recorder = StatsRecorder()
+    add_listener(recorder)
+    try:
+        yield recorder
+    finally:
+        remove_listener(recorder)
@@ -0,0 +1,217 @@
+"""Lifetime of the hopper state held in frames' metadata.
+
+polars-config-meta keeps each frame's metadata in a global dict keyed by
+`id(frame)`. The hopper tracks every frame whose `.hopper` is used with a weak
+reference (and its metadata dict), in least-recently-used order, so that:
+
+- a frame's hopper state is released when the frame is garbage collected, and
+  a frame that reuses the `id` of a collected one not yet released does not
+  inherit its stale pending expressions;
+- `memory_report()` can tell how many tracked frames hold hopper state and
+  roughly how many bytes that state takes;
+- after `set_max_hoppers(n)`, at most `n` tracked frames keep their hopper
+  state: using the hopper of one more evicts that of the least recently used
+  (its pending expressions are dropped).
+
+Hopper state is every metadata key starting with "hopper_". Under a bound, the
+tracking has a lock of its own (see `_tracking`), never held while taking a
+hopper's lock (see `locking`): an evicted frame's state is dropped after
+releasing it, under that frame's lock. Unbounded, tracking takes no lock, so
+threads using different hoppers never wait on each other: each update of the
+tracked frames is a single dict operation, and if a frame collected in one
+thread is released as another thread tracks a new frame under its `id`, the new
+frame is at worst left untracked until its `.hopper` is next used.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import sys
+import threading
+import weakref
+from collections import OrderedDict
+from typing import NamedTuple
+
+import polars as pl
+
+from .locking import hopper_lock
+from .registry import ExprRegistry
+
+
+hopper_key_prefix = "hopper_"
+
+# id(frame) -> (weak reference to the frame, its metadata), least recently used first
+_tracked: OrderedDict[int, tuple[weakref.ref, dict]] = OrderedDict()
+max_hoppers: int | None = None
+evicted = 0
+# Reentrant: weakref callbacks releasing a collected frame may run in a thread
+# holding it
+_tracking_lock = threading.RLock()
+
+
+def _tracking(bound: int | None) -> contextlib.AbstractContextManager:
+    """Return the tracking lock under a `bound`, else a no-op context.
+
+    The lock keeps the least recently used order consistent with the evictions,
+    which only happen under a bound.
+    """
+    return _tracking_lock if bound is not None else contextlib.nullcontext()
+
+
+class MemoryReport(NamedTuple):
+    """The hopper state held in frames' metadata.
+
+    Attributes
+    ----------
+    live_hoppers
+        The number of live tracked frames (those whose `.hopper` has been used)
+        whose metadata holds hopper state.
+    tracked
+        The number of live tracked frames (see `set_max_hoppers`).
+    registries
+        The number of distinct expression registries they hold (shared by frames
+        derived from one another).
+    entries
+        The number of distinct registry entries held, including popped ones kept
+        for frames that may still see them.
+    bytes
+        The approximate bytes held: the serialised size of each entry (or of the
+        encoded registry, if not yet decoded), plus the per-kind lists.
+    max_hoppers
+        The bound set by `set_max_hoppers` (None if unbounded).
+    evicted
+        The number of frames whose hopper state has been evicted.
+
+    """
+
+    live_hoppers: int
+    tracked: int
+    registries: int
+    entries: int
+    bytes: int
+    max_hoppers: int | None
+    evicted: int
+
+
+def _hopper_keys(meta: dict) -> list[str]:
+    """Return the hopper state keys in a metadata dict."""
+    return [key for key in meta if key.startswith(hopper_key_prefix)]
+
+
+def _clear(meta: dict) -> None:
+    """Drop the hopper state from a metadata dict."""
+    for key in _hopper_keys(meta):
+        meta.pop(key, None)
+
+
+def _release(frame_id: int, ref: weakref.ref) -> None:
+    """Release the hopper state of a collected frame (a weakref callback)."""
+    with _tracking(max_hoppers):
+        tracked = _tracked.get(frame_id)
+        # Leave the metadata alone if a live frame now tracks the id
+        if tracked is None or tracked[0] is not ref:
+            return
+        _tracked.pop(frame_id, None)
+        _clear(tracked[1])
+
+
+def track(frame: pl.DataFrame | pl.LazyFrame) -> None:
+    """Track a frame whose hopper is being used, evicting over `max_hoppers`."""
+    frame_id = id(frame)
+    bound = max_hoppers
+    with _tracking(bound):
+        tracked = _tracked.get(frame_id)
+        meta = frame.config_meta.get_metadata()
+        if tracked is not None and tracked[0]() is frame:
+            # The frame's metadata dict is replaced if its metadata is cleared
+            _tracked[frame_id] = (tracked[0], meta)
+            _tracked.move_to_end(frame_id)
+            return
+        if tracked is not None:
+            # The id of a collected frame, whose state was not yet released
+            _clear(tracked[1])
+            _clear(meta)
+        ref = weakref.ref(frame, lambda ref, frame_id=frame_id: _release(frame_id, ref))
+        _tracked[frame_id] = (ref, meta)
+        over = [] if bound is None else _over(bound)
+    _evict(over)
+
+
+def _over(bound: int) -> list[tuple[int, tuple[weakref.ref, dict]]]:
+    """Stop tracking the least recently used frames over `bound`, returning them."""
+    return [_tracked.popitem(last=False) for _ in range(len(_tracked) - bound)]
+
+
+def _evict(over: list[tuple[int, tuple[weakref.ref, dict]]]) -> None:
+    """Drop the hopper state of frames no longer tracked (see `_over`).
+
+    Each is cleared under its own hopper's lock. One busy in another thread is
+    in use after all, so it is tracked again as the most recently used instead.
+    """
+    global evicted
+    for frame_id, (ref, meta) in over:
+        if ref() is None:
+            continue
+        lock = hopper_lock(meta)
+        if not lock.acquire(blocking=False):
+            with _tracking_lock:
+                _tracked.setdefault(frame_id, (ref, meta))
+            continue
+        try:
+            _clear(meta)
+        finally:
+            lock.release()
+        with _tracking_lock:
+            evicted += 1
+
+
+def set_max_hoppers(bound: int | None) -> None:
+    """Bound the number of tracked frames keeping hopper state (None: unbounded).
+
+    Frames over the bound are evicted right away, least recently used first.
+    """
+    global max_hoppers
+    if bound is not None and bound < 1:
+        raise ValueError(f"max_hoppers must be at least 1, not {bound}")
+    with _tracking_lock:
+        max_hoppers = bound
+        over = [] if bound is None else _over(bound)
+    _evict(over)
+
+
+def memory_report() -> MemoryReport:
+    """Report the hopper state held by live frames (see `MemoryReport`)."""
+    with _tracking(max_hoppers):
+        tracked = list(_tracked.values())
+    hoppers = 0
+    registries: dict[int, ExprRegistry | str] = {}
+    lists: dict[int, list] = {}
+    entries = {}
+    for ref, meta in tracked:
+        if ref() is None or not _hopper_keys(meta):
+            continue
+        with hopper_lock(meta):
+            hoppers += 1
+            for key in _hopper_keys(meta):
+                value = meta[key]
+                if isinstance(value, list):
+                    lists[id(value)] = value
+                elif isinstance(value, (ExprRegistry, str)):
+                    registries[id(value)] = value
+                    if isinstance(value, ExprRegistry):
+                        # Read the entries while no owner mutates the registry
+                        for entry in value.held_entries():
+                            entries[id(entry)] = entry
+
+    size = sum(sys.getsizeof(value) for value in lists.values())
+    size += sum(len(value) for value in registries.values() if isinstance(value, str))
+    size += sum(entry.estimated_size() for entry in entries.values())
+    return MemoryReport(
+        live_hoppers=hoppers,
+        tracked=sum(ref() is not None for ref, _ in tracked),
+        registries=len(registries),
+        entries=len(entries),
+        bytes=size,
+        max_hoppers=max_hoppers,
+        evicted=evicted,
+    )
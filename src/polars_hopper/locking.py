@@ -0,0 +1,52 @@
+"""Thread safety of hopper state.
+
+Hopper state (registries, the per-kind lists and the other "hopper_" metadata
+keys) is shared between frames and may be used from many threads. Every
+operation on it is atomic: it holds the hopper's lock (see `hopper_lock`) while
+it reads, plans and updates the state, so concurrent operations behave as if
+they ran one after the other, in some order. In particular:
+
+- expressions added from several threads are all registered, each with its own
+  idx;
+- applying one frame's hopper from several threads applies each ready
+  expression once: the first application consumes them, and the others find
+  nothing ready (returning the frame as is) or only what was added since;
+- frames sharing state through copy-on-write (derived frames, attached
+  `HopperSpec`s) stay isolated however their threads interleave.
+
+The lock is kept in the metadata, so frames derived from one another share it
+along with their state (polars-config-meta copies the metadata shallowly), as
+do the frames a `HopperSpec` is attached to. Hoppers that share nothing have
+their own locks, and never wait on each other.
+
+Only the bookkeeping happens under the lock. Resolving the schemas of the frames
+to join, evaluating filters on a sample to order them, executing the planned
+Polars query (or writing a batch) and writing a hopper to parquet all happen
+outside it, on what was read under it. `ExprRegistry` objects used directly
+(outside a hopper) are not synchronised.
+
+Neither is polars-config-meta's own bookkeeping of the frames' metadata (as of
+0.3.4). When a frame is garbage collected in one thread while another thread
+creates one, its cleanup (a weakref callback) may fail with "dictionary changed
+size during iteration", which Python reports and ignores. The collected frame's
+metadata is then left in config-meta's global dicts, and a frame later created
+under the same `id` that the hopper never tracked (see `lifetime`) would see it.
+"""
+
+from __future__ import annotations
+
+import threading
+
+
+hopper_lock_key = "hopper_lock"
+
+
+def hopper_lock(meta: dict) -> threading.RLock:
+    """Return the lock of the hopper state in a frame's metadata, adding it if absent.
+
+    It is reentrant, as hopper operations nest (e.g. applying reads the registry).
+    """
+    lock = meta.get(hopper_lock_key)
+    if lock is None:
+        lock = meta.setdefault(hopper_lock_key, threading.RLock())
+    return lock
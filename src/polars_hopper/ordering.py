@@ -0,0 +1,491 @@
+"""Order runs of ready filters by the rows they remove per unit of cost.
+
+By default a hopper applies its ready filters in registry idx order (FIFO). With
+`order="selectivity"`, each run of consecutive filter steps in a `HopperPlan` is
+reordered so that the filters expected to remove the most rows for the least work
+run first, and the expensive ones (string/regex matching, Python UDFs) only see
+the rows left by the cheap ones.
+
+Each filter gets:
+
+- a static cost from its expression tree (`expr_cost`): simple comparisons are
+  cheap, `is_in` less so, string functions more so, regex matching and Python
+  functions (`map_elements`) the most;
+- a selectivity estimate (the fraction of rows it keeps) from evaluating it on a
+  small sample of the frame, replaying the plan's earlier steps on the sample.
+
+Only filters that look at each row on its own can be reordered: a filter that
+aggregates or windows over the frame (e.g. `pl.col("a") > pl.col("a").mean()`)
+depends on which rows the filters before it removed, so it stays in place and
+splits the run (see `is_row_separable`).
+
+Separately, with `schedule="filters_first"`, filters are moved ahead of the
+addcols they do not need (see `hoist_filters`), so that costly addcols only run
+on the rows the filters keep. Whatever the schedule, filters are also moved
+ahead of the joins they do not need, or applied to the other side of a join
+first (see `push_down_filters`).
+"""
+
+from __future__ import annotations
+
+import json
+from collections.abc import Iterator, Mapping
+from typing import Any
+
+import polars as pl
+
+from .planner import (
+    HopperPlan,
+    PlanStep,
+    Record,
+    apply_aggregation,
+    apply_join,
+    record_id,
+    track_producers,
+)
+from .registry import RegistryEntry
+
+
+# Expression nodes that are computed row by row (a `Function` node also needs an
+# elementwise function, see `_elementwise_function`)
+_ROW_NODES = {
+    "Column",
+    "Columns",
+    "Selector",
+    "Literal",
+    "BinaryExpr",
+    "Alias",
+    "KeepName",
+    "RenameAlias",
+    "Cast",
+    "Ternary",
+}
+_ROW_FUNCTIONS = {
+    "Abs",
+    "Negate",
+    "FillNull",
+    "Round",
+    "Floor",
+    "Ceil",
+    "Clip",
+    "Sqrt",
+    "Pow",
+    "Sign",
+}
+_ROW_FUNCTION_FAMILIES = {"StringExpr", "TemporalExpr", "ListExpr", "StructExpr"}
+# Functions in those families (or the Boolean one) that reduce or look across rows
+_NON_ROW_FUNCTIONS = {
+    "IsUnique",
+    "IsDuplicated",
+    "IsFirstDistinct",
+    "IsLastDistinct",
+    "Any",
+    "All",
+    "ConcatVertical",
+}
+
+# Static cost of each node type in an expression tree (unlisted nodes cost 1)
+_NODE_COSTS = {
+    "Column": 0,
+    "Columns": 0,
+    "Selector": 0,
+    "Literal": 0,
+    "Alias": 0,
+    "KeepName": 0,
+    "RenameAlias": 0,
+    "AnonymousFunction": 100,
+    "Over": 10,
+}
+_FUNCTION_COSTS = {
+    "IsIn": 3,
+    "StringExpr": 5,
+    "ListExpr": 4,
+    "StructExpr": 2,
+    "TemporalExpr": 2,
+}
+_REGEX_COST = 20
+
+# Nodes without fields, which serialize as a bare string
+_UNIT_NODES = {"Len"}
+
+
+def _expr_tree(expr: pl.Expr) -> dict[str, Any] | None:
+    """Return the expression's serialized tree, or None if it cannot be serialized.
+
+    Some Polars versions cannot serialize every expression (e.g. `name.suffix` on
+    older ones), in which case the callers fall back to their cautious defaults.
+    """
+    try:
+        return json.loads(expr.meta.serialize(format="json"))
+    except pl.exceptions.ComputeError:
+        return None
+
+
+def _nodes(value: Any) -> Iterator[tuple[str, Any]]:
+    """Yield the (type, body) of the expression nodes directly inside `value`.
+
+    An expression node serializes as a dict with a single CamelCase key (e.g.
+    {"Column": "a"}), or as a bare string if it has no fields (e.g. "Len" for
+    `pl.len()`); other dicts hold a node's fields (e.g. "left", "op" and "right"
+    of a `BinaryExpr`) or options, and are looked through.
+    """
+    if isinstance(value, str) and value in _UNIT_NODES:
+        yield value, None
+    elif isinstance(value, list):
+        for item in value:
+            yield from _nodes(item)
+    elif isinstance(value, dict):
+        if len(value) == 1 and next(iter(value))[:1].isupper():
+            yield next(iter(value.items()))
+        else:
+            for item in value.values():
+                yield from _nodes(item)
+
+
+def _function_name(function: str | dict[str, Any]) -> tuple[str, str | None]:
+    """Split a `Function` node's function into its family and name.
+
+    Plain functions serialize as a string (e.g. "Abs"), others as a family with
+    the function inside (e.g. {"StringExpr": {"Contains": {...}}}).
+    """
+    if isinstance(function, str):
+        return function, None
+    [(family, inner)] = function.items()
+    if isinstance(inner, dict):
+        inner = next(iter(inner), None)
+    return family, inner
+
+
+def _elementwise_function(function: str | dict[str, Any]) -> bool:
+    """Whether a `Function` node's function is computed row by row."""
+    family, name = _function_name(function)
+    if name is None:
+        return family in _ROW_FUNCTIONS
+    if name in _NON_ROW_FUNCTIONS:
+        return False
+    return family in _ROW_FUNCTION_FAMILIES or family == "Boolean"
+
+
+def _elementwise_udf(body: dict[str, Any]) -> bool:
+    """Whether an `AnonymousFunction` node (a Python UDF) is flagged elementwise.
+
+    Polars flags `map_elements` (and `map_batches(..., is_elementwise=True)`) as
+    row-separable in the node's options.
+    """
+    options = body.get("options") or {}
+    return (
+        "ROW_SEPARABLE" in str(options.get("flags", ""))
+        or options.get("collect_groups") == "ElementWise"
+    )
+
+
+def _is_row_separable(value: Any) -> bool:
+    for node_type, body in _nodes(value):
+        if node_type in ("Literal", "Selector"):
+            continue
+        if node_type == "Function":
+            if not _elementwise_function(body["function"]):
+                return False
+            body = body["input"]
+        elif node_type == "AnonymousFunction":
+            if not _elementwise_udf(body):
+                return False
+            body = body["input"]
+        elif node_type not in _ROW_NODES:
+            return False
+        elif node_type == "RenameAlias":
+            body = body["expr"]
+        if not _is_row_separable(body):
+            return False
+    return True
+
+
+def is_row_separable(expr: pl.Expr) -> bool:
+    """Whether `expr` decides each row from that row alone.
+
+    Such a filter keeps the same rows whatever other filters ran before it, so it
+    can be reordered freely among others like it. This errs on the side of False
+    for anything it does not recognise (aggregations, windows, shifts, cumulative
+    functions, Python functions not flagged elementwise such as `map_batches`,
+    ...).
+    """
+    tree = _expr_tree(expr)
+    return tree is not None and _is_row_separable(tree)
+
+
+def _tree_cost(value: Any) -> int:
+    cost = 0
+    for node_type, body in _nodes(value):
+        if node_type in ("Literal", "Selector"):
+            continue
+        if node_type == "Function":
+            family, name = _function_name(body["function"])
+            cost += _FUNCTION_COSTS.get("IsIn" if name == "IsIn" else family, 1)
+            if family == "StringExpr" and name == "Contains":
+                if not body["function"][family][name].get("literal", False):
+                    cost += _REGEX_COST
+            body = body["input"]
+        else:
+            cost += _NODE_COSTS.get(node_type, 1)
+            if node_type == "AnonymousFunction":
+                body = body["input"]
+            elif node_type == "RenameAlias":
+                body = body["expr"]
+        cost += _tree_cost(body)
+    return cost
+
+
+def expr_cost(expr: pl.Expr) -> int:
+    """Estimate the per-row cost of evaluating `expr` from its expression tree.
+
+    The unit is roughly one comparison: a simple comparison costs 1, `is_in` 3, a
+    string function 5, a regex match 25, and a Python function (`map_elements`)
+    about 100. The cost is at least 1; an expression Polars cannot serialize is
+    costed like a Python function.
+    """
+    tree = _expr_tree(expr)
+    return (
+        _NODE_COSTS["AnonymousFunction"] if tree is None else max(_tree_cost(tree), 1)
+    )
+
+
+def _apply_step(
+    frame: pl.DataFrame,
+    step: PlanStep,
+    records: Mapping[str, Record] | None,
+) -> pl.DataFrame:
+    """Apply one plan step to the sample frame."""
+    if step.kind == "f":
+        return frame.filter(step.expr)
+    if step.kind == "s":
+        return frame.select(step.expr)
+    if step.kind == "g":
+        return apply_aggregation(frame, step.expr, records)
+    if step.kind == "j":
+        return apply_join(frame, step.expr, records, step.pushdown)
+    return frame.with_columns(step.expr)
+
+
+def _estimate(segment: list[PlanStep], sample: pl.DataFrame) -> None:
+    """Record each step's cost, and the fraction of `sample` rows it keeps."""
+    if sample.height:
+        kept = sample.select(
+            step.expr.fill_null(False).cast(pl.Float64).mean().alias(str(i))
+            for i, step in enumerate(segment)
+        ).row(0)
+    else:
+        kept = (1.0,) * len(segment)
+    for step, selectivity in zip(segment, kept):
+        step.cost = expr_cost(step.expr)
+        step.selectivity = selectivity
+
+
+def _rank(step: PlanStep) -> tuple[float, int, int]:
+    """Sort key: most rows removed per unit cost first, then cheapest, then idx."""
+    return (-(1.0 - step.selectivity) / step.cost, step.cost, step.idx)
+
+
+def order_filters(
+    plan: HopperPlan,
+    sample: pl.DataFrame,
+    records: Mapping[str, Record] | None = None,
+) -> HopperPlan:
+    """Return `plan` with each run of row-separable filters in cost-effective order.
+
+    The plan's steps are replayed on `sample` (a small sample of the frame the
+    plan applies to) to estimate the selectivity of each filter where it runs.
+    Filters are then ordered by the fraction of rows they remove per unit of
+    `expr_cost`, breaking ties by cost, then idx. The estimates are recorded on the
+    steps (`PlanStep.selectivity`, `PlanStep.cost`) and shown by `to_frame`.
+
+    Filters that are not row-separable, and all other steps, keep their position.
+    Replaying an aggregation or join step needs its record, from `records`.
+    """
+    steps: list[PlanStep] = []
+    segment: list[PlanStep] = []
+    for step in [*plan.steps, None]:
+        if step is not None and step.kind == "f" and is_row_separable(step.expr):
+            segment.append(step)
+            continue
+        if segment:
+            _estimate(segment, sample)
+            segment.sort(key=_rank)
+            for filter_step in segment:
+                sample = _apply_step(sample, filter_step, records)
+            steps.extend(segment)
+            segment = []
+        if step is not None:
+            sample = _apply_step(sample, step, records)
+            steps.append(step)
+    return HopperPlan(
+        steps,
+        plan.pending,
+        plan.schema,
+        plan.input_schema,
+        plan.blocked,
+    )
+
+
+def _can_hoist_past(step: PlanStep, depends_on: set[int]) -> bool:
+    """Whether a filter not reading from the `depends_on` steps can run before `step`."""
+    return (
+        step.kind == "a" and step.idx not in depends_on and is_row_separable(step.expr)
+    )
+
+
+def hoist_filters(plan: HopperPlan) -> HopperPlan:
+    """Return `plan` with each filter moved ahead of the addcols it does not need.
+
+    A filter moves back past each addcols step that it does not read a column from
+    (see `PlanStep.depends_on`) and that computes each row from that row alone (see
+    `is_row_separable`): the addcols then gives the same values for the rows the
+    filter keeps, and computes no others. It stops at any other step, so filters
+    keep their relative order, and selects stay where they are. The result is the
+    same as applying the plan in idx order.
+    """
+    steps: list[PlanStep] = []
+    for step in plan.steps:
+        pos = len(steps)
+        if step.kind == "f":
+            depends_on = set(step.depends_on)
+            while pos and _can_hoist_past(steps[pos - 1], depends_on):
+                pos -= 1
+        steps.insert(pos, step)
+    if steps == plan.steps:
+        return plan
+    return HopperPlan(
+        steps,
+        plan.pending,
+        plan.schema,
+        plan.input_schema,
+        plan.blocked,
+    )
+
+
+# The joins each of whose rows carries a row of the frame (so a filter on the
+# frame's columns can run before them), and those each of whose rows carries a
+# row of the other side (so a filter on its columns can run on it first)
+_PULL_AHEAD = ("inner", "left", "semi", "anti")
+_PUSH_DOWN = ("inner", "right")
+
+
+def _join_inputs(plan: HopperPlan) -> dict[int, set[str]]:
+    """Return the columns of the frame entering each join step, by idx."""
+    inputs = {}
+    columns = plan.input_schema.names()
+    for step in plan.steps:
+        if step.kind == "j":
+            inputs[step.idx] = set(columns)
+        if step.columns is not None:
+            columns = step.columns
+    return inputs
+
+
+def _depends_on(entry: RegistryEntry, steps: list[PlanStep]) -> list[int]:
+    """Return the idxs of the `steps` that produced the columns `entry` reads."""
+    producer_of: dict[str, int] = {}
+    for step in steps:
+        if step.columns is not None:
+            producer_of = track_producers(producer_of, step.entry, step.columns)
+    return sorted({producer_of[c] for c in entry.root_names if c in producer_of})
+
+
+def _pull_ahead(
+    steps: list[PlanStep],
+    step: PlanStep,
+    records: Mapping[str, Record],
+    inputs: dict[int, set[str]],
+) -> int | None:
+    """Return the position in `steps` ahead of the joins `step` can run before.
+
+    That is for a row-separable filter that only reads columns the frame had
+    before the join, and a join keeping only the frame's rows that match: the
+    filter then keeps the same rows, before the join or after. To get there it
+    may also move back past row-separable filters, and addcols it can be
+    hoisted past (see `hoist_filters`). Returns None if it cannot pass a join.
+    """
+    roots = set(step.entry.root_names)
+    if not roots or not is_row_separable(step.expr):
+        return None
+    depends_on = set(step.depends_on)
+    pos, ahead = len(steps), None
+    while pos:
+        prev = steps[pos - 1]
+        if prev.kind == "j":
+            if records[record_id(prev.expr)].how not in _PULL_AHEAD:
+                break
+            if not roots <= inputs[prev.idx]:
+                break
+            ahead = pos - 1
+            depends_on = set(_depends_on(step.entry, steps[:ahead]))
+        elif not (
+            (prev.kind == "f" and is_row_separable(prev.expr))
+            or _can_hoist_past(prev, depends_on)
+        ):
+            break
+        pos -= 1
+    return ahead
+
+
+def push_down_filters(
+    plan: HopperPlan,
+    records: Mapping[str, Record],
+) -> HopperPlan:
+    """Return `plan` with filters moved through its joins, to run on fewer rows.
+
+    A join is planned in idx order, like any other step, and the filters after
+    it apply after it, unless the result is the same otherwise:
+
+    - a row-separable filter that only reads columns the frame had before the
+      join moves ahead of an inner, left, semi or anti join (see `_pull_ahead`),
+      as these only keep the frame's rows that match;
+    - a row-separable filter planned straight after an inner or right join (see
+      `PlanStep.depends_on`), with only row-separable filters between them, that
+      only reads columns the join brings in from the other side (not the keys,
+      nor columns the frame already had) is also applied to the other side
+      first, as these only keep the other side's rows that match. It stays in
+      the plan, after the join, where it removes nothing more.
+
+    Other filters (e.g. one that aggregates over the frame, or any filter on the
+    frame's own columns after a right or full join, whose unmatched rows of the
+    other side it would otherwise not see) stay after the join in idx order.
+    The plan's join steps are updated in place.
+    """
+    inputs = _join_inputs(plan)
+    steps: list[PlanStep] = []
+    for step in plan.steps:
+        pos = None
+        if step.kind == "f" and inputs:
+            pos = _pull_ahead(steps, step, records, inputs)
+        if pos is None:
+            steps.append(step)
+            continue
+        deps = _depends_on(step.entry, steps[:pos])
+        steps.insert(pos, PlanStep(step.entry, step.pass_no, deps))
+
+    for pos, step in enumerate(steps):
+        if step.kind != "j":
+            continue
+        record = records[record_id(step.expr)]
+        if record.how not in _PUSH_DOWN:
+            continue
+        brought_in = set(record.other.collect_schema().names()) - inputs[step.idx]
+        step.pushdown = []
+        for later in steps[pos + 1 :]:
+            # Only the run of row-separable filters straight after the join: any
+            # other step in between sees the rows the pushed filter would drop
+            if later.kind != "f" or not is_row_separable(later.expr):
+                break
+            if later.depends_on == [step.idx] and brought_in.issuperset(
+                later.entry.root_names
+            ):
+                step.pushdown.append(later.expr)
+    if steps == plan.steps:
+        return plan
+    return HopperPlan(
+        steps,
+        plan.pending,
+        plan.schema,
+        plan.input_schema,
+        plan.blocked,
+    )
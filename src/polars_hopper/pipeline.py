@@ -0,0 +1,262 @@
+"""Run staged (possibly async) pipelines, applying the hopper between stages.
+
+A pipeline is a sequence of stages, each adding columns to a DataFrame, such as
+calls to a slow API. Filters waiting in the frame's hopper for those columns then
+become ready, and are applied before the next stage, so every stage only runs on
+the rows that survived the previous ones:
+
+    pipeline = Pipeline(
+        fetch_repos,                                # DataFrame -> DataFrame
+        fan_out(fetch_stars, concurrency=8),        # row dict -> new columns
+        fan_out(fetch_readmes, chunk_size=100),     # DataFrame chunk -> DataFrame
+    )
+    stats: list[StageStats] = []
+    df = await pipeline.run(df, stats=stats)
+
+Stage functions may be sync or async. A `fan_out` stage calls its function once
+per row (or per chunk of rows) of the filtered frame, at most `concurrency` calls
+at a time, so filtering first directly cuts the number of calls. The hopper is
+applied (with `apply_ready_exprs`) in a worker thread, so as not to block the
+event loop. The `StageStats` of a run show how many rows each stage pruned and
+how many calls it made.
+
+Frames returned by a stage keep the hopper metadata of the frame it was given
+(including expressions the stage added to that frame's hopper), even if built
+with plain Polars methods that drop it.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import inspect
+import time
+from collections.abc import Awaitable, Callable, Iterable
+from typing import NamedTuple
+
+import polars as pl
+
+
+FrameFunc = Callable[[pl.DataFrame], pl.DataFrame | Awaitable[pl.DataFrame]]
+RowFunc = Callable[[dict], dict | Awaitable[dict]]
+
+
+class StageStats(NamedTuple):
+    """Statistics of one stage of a pipeline run.
+
+    Attributes
+    ----------
+    stage
+        The stage's name.
+    rows_pruned
+        The rows the hopper removed just before the stage (for the final entry,
+        named "(final)", after the last stage).
+    rows_in, rows_out
+        The height of the frame the stage was given and returned.
+    calls
+        The number of calls made to the stage's function (1 for a frame stage, the
+        number of rows or chunks for a `fan_out` stage).
+    wall_s
+        Wall time of the stage, in seconds (excluding the hopper's application).
+
+    """
+
+    stage: str
+    rows_pruned: int
+    rows_in: int
+    rows_out: int
+    calls: int
+    wall_s: float
+
+
+def _is_async(func: Callable) -> bool:
+    """Whether calling `func` returns a coroutine (an async function or callable).
+
+    This covers `functools.partial` of async functions, and objects whose
+    `__call__` is async.
+    """
+    return inspect.iscoroutinefunction(func) or inspect.iscoroutinefunction(
+        getattr(func, "__call__", None),
+    )
+
+
+async def _call(func: Callable, arg: object) -> object:
+    """Call a sync or async function, awaiting its result if need be."""
+    result = func(arg)
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+class FanOut:
+    """A stage calling its function on each row, or chunk of rows, concurrently.
+
+    See `fan_out`.
+    """
+
+    def __init__(
+        self,
+        func: RowFunc | FrameFunc,
+        *,
+        chunk_size: int | None = None,
+        concurrency: int = 8,
+        schema: pl.Schema | dict | None = None,
+        name: str | None = None,
+    ):
+        """Set up the stage (see `fan_out`)."""
+        if concurrency < 1:
+            raise ValueError(f"concurrency must be at least 1, not {concurrency}")
+        if chunk_size is not None and chunk_size < 1:
+            raise ValueError(f"chunk_size must be at least 1, not {chunk_size}")
+        self.func = func
+        self.chunk_size = chunk_size
+        self.concurrency = concurrency
+        self.schema = None if schema is None else pl.Schema(schema)
+        self.__name__ = name or getattr(func, "__name__", type(func).__name__)
+
+    async def _limited(self, semaphore: asyncio.Semaphore, arg: object) -> object:
+        """Call the function on one row or chunk, once a slot is free."""
+        async with semaphore:
+            if _is_async(self.func):
+                result = self.func(arg)
+            else:
+                # A sync function (e.g. a blocking HTTP call) runs in a worker thread
+                result = await asyncio.to_thread(self.func, arg)
+            if inspect.isawaitable(result):
+                result = await result
+            return result
+
+    async def apply(self, df: pl.DataFrame) -> tuple[pl.DataFrame, int]:
+        """Run the function on `df`'s rows or chunks, returning the result and calls."""
+        if self.chunk_size is None:
+            args = list(df.iter_rows(named=True))
+        else:
+            args = list(df.iter_slices(self.chunk_size))
+        semaphore = asyncio.Semaphore(self.concurrency)
+        results = await asyncio.gather(
+            *(self._limited(semaphore, arg) for arg in args),
+        )
+
+        if not results:
+            if self.schema is None:
+                return df, 0
+            nulls = [pl.lit(None, dtype).alias(n) for n, dtype in self.schema.items()]
+            return df.with_columns(nulls), 0
+        if self.chunk_size is not None:
+            return pl.concat(results, how="vertical"), len(args)
+        return df.hstack(pl.DataFrame(results, schema=self.schema)), len(args)
+
+
+def fan_out(
+    func: RowFunc | FrameFunc,
+    *,
+    chunk_size: int | None = None,
+    concurrency: int = 8,
+    schema: pl.Schema | dict | None = None,
+    name: str | None = None,
+) -> FanOut:
+    """Make a pipeline stage calling `func` concurrently on the rows of the frame.
+
+    Without a `chunk_size`, `func` is called on each row (as a dict of column
+    values) and returns a dict of the new columns' values for that row, which are
+    added to the frame. With a `chunk_size`, it is called on each chunk of up to
+    that many rows (a DataFrame) and returns it with its new columns, and the
+    chunks are concatenated in order.
+
+    At most `concurrency` calls are in flight at once. Async functions run on the
+    event loop, sync ones in worker threads. The new columns' `schema` can be given
+    (it is used to add empty columns when no row is left to call `func` on).
+    """
+    return FanOut(
+        func,
+        chunk_size=chunk_size,
+        concurrency=concurrency,
+        schema=schema,
+        name=name,
+    )
+
+
+def _carry_metadata(source: pl.DataFrame, out: pl.DataFrame) -> None:
+    """Give `out` the metadata of `source` it lacks (e.g. built by plain Polars)."""
+    if out is source:
+        return
+    meta = out.config_meta.get_metadata()
+    missing = {
+        key: value
+        for key, value in source.config_meta.get_metadata().items()
+        if key not in meta
+    }
+    if missing:
+        out.config_meta.update(missing)
+
+
+class Pipeline:
+    """A sequence of stages adding columns, with the hopper applied between them.
+
+    Each stage is a function taking the frame and returning it with new columns
+    (sync or async), or a `fan_out` stage. See the module docstring.
+    """
+
+    def __init__(
+        self,
+        *stages: FrameFunc | FanOut,
+        kinds: Iterable[str] = ("f", "s", "a", "g", "j"),
+    ):
+        """Set up the stages, and the kinds of ready expressions applied between them."""
+        self.stages = stages
+        self.kinds = tuple(kinds)
+
+    async def _apply(self, df: pl.DataFrame) -> pl.DataFrame:
+        """Apply the ready expressions in a worker thread, off the event loop."""
+        return await asyncio.to_thread(df.hopper.apply_ready_exprs_kinds, *self.kinds)
+
+    async def run(
+        self,
+        df: pl.DataFrame,
+        *,
+        stats: list[StageStats] | None = None,
+    ) -> pl.DataFrame:
+        """Run the stages on `df`, applying its hopper before each stage and at the end.
+
+        The `StageStats` of each stage, then a "(final)" entry for the last
+        application, are appended to `stats` if given.
+        """
+        for stage in self.stages:
+            height = df.height
+            df = await self._apply(df)
+            rows_in = df.height
+            t0 = time.perf_counter()
+            if isinstance(stage, FanOut):
+                out, calls = await stage.apply(df)
+            else:
+                out, calls = await _call(stage, df), 1
+            wall_s = time.perf_counter() - t0
+            _carry_metadata(df, out)
+            if stats is not None:
+                stats.append(
+                    StageStats(
+                        stage=getattr(stage, "__name__", type(stage).__name__),
+                        rows_pruned=height - rows_in,
+                        rows_in=rows_in,
+                        rows_out=out.height,
+                        calls=calls,
+                        wall_s=wall_s,
+                    ),
+                )
+            df = out
+
+        height = df.height
+        df = await self._apply(df)
+        if stats is not None:
+            stats.append(
+                StageStats("(final)", height - df.height, df.height, df.height, 0, 0.0),
+            )
+        return df
+
+    def run_sync(
+        self,
+        df: pl.DataFrame,
+        *,
+        stats: list[StageStats] | None = None,
+    ) -> pl.DataFrame:
+        """Run the pipeline to completion from synchronous code (see `run`)."""
+        return asyncio.run(self.run(df, stats=stats))
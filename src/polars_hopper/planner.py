@@ -0,0 +1,567 @@
+"""Plan which hopper expressions apply, and in what order, from the schema alone.
+
+`build_plan` works out everything `apply_ready_exprs` would apply, including
+cascades (e.g. an addcols that creates the column a pending filter needs),
+without touching any data: the schema after each select/addcols is resolved on
+an empty frame. The resulting `HopperPlan` lists the steps in the order
+they run and the dependency graph between them (which step produced the
+columns each step reads), and is then executed in one go. Runs of consecutive
+addcols steps are grouped into as few `with_columns` batches as their
+dependencies allow (see `batch_addcols`).
+
+Aggregations (kind 'g') and joins (kind 'j') are described by a side record
+(`Aggregation` or `Join`), kept by id in the `records` mapping passed to
+`build_plan`. Each is registered as an expression over the columns it reads,
+named after its id (see `record_expr`), so that it is ready once they all exist.
+An aggregation replaces the frame's columns as a select does, and so does a
+join. Which filters may instead run before a join, on either side, is decided
+once the plan is built (see `ordering.push_down_filters`).
+"""
+
+from __future__ import annotations
+
+import heapq
+from collections.abc import Iterable, Iterator, Mapping
+from typing import NamedTuple
+
+import polars as pl
+
+from .registry import ExprRegistry, RegistryEntry, is_regex_name, reads_any_column
+
+
+IntoExprs = str | pl.Expr | Iterable[str | pl.Expr]
+
+JOIN_STRATEGIES = ("inner", "left", "right", "full", "semi", "anti")
+# Keep the row order of the side(s) each strategy returns rows from
+_JOIN_ORDER = {"inner": "left", "left": "left", "right": "right", "full": "left_right"}
+
+
+def _as_exprs(items: IntoExprs) -> list[pl.Expr]:
+    """Return one or more expressions (or column names) as a list of expressions."""
+    if isinstance(items, (str, pl.Expr)):
+        items = [items]
+    return [pl.col(item) if isinstance(item, str) else item for item in items]
+
+
+class Aggregation(NamedTuple):
+    """The record of a group-by aggregation (kind 'g')."""
+
+    by: list[pl.Expr]
+    aggs: list[pl.Expr]
+
+
+class Join(NamedTuple):
+    """The record of a join (kind 'j'), holding the frame to join by reference."""
+
+    other: pl.LazyFrame
+    on: list[pl.Expr]
+    how: str
+
+
+Record = Aggregation | Join
+
+
+def aggregation(by: IntoExprs, aggs: IntoExprs) -> Aggregation:
+    """Return the record of a group-by on the `by` keys computing `aggs`."""
+    by, aggs = _as_exprs(by), _as_exprs(aggs)
+    if not by or not aggs:
+        raise ValueError("An aggregation needs at least one key and one expression")
+    return Aggregation(by, aggs)
+
+
+def join(
+    other: pl.DataFrame | pl.LazyFrame,
+    on: IntoExprs,
+    how: str = "inner",
+) -> Join:
+    """Return the record of a join with `other` on the `on` keys."""
+    on = _as_exprs(on)
+    if not on:
+        raise ValueError("A join needs at least one key")
+    if how not in JOIN_STRATEGIES:
+        raise ValueError(
+            f"Unknown join strategy '{how}', expected one of {JOIN_STRATEGIES}"
+        )
+    return Join(other.lazy(), on, how)
+
+
+def record_expr(record_id: str, record: Record) -> pl.Expr:
+    """Return the expression registered for a record, under its id.
+
+    It is a struct of the expressions the record evaluates (keys and
+    aggregations, or join keys), named "hopper_<kind>:<id>". It is never
+    evaluated, but its root names are the columns the record reads, and it
+    serialises like any other expression. Read the id back with `record_id`.
+
+    If one of them may read any column (a wildcard, exclude, selector or regex,
+    see `registry.reads_any_column`), the struct is instead of the columns the
+    record names plus `pl.all()`: it is ready once those exist, and keeps every
+    column from being pruned while it is pending.
+    """
+    if isinstance(record, Aggregation):
+        exprs, name = [*record.by, *record.aggs], f"hopper_agg:{record_id}"
+    else:
+        exprs, name = record.on, f"hopper_join:{record_id}"
+    if any(map(reads_any_column, exprs)):
+        names = [
+            col
+            for expr in exprs
+            for col in expr.meta.root_names()
+            if not is_regex_name(col)
+        ]
+        exprs = [*map(pl.col, dict.fromkeys(names)), pl.all()]
+    return pl.struct(*exprs).alias(name)
+
+
+def record_id(expr: pl.Expr) -> str:
+    """Return the id of the record an expression was registered for."""
+    return expr.meta.output_name().split(":", 1)[1]
+
+
+def _record(expr: pl.Expr, records: Mapping[str, Record] | None) -> Record:
+    """Look up the record an expression was registered for."""
+    record = (records or {}).get(record_id(expr))
+    if record is None:
+        raise ValueError(f"No record for {expr} (was it added to this hopper?)")
+    return record
+
+
+def apply_aggregation(
+    df: pl.DataFrame | pl.LazyFrame,
+    expr: pl.Expr,
+    records: Mapping[str, Record] | None,
+) -> pl.DataFrame | pl.LazyFrame:
+    """Apply an aggregation: group `df` by its keys, in order of appearance."""
+    by, aggs = _record(expr, records)
+    return df.group_by(by, maintain_order=True).agg(aggs)
+
+
+def apply_join(
+    df: pl.DataFrame | pl.LazyFrame,
+    expr: pl.Expr,
+    records: Mapping[str, Record] | None,
+    pushdown: Iterable[pl.Expr] = (),
+) -> pl.DataFrame | pl.LazyFrame:
+    """Apply a join, filtering the other side by the `pushdown` filters first.
+
+    A DataFrame is joined lazily, and the result collected.
+    """
+    other, on, how = _record(expr, records)
+    pushdown = list(pushdown)
+    if pushdown:
+        other = other.filter(*pushdown)
+    lf = df.lazy().join(other, on=on, how=how, maintain_order=_JOIN_ORDER.get(how))
+    return lf.collect() if isinstance(df, pl.DataFrame) else lf
+
+
+class PlanStep:
+    """One registry entry scheduled to apply, with where it sits in the plan."""
+
+    __slots__ = (
+        "entry",
+        "pass_no",
+        "depends_on",
+        "columns",
+        "selectivity",
+        "cost",
+        "pushdown",
+    )
+
+    def __init__(
+        self,
+        entry: RegistryEntry,
+        pass_no: int,
+        depends_on: list[int],
+        columns: list[str] | None = None,
+    ):
+        """Schedule `entry` in cascade pass `pass_no`, after the steps it reads from.
+
+        `columns` are the frame's column names after the step (None for a filter,
+        which leaves them unchanged). `selectivity` and `cost` are filled in for
+        filters whose order was chosen by `ordering.order_filters`, and `pushdown`
+        for joins, with the filters `ordering.push_down_filters` applies to the
+        other side of the join.
+        """
+        self.entry = entry
+        self.pass_no = pass_no
+        self.depends_on = depends_on
+        self.columns = columns
+        self.selectivity: float | None = None
+        self.cost: int | None = None
+        self.pushdown: list[pl.Expr] = []
+
+    @property
+    def idx(self) -> int:
+        """The registry idx of the expression."""
+        return self.entry.idx
+
+    @property
+    def kind(self) -> str:
+        """The kind of the expression ('f', 's', 'a', 'g' or 'j')."""
+        return self.entry.kind
+
+    @property
+    def expr(self) -> pl.Expr:
+        """The expression to apply."""
+        return self.entry.pl_expr
+
+    def __repr__(self) -> str:
+        """Show the step's idx, kind, expression and dependencies."""
+        return (
+            f"PlanStep(idx={self.idx}, kind={self.kind!r}, expr={self.expr}, "
+            f"pass_no={self.pass_no}, depends_on={self.depends_on})"
+        )
+
+
+class PlanBatch:
+    """Consecutive plan steps of one kind, applied in a single call.
+
+    An addcols batch runs as one `with_columns(*exprs)`, so Polars can evaluate
+    its expressions in parallel. Filter and select steps each form a batch of
+    their own. If batching moved an addcols ahead of one it followed, the new
+    columns may come out in a different order, in which case `reorder` gives the
+    column order to restore after the batch.
+    """
+
+    __slots__ = ("kind", "steps", "reorder")
+
+    def __init__(
+        self,
+        kind: str,
+        steps: list[PlanStep],
+        reorder: list[str] | None = None,
+    ):
+        """Group `steps` (all of the given kind) into one batch."""
+        self.kind = kind
+        self.steps = steps
+        self.reorder = reorder
+
+    @property
+    def exprs(self) -> list[pl.Expr]:
+        """The expressions of the batch's steps."""
+        return [step.expr for step in self.steps]
+
+    def __repr__(self) -> str:
+        """Show the batch's kind and step idxs."""
+        return f"PlanBatch(kind={self.kind!r}, idxs={[s.idx for s in self.steps]})"
+
+
+def _produced_columns(entry: RegistryEntry, after: list[str]) -> list[str]:
+    """Return the columns a select/addcols/aggregation step writes.
+
+    A select, aggregation or join replaces every column, and an addcols whose
+    output name cannot be determined (e.g. a multi-column expression) may write
+    any of them.
+    """
+    if entry.kind in ("s", "g", "j") or entry.output_name is None:
+        return list(after)
+    return [entry.output_name]
+
+
+def _is_batch_barrier(entry: RegistryEntry) -> bool:
+    """Whether an addcols must not share a `with_columns` with its neighbours.
+
+    That is when we cannot tell exactly which columns it reads or writes: it has
+    no explicit root names (e.g. a wildcard or selector input), expands to
+    several outputs, or its output name is undetermined.
+    """
+    return (
+        entry.output_name is None
+        or not entry.root_names
+        or entry.pl_expr.meta.has_multiple_outputs()
+    )
+
+
+def batch_addcols(steps: list[PlanStep]) -> list[list[PlanStep]]:
+    """Split a run of consecutive addcols steps into `with_columns` batches.
+
+    Each step goes in the earliest batch that keeps the sequential result: after
+    any step whose output it reads or overwrites, and no earlier than any step
+    that reads the column it writes (a `with_columns` evaluates all of its
+    expressions against its input frame). Barrier steps (see
+    `_is_batch_barrier`) get a batch to themselves.
+    """
+    levels: list[int] = []
+    for j, step in enumerate(steps):
+        level = 0
+        barrier = _is_batch_barrier(step.entry)
+        out_j = step.entry.output_name
+        roots_j = set(step.entry.root_names)
+        for i in range(j):
+            prev = steps[i].entry
+            if barrier or _is_batch_barrier(prev):
+                level = max(level, levels[i] + 1)
+            elif prev.output_name in roots_j or prev.output_name == out_j:
+                level = max(level, levels[i] + 1)
+            elif out_j in prev.root_names:
+                level = max(level, levels[i])
+        levels.append(level)
+    batches: list[list[PlanStep]] = [[] for _ in range(max(levels, default=-1) + 1)]
+    for level, step in zip(levels, steps):
+        batches[level].append(step)
+    return batches
+
+
+def _addcols_run_batches(
+    run: list[PlanStep],
+    columns_before: list[str],
+) -> list[PlanBatch]:
+    """Batch a run of addcols, restoring the sequential column order if needed."""
+    batches = [PlanBatch("a", steps) for steps in batch_addcols(run)]
+    if batches:
+        columns = list(columns_before)
+        for batch in batches:
+            for step in batch.steps:
+                written = _produced_columns(step.entry, step.columns)
+                columns.extend(c for c in written if c not in columns)
+        if columns != run[-1].columns:
+            batches[-1].reorder = run[-1].columns
+    return batches
+
+
+def batch_steps(steps: list[PlanStep], input_columns: list[str]) -> list[PlanBatch]:
+    """Group plan steps into batches, batching each run of consecutive addcols."""
+    batches: list[PlanBatch] = []
+    run: list[PlanStep] = []
+    columns = input_columns
+    for step in [*steps, None]:
+        if step is not None and step.kind == "a":
+            run.append(step)
+            continue
+        batches.extend(_addcols_run_batches(run, columns))
+        if run:
+            columns = run[-1].columns
+        run = []
+        if step is not None:
+            batches.append(PlanBatch(step.kind, [step]))
+            if step.columns is not None:
+                columns = step.columns
+    return batches
+
+
+class HopperPlan:
+    """The ordered steps that applying a hopper's ready expressions would take.
+
+    Attributes
+    ----------
+    steps
+        The expressions to apply, in order.
+    pending
+        The registry idxs that would remain pending afterwards.
+    blocked
+        Map each pending idx to the columns it needs that the frame would still
+        lack afterwards.
+    schema
+        The schema of the frame after the plan is applied.
+    input_schema
+        The schema of the frame the plan applies to.
+    batches
+        The steps grouped into the calls that apply them (see `batch_steps`).
+
+    """
+
+    __slots__ = ("steps", "pending", "schema", "input_schema", "batches", "blocked")
+
+    def __init__(
+        self,
+        steps: list[PlanStep],
+        pending: list[int],
+        schema: pl.Schema,
+        input_schema: pl.Schema,
+        blocked: dict[int, list[str]] | None = None,
+    ):
+        """Wrap the planned steps, the idxs left pending and the input/final schemas."""
+        self.steps = steps
+        self.pending = pending
+        self.blocked = {} if blocked is None else blocked
+        self.schema = schema
+        self.input_schema = input_schema
+        self.batches = batch_steps(steps, input_schema.names())
+
+    @property
+    def dependencies(self) -> dict[int, list[int]]:
+        """Map each step's idx to the idxs of the steps producing columns it reads."""
+        return {step.idx: step.depends_on for step in self.steps}
+
+    def to_frame(self) -> pl.DataFrame:
+        """Return the steps as a DataFrame (in batch order), for inspection.
+
+        The `selectivity` (estimated fraction of rows kept) and `cost` columns are
+        null except for filters ordered by `ordering.order_filters`.
+        """
+        rows = [
+            (step, batch_no)
+            for batch_no, batch in enumerate(self.batches)
+            for step in batch.steps
+        ]
+        return pl.DataFrame(
+            {
+                "idx": [s.idx for s, _ in rows],
+                "kind": [s.kind for s, _ in rows],
+                "expr": [str(s.expr) for s, _ in rows],
+                "pass_no": [s.pass_no for s, _ in rows],
+                "batch": [b for _, b in rows],
+                "depends_on": [s.depends_on for s, _ in rows],
+                "selectivity": [s.selectivity for s, _ in rows],
+                "cost": [s.cost for s, _ in rows],
+            },
+            schema={
+                "idx": pl.Int64,
+                "kind": pl.String,
+                "expr": pl.String,
+                "pass_no": pl.Int64,
+                "batch": pl.Int64,
+                "depends_on": pl.List(pl.Int64),
+                "selectivity": pl.Float64,
+                "cost": pl.Int64,
+            },
+        )
+
+    def __iter__(self) -> Iterator[PlanStep]:
+        """Iterate over the steps in execution order."""
+        return iter(self.steps)
+
+    def __len__(self) -> int:
+        """Count the planned steps."""
+        return len(self.steps)
+
+    def __repr__(self) -> str:
+        """Show the planned steps and the idxs left pending."""
+        return f"HopperPlan(pending={self.pending}, steps={self.to_frame()!r})"
+
+
+def step_frame(
+    frame: pl.DataFrame,
+    kind: str,
+    expr: pl.Expr,
+    records: Mapping[str, Record] | None = None,
+) -> pl.DataFrame:
+    """Return the empty frame with the schema after applying one expression.
+
+    `frame` is an empty (zero-row) frame with the current schema: the step is
+    resolved on it lazily, without running it, and only the columns it adds or
+    changes are created, the others being shared with `frame`. An addcols with a
+    single, named output only has that column resolved, so that each such step
+    costs the same however many columns the frame has. Aggregations and joins
+    are looked up in `records` (a join only resolves the other side's schema).
+    """
+    if kind == "f":
+        return frame
+    lf = frame.lazy()
+    if kind == "s":
+        new_schema = lf.select(expr).collect_schema()
+    elif kind == "g":
+        new_schema = apply_aggregation(lf, expr, records).collect_schema()
+    elif kind == "j":
+        new_schema = apply_join(lf, expr, records).collect_schema()
+    elif kind == "a":
+        name = expr.meta.output_name(raise_if_undetermined=False)
+        if name is not None and not expr.meta.has_multiple_outputs():
+            [series] = pl.DataFrame(schema=lf.select(expr).collect_schema())
+            if name in frame.columns:
+                frame = frame.clone()
+                frame.replace_column(frame.get_column_index(name), series)
+                return frame
+            return frame.hstack([series])
+        new_schema = lf.with_columns(expr).collect_schema()
+    else:
+        raise ValueError(f"Unknown expression kind '{kind}'")
+    schema = frame.schema
+    return pl.DataFrame(
+        [
+            frame.get_column(name)
+            if schema.get(name) == dtype
+            else pl.Series(name, [], dtype)
+            for name, dtype in new_schema.items()
+        ],
+    )
+
+
+def track_producers(
+    producer_of: dict[str, int],
+    entry: RegistryEntry,
+    columns: list[str],
+) -> dict[str, int]:
+    """Record the columns `entry` produced, leaving the frame with `columns`.
+
+    `producer_of` maps each column to the idx of the step that produced it. It is
+    updated in place and returned, or replaced when `entry` replaces columns.
+    """
+    if entry.kind in ("s", "g", "j"):
+        producer_of = {}
+    for name in _produced_columns(entry, columns):
+        producer_of[name] = entry.idx
+    if entry.kind in ("s", "g", "j") or entry.output_name is None:
+        present = set(columns)
+        producer_of = {k: v for k, v in producer_of.items() if k in present}
+    return producer_of
+
+
+def _depends_on(entry: RegistryEntry, producer_of: dict[str, int]) -> list[int]:
+    """Return the idxs of the steps that produced the columns `entry` reads."""
+    return sorted({producer_of[c] for c in entry.root_names if c in producer_of})
+
+
+def build_plan(
+    registry: ExprRegistry,
+    schema: pl.Schema,
+    kinds: Iterable[str],
+    records: Mapping[str, Record] | None = None,
+) -> HopperPlan:
+    """Plan the application of the registry's ready expressions of `kinds`.
+
+    The order matches applying the expressions pass by pass: in each pass the
+    ready expressions apply in idx order, and each sees the schema left by the
+    ones before it. An expression that only becomes ready after a later one was
+    applied waits for the next pass, and passes repeat until nothing is ready.
+    `records` maps ids to the records of aggregations and joins.
+
+    The registry's readiness index is synced to the simulated schemas (it is a
+    cache of readiness for the last schema seen), but no entries are removed.
+    """
+    kinds = tuple(kinds)
+    schema = input_schema = pl.Schema(schema)
+    frame = pl.DataFrame(schema=schema)
+    planned: set[int] = set()
+    producer_of: dict[str, int] = {}
+    steps: list[PlanStep] = []
+
+    registry.sync_columns(schema.names())
+    pass_no = 0
+    while True:
+        queue = [idx for idx in registry.ready(*kinds) if idx not in planned]
+        if not queue:
+            break
+        cursor = -1
+        while queue:
+            idx = heapq.heappop(queue)
+            if idx in planned or not registry.is_ready(idx):
+                continue
+            planned.add(idx)
+            cursor = idx
+            entry = registry.get(idx)
+            depends_on = _depends_on(entry, producer_of)
+            if entry.kind == "f":
+                steps.append(PlanStep(entry, pass_no, depends_on))
+                continue
+            frame = step_frame(frame, entry.kind, entry.pl_expr, records)
+            columns = frame.columns
+            steps.append(PlanStep(entry, pass_no, depends_on, columns))
+            producer_of = track_producers(producer_of, entry, columns)
+
+            for ready_idx in registry.sync_columns(columns):
+                if (
+                    ready_idx > cursor
+                    and ready_idx not in planned
+                    and registry.get(ready_idx).kind in kinds
+                ):
+                    heapq.heappush(queue, ready_idx)
+        pass_no += 1
+
+    columns = set(frame.columns)
+    blocked = {
+        e.idx: sorted(set(e.root_names) - columns)
+        for e in registry.entries(*kinds)
+        if e.idx not in planned
+    }
+    return HopperPlan(steps, list(blocked), frame.schema, input_schema, blocked)
@@ -0,0 +1,618 @@
+"""In-memory expression registry for the hopper.
+
+The registry records every expression added to a hopper (its index, kind,
+serialised form, whether it has been applied and the columns it needs). It
+lives in `df.config_meta` as a live `ExprRegistry` object, and is only encoded
+when the metadata is persisted (e.g. by `df.hopper.write_parquet`): as JSON by
+default, or as (optionally compressed) Arrow IPC with binary-serialised
+expressions, which is much smaller for large hoppers (see `ExprRegistry.encode`).
+
+Each entry also keeps the live `pl.Expr` it was registered with, plus a
+fingerprint (a hash of the expression's binary serialisation) and its output
+name, all computed once when the expression is added.
+"""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import io
+import json
+import weakref
+from collections.abc import Iterable, Iterator
+from typing import Literal
+
+import polars as pl
+
+
+reg_schema = {
+    "idx": pl.Int64,
+    "kind": pl.String,  # 'f','s','a','g','j'
+    "expr": pl.String,  # JSON-serialized expression
+    "applied": pl.Boolean,  # whether we've successfully used it
+    "root_names": pl.List(pl.String),
+    "fingerprint": pl.String,  # hash of the binary-serialized expression
+    "output_name": pl.String,  # None if it cannot be determined statically
+}
+
+
+# The registry as Arrow IPC, with each expression in Polars' binary serialisation
+ipc_schema = {**reg_schema, "expr": pl.Binary}
+# Prefix marking an encoded registry as base64 Arrow IPC (rather than JSON)
+ipc_prefix = "arrow-ipc;base64,"
+
+
+def expr_fingerprint(expr: pl.Expr) -> str:
+    """Return a compact, stable fingerprint of a Polars expression."""
+    return _binary_fingerprint(expr.meta.serialize())
+
+
+def _binary_fingerprint(binary: bytes) -> str:
+    """Return the fingerprint of an expression's binary serialisation."""
+    return hashlib.blake2b(binary, digest_size=8).hexdigest()
+
+
+def is_regex_name(name: str) -> bool:
+    """Whether a root name is a regex pattern (`pl.col("^...$")`) not a column."""
+    return name.startswith("^") and name.endswith("$")
+
+
+# Expression tree nodes reading columns the expression does not name
+_ANY_COLUMN_NODES = frozenset(
+    {"Wildcard", "Exclude", "Selector", "Nth", "DtypeColumn", "IndexColumn"},
+)
+
+
+def reads_any_column(expr: pl.Expr) -> bool:
+    """Whether `expr` may read columns its root names do not list.
+
+    That is one with a wildcard (`pl.all()`), `pl.exclude(...)`, a selector or a
+    regex column anywhere in its tree, e.g. `pl.col("a") > pl.all().min()`,
+    whose only root name is "a".
+    """
+    return _has_any_column_node(json.loads(expr.meta.serialize(format="json")))
+
+
+def _has_any_column_node(node: object) -> bool:
+    """Whether a JSON-serialised expression tree has a node reading any column."""
+    if isinstance(node, str):
+        return node in _ANY_COLUMN_NODES
+    if isinstance(node, list):
+        return any(map(_has_any_column_node, node))
+    if not isinstance(node, dict):
+        return False
+    for key, value in node.items():
+        if key in _ANY_COLUMN_NODES:
+            return True
+        if key == "Column" and isinstance(value, str):
+            if is_regex_name(value):
+                return True
+        elif key != "Literal" and _has_any_column_node(value):
+            return True
+    return False
+
+
+class RegistryEntry:
+    """A single registered expression (one row of the registry).
+
+    The live expression and its JSON (or binary) serialisation are each derived
+    from the other on first access, so an entry built at add time never
+    serialises unless persisted, and one parsed from a file never deserialises
+    its expression unless it is used.
+    """
+
+    __slots__ = (
+        "idx",
+        "kind",
+        "applied",
+        "root_names",
+        "fingerprint",
+        "output_name",
+        "_json",
+        "_binary",
+        "_pl_expr",
+    )
+
+    def __init__(
+        self,
+        idx: int,
+        kind: str,
+        expr: str | None = None,
+        applied: bool = False,
+        root_names: list[str] | None = None,
+        fingerprint: str | None = None,
+        output_name: str | None = None,
+        *,
+        pl_expr: pl.Expr | None = None,
+        binary: bytes | None = None,
+    ):
+        """Create an entry from its registry column values and/or live expr.
+
+        The expression may be given as JSON (`expr`), in Polars' binary
+        serialisation (`binary`), and/or live (`pl_expr`).
+        """
+        if expr is None and pl_expr is None and binary is None:
+            raise ValueError("A registry entry needs a serialised or live expression")
+        self.idx = idx
+        self.kind = kind
+        self.applied = bool(applied)
+        self.root_names = root_names if root_names is not None else []
+        self.fingerprint = fingerprint
+        self.output_name = output_name
+        self._json = expr
+        self._binary = binary
+        self._pl_expr = pl_expr
+
+    @classmethod
+    def from_expr(cls, idx: int, kind: str, expr: pl.Expr) -> RegistryEntry:
+        """Register a live expression, computing its static properties once."""
+        return cls(
+            idx=idx,
+            kind=kind,
+            root_names=expr.meta.root_names(),
+            fingerprint=expr_fingerprint(expr),
+            output_name=expr.meta.output_name(raise_if_undetermined=False),
+            pl_expr=expr,
+        )
+
+    @property
+    def expr(self) -> str:
+        """The JSON-serialised expression (the registry's 'expr' column)."""
+        if self._json is None:
+            self._json = self.pl_expr.meta.serialize(format="json")
+        return self._json
+
+    @property
+    def binary(self) -> bytes:
+        """The expression in Polars' binary serialisation."""
+        if self._binary is None:
+            self._binary = self.pl_expr.meta.serialize(format="binary")
+        return self._binary
+
+    @property
+    def pl_expr(self) -> pl.Expr:
+        """The live Polars expression."""
+        if self._pl_expr is None:
+            if self._json is not None:
+                self._pl_expr = pl.Expr.deserialize(
+                    io.StringIO(self._json),
+                    format="json",
+                )
+            else:
+                self._pl_expr = pl.Expr.deserialize(
+                    io.BytesIO(self._binary),
+                    format="binary",
+                )
+        return self._pl_expr
+
+    def get_fingerprint(self) -> str:
+        """Return the fingerprint, computing it if it was not persisted."""
+        if self.fingerprint is None:
+            self.fingerprint = _binary_fingerprint(self.binary)
+        return self.fingerprint
+
+    def to_dict(self, *, binary: bool = False) -> dict:
+        """Return the entry as a registry row dict (with a binary 'expr' if asked)."""
+        return {
+            "idx": self.idx,
+            "kind": self.kind,
+            "expr": self.binary if binary else self.expr,
+            "applied": self.applied,
+            "root_names": self.root_names,
+            "fingerprint": self.get_fingerprint(),
+            "output_name": self.output_name,
+        }
+
+    def estimated_size(self) -> int:
+        """Return the approximate bytes the entry's expression holds.
+
+        This is the size of its serialisations if any are held, else of its binary
+        serialisation (computed, but not kept).
+        """
+        held = len(self._json or "") + len(self._binary or b"")
+        return held or len(self._pl_expr.meta.serialize(format="binary"))
+
+    def copy(self) -> RegistryEntry:
+        """Return a shallow copy of the entry (sharing the live expression)."""
+        return RegistryEntry(
+            self.idx,
+            self.kind,
+            self._json,
+            self.applied,
+            self.root_names,
+            self.fingerprint,
+            self.output_name,
+            pl_expr=self._pl_expr,
+            binary=self._binary,
+        )
+
+    def __repr__(self) -> str:
+        """Show the entry's index, kind and expression."""
+        shown = self._pl_expr if self._pl_expr is not None else self._json
+        if shown is None:
+            shown = f"<{len(self._binary)} bytes>"
+        return f"RegistryEntry(idx={self.idx}, kind={self.kind!r}, expr={shown})"
+
+
+class ReadinessIndex:
+    """Inverted index from column name to the registry entries waiting on it.
+
+    Alongside it, each entry keeps a count of its root names missing from the
+    last schema the index was synced to, so an entry is ready when its count is
+    zero. Syncing to a new schema only touches the entries that depend on the
+    columns which appeared or disappeared since the last sync.
+    """
+
+    __slots__ = ("columns", "waiting", "n_missing", "ready")
+
+    def __init__(self, entries: Iterable[RegistryEntry], columns: Iterable[str]):
+        """Index the entries against the given columns."""
+        self.columns: set[str] = set(columns)
+        self.waiting: dict[str, set[int]] = {}
+        self.n_missing: dict[int, int] = {}
+        self.ready: set[int] = set()
+        for entry in entries:
+            self.add(entry)
+
+    def add(self, entry: RegistryEntry) -> None:
+        """Index a newly registered entry."""
+        roots = set(entry.root_names)
+        for col in roots:
+            self.waiting.setdefault(col, set()).add(entry.idx)
+        n = len(roots - self.columns)
+        self.n_missing[entry.idx] = n
+        if n == 0:
+            self.ready.add(entry.idx)
+
+    def remove(self, entry: RegistryEntry) -> None:
+        """Drop a removed entry from the index."""
+        for col in set(entry.root_names):
+            waiters = self.waiting[col]
+            waiters.discard(entry.idx)
+            if not waiters:
+                del self.waiting[col]
+        del self.n_missing[entry.idx]
+        self.ready.discard(entry.idx)
+
+    def sync(self, columns: Iterable[str]) -> list[int]:
+        """Update readiness for a new schema, returning the newly ready idxs."""
+        columns = set(columns)
+        added = columns - self.columns
+        removed = self.columns - columns
+        newly_ready = []
+        for col in added:
+            for idx in self.waiting.get(col, ()):
+                self.n_missing[idx] -= 1
+                if self.n_missing[idx] == 0:
+                    self.ready.add(idx)
+                    newly_ready.append(idx)
+        for col in removed:
+            for idx in self.waiting.get(col, ()):
+                self.n_missing[idx] += 1
+                self.ready.discard(idx)
+        self.columns = columns
+        return sorted(i for i in newly_ready if i in self.ready)
+
+    def copy(self) -> ReadinessIndex:
+        """Return an independent copy of the index."""
+        index = ReadinessIndex((), self.columns)
+        index.waiting = {col: set(idxs) for col, idxs in self.waiting.items()}
+        index.n_missing = dict(self.n_missing)
+        index.ready = set(self.ready)
+        return index
+
+
+class ExprRegistry:
+    """Registry of hopper expressions, keyed by their monotonic `idx`.
+
+    Entries are held in a dict in ascending `idx` order, so appending and
+    popping an entry are O(1), as is finding the earliest entry for a given
+    expression (through a fingerprint index, built on first use). Readiness
+    against a schema is tracked by a `ReadinessIndex` (built on the first
+    `sync_columns` call), so checking which entries are ready after columns
+    change costs time in the number of columns changed, not the number of
+    entries.
+
+    A registry is shared by reference between DataFrames derived from one another
+    (polars-config-meta copies the metadata dict shallowly), so deriving a frame
+    costs O(1) whatever the size of the hopper. Sharing is copy-on-write, through
+    versions: every `append` or `pop` bumps `version`, and stamps the entry with
+    it (popped entries are kept as tombstones). Each frame's metadata records
+    the version it last saw, so a frame derived before a mutation still sees the
+    registry as it was (`snapshot(version)`). Only the DataFrame that owns the
+    registry mutates it in place; a hopper on any other DataFrame (or on one
+    whose version is behind) takes a snapshot before mutating it. Snapshots
+    share the (effectively immutable) entries, so they cost a dict copy.
+    """
+
+    __slots__ = (
+        "_entries",
+        "_by_fingerprint",
+        "_readiness",
+        "_owner",
+        "_version",
+        "_added",
+        "_removed",
+    )
+
+    def __init__(self, entries: Iterable[RegistryEntry] = ()):
+        """Build a registry from entries (re-sorted by `idx`)."""
+        self._entries: dict[int, RegistryEntry] = {
+            e.idx: e for e in sorted(entries, key=lambda e: e.idx)
+        }
+        self._by_fingerprint: dict[str, list[int]] | None = None
+        self._readiness: ReadinessIndex | None = None
+        self._owner: weakref.ref | None = None
+        self._version = 0
+        # The version each entry was appended in (absent: 0, i.e. always there)
+        self._added: dict[int, int] = {}
+        # Tombstones of popped entries, with the version they were popped in
+        self._removed: dict[int, tuple[RegistryEntry, int]] = {}
+
+    # -------------------------------------------------------------------------
+    # Conversion
+    # -------------------------------------------------------------------------
+    @classmethod
+    def from_frame(cls, frame: pl.DataFrame) -> ExprRegistry:
+        """Build a registry from a DataFrame with (a subset of) the registry schema."""
+        cols = [c for c in reg_schema if c in frame.columns]
+        return cls(
+            RegistryEntry(**row) for row in frame.select(cols).iter_rows(named=True)
+        )
+
+    @classmethod
+    def from_json(cls, data: str) -> ExprRegistry:
+        """Parse a registry persisted with `to_json`."""
+        return cls.from_frame(pl.read_json(data.encode(), schema=reg_schema))
+
+    def to_frame(self) -> pl.DataFrame:
+        """Return the registry as a DataFrame with the registry schema."""
+        return pl.DataFrame(
+            [e.to_dict() for e in self._entries.values()],
+            schema=reg_schema,
+        )
+
+    def to_json(self) -> str:
+        """Serialise the registry to a JSON string for persisting."""
+        return self.to_frame().write_json()
+
+    @classmethod
+    def from_ipc(cls, data: bytes) -> ExprRegistry:
+        """Parse a registry persisted with `to_ipc`."""
+        frame = pl.read_ipc(io.BytesIO(data))
+        cols = [c for c in ipc_schema if c in frame.columns]
+        return cls(
+            RegistryEntry(**{"binary" if k == "expr" else k: v for k, v in row.items()})
+            for row in frame.select(cols).iter_rows(named=True)
+        )
+
+    def to_ipc(
+        self,
+        compression: Literal["uncompressed", "lz4", "zstd"] = "zstd",
+    ) -> bytes:
+        """Serialise the registry to Arrow IPC bytes, with binary expressions.
+
+        This is far more compact than `to_json` (which stores each expression as
+        JSON inside the JSON of the registry), especially with compression. Note
+        that Polars' binary expression format is only guaranteed to be readable by
+        the Polars version that wrote it.
+        """
+        frame = pl.DataFrame(
+            [e.to_dict(binary=True) for e in self._entries.values()],
+            schema=ipc_schema,
+        )
+        buffer = io.BytesIO()
+        frame.write_ipc(buffer, compression=compression)
+        return buffer.getvalue()
+
+    def encode(
+        self,
+        format: Literal["json", "ipc"] = "json",
+        compression: Literal["uncompressed", "lz4", "zstd"] = "zstd",
+    ) -> str:
+        """Encode the registry as a string, for metadata that must be JSON.
+
+        With `format="json"` this is `to_json`; with `format="ipc"`, the `to_ipc`
+        bytes (compressed as given) in base64, marked with a prefix so that
+        `decode` can tell the two apart.
+        """
+        if format == "json":
+            return self.to_json()
+        if format == "ipc":
+            return ipc_prefix + base64.b64encode(self.to_ipc(compression)).decode()
+        raise ValueError(f"Unknown registry format '{format}'")
+
+    @classmethod
+    def decode(cls, data: str) -> ExprRegistry:
+        """Parse a registry encoded with `encode` (in either format)."""
+        if data.startswith(ipc_prefix):
+            return cls.from_ipc(base64.b64decode(data[len(ipc_prefix) :]))
+        return cls.from_json(data)
+
+    # -------------------------------------------------------------------------
+    # Versions and ownership (copy-on-write between DataFrames)
+    # -------------------------------------------------------------------------
+    @property
+    def version(self) -> int:
+        """The number of mutations made to the registry (or the one it copies)."""
+        return self._version
+
+    def is_owned_by(self, df: object) -> bool:
+        """Whether `df` is the DataFrame allowed to mutate this registry."""
+        return self._owner is not None and self._owner() is df
+
+    def claim(self, df: object) -> ExprRegistry:
+        """Return a registry `df` may mutate: this one if it owns it, else a copy.
+
+        The owner also moves to a fresh copy once tombstones outnumber the live
+        entries, leaving them to the frames that may still need them.
+        """
+        if self.is_owned_by(df) and len(self._removed) <= max(64, len(self._entries)):
+            return self
+        registry = self.snapshot()
+        registry._owner = weakref.ref(df)
+        return registry
+
+    def snapshot(self, version: int | None = None) -> ExprRegistry:
+        """Return an unowned copy of the registry as it was at `version`.
+
+        The copy shares the entries (which are not mutated in place), and takes
+        over the version number, so that it can be told apart from the original
+        once either moves on.
+        """
+        if version is None or version == self._version:
+            registry = ExprRegistry()
+            registry._entries = dict(self._entries)
+            if self._readiness is not None:
+                registry._readiness = self._readiness.copy()
+        else:
+            added = self._added
+            live = [e for i, e in self._entries.items() if added.get(i, 0) <= version]
+            popped = [
+                e
+                for i, (e, removed) in self._removed.items()
+                if added.get(i, 0) <= version < removed
+            ]
+            registry = ExprRegistry(live + popped)
+        registry._version = self._version if version is None else version
+        return registry
+
+    def copy(self) -> ExprRegistry:
+        """Return an unowned copy of this registry."""
+        return self.snapshot()
+
+    # -------------------------------------------------------------------------
+    # Access and mutation
+    # -------------------------------------------------------------------------
+    def _fingerprint_index(self) -> dict[str, list[int]]:
+        """Return the fingerprint -> [idx, ...] index, building it if needed."""
+        if self._by_fingerprint is None:
+            index: dict[str, list[int]] = {}
+            for e in self._entries.values():
+                index.setdefault(e.get_fingerprint(), []).append(e.idx)
+            self._by_fingerprint = index
+        return self._by_fingerprint
+
+    def append(self, entry: RegistryEntry) -> None:
+        """Add an entry (its `idx` must exceed every registered `idx`)."""
+        self._version += 1
+        self._added[entry.idx] = self._version
+        self._entries[entry.idx] = entry
+        if self._by_fingerprint is not None:
+            self._by_fingerprint.setdefault(entry.get_fingerprint(), []).append(
+                entry.idx,
+            )
+        if self._readiness is not None:
+            self._readiness.add(entry)
+
+    def pop(self, idx: int) -> RegistryEntry | None:
+        """Remove and return the entry at `idx` (None if not registered)."""
+        entry = self._entries.pop(idx, None)
+        if entry is None:
+            return None
+        self._version += 1
+        self._removed[idx] = (entry, self._version)
+        if self._by_fingerprint is not None:
+            same = self._by_fingerprint[entry.fingerprint]
+            same.remove(idx)
+            if not same:
+                del self._by_fingerprint[entry.fingerprint]
+        if self._readiness is not None:
+            self._readiness.remove(entry)
+        return entry
+
+    def get(self, idx: int) -> RegistryEntry | None:
+        """Return the entry at `idx` (None if not registered)."""
+        return self._entries.get(idx)
+
+    def find(self, expr: pl.Expr) -> RegistryEntry | None:
+        """Return the earliest entry registered for an equal expression."""
+        matches = self._fingerprint_index().get(expr_fingerprint(expr))
+        return self._entries[matches[0]] if matches else None
+
+    def sync_columns(self, columns: Iterable[str]) -> list[int]:
+        """Track readiness against the given schema columns.
+
+        Returns the idxs of the entries that became ready (all of the ready ones,
+        the first time this is called), in ascending order.
+        """
+        if self._readiness is None:
+            self._readiness = ReadinessIndex(self._entries.values(), columns)
+            return sorted(self._readiness.ready)
+        return self._readiness.sync(columns)
+
+    def waiting_on(self, columns: Iterable[str], kinds: Iterable[str]) -> bool:
+        """Whether any entry of `kinds` needs one of `columns`.
+
+        This looks the columns up in the readiness index (building it, unsynced,
+        if need be), so costs time in the number of columns, not of entries.
+        """
+        if self._readiness is None:
+            self._readiness = ReadinessIndex(self._entries.values(), ())
+        waiting = self._readiness.waiting
+        return any(
+            self._entries[idx].kind in kinds
+            for col in columns
+            for idx in waiting.get(col, ())
+        )
+
+    def needed_columns(self) -> set[str] | None:
+        """Return the columns the entries read, or None if one may read any column.
+
+        That is an entry with a wildcard (`pl.all()`, `pl.exclude(...)`), a regex
+        or a selector anywhere in its tree (see `reads_any_column`), or without
+        root names (e.g. one reading no column at all, which Polars does not
+        tell apart from a selector at the top).
+        """
+        needed: set[str] = set()
+        for entry in self._entries.values():
+            if not entry.root_names or _has_any_column_node(json.loads(entry.expr)):
+                return None
+            needed.update(entry.root_names)
+        return needed
+
+    def is_ready(self, idx: int) -> bool:
+        """Whether the entry at `idx` had all its columns at the last sync."""
+        return self._readiness is not None and idx in self._readiness.ready
+
+    def ready(self, *kinds: str) -> list[int]:
+        """Return the idxs ready at the last sync (of the given kinds, if any)."""
+        if self._readiness is None:
+            return []
+        return sorted(
+            idx
+            for idx in self._readiness.ready
+            if not kinds or self._entries[idx].kind in kinds
+        )
+
+    def entries(self, *kinds: str) -> list[RegistryEntry]:
+        """Return the entries (of the given kinds, if any) in `idx` order."""
+        if not kinds:
+            return list(self._entries.values())
+        return [e for e in self._entries.values() if e.kind in kinds]
+
+    def held_entries(self) -> Iterator[RegistryEntry]:
+        """Iterate over the entries held, including those popped (tombstones)."""
+        yield from self._entries.values()
+        for entry, _ in self._removed.values():
+            yield entry
+
+    def exprs(self, kind: str) -> list[pl.Expr]:
+        """Return the live expressions of one kind, in `idx` order."""
+        return [e.pl_expr for e in self._entries.values() if e.kind == kind]
+
+    def __len__(self) -> int:
+        """Count the registered entries."""
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[RegistryEntry]:
+        """Iterate over the entries in `idx` order."""
+        return iter(list(self._entries.values()))
+
+    def __contains__(self, idx: object) -> bool:
+        """Whether an entry with this `idx` is registered."""
+        return idx in self._entries
+
+    def __repr__(self) -> str:
+        """Show the registry as its DataFrame form."""
+        return f"ExprRegistry({self.to_frame()!r})"
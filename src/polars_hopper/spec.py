@@ -0,0 +1,155 @@
+"""Reusable hopper templates, compiled once and attached to many frames.
+
+A `HopperSpec` holds a set of expressions registered once: each is serialised,
+fingerprinted and has its root and output names resolved when the spec is
+built, and the plan for applying them is built once per input schema. Attaching
+the spec to a frame (`spec.attach(df)` or `df.hopper.use(spec)`) only stores
+references to this shared state in the frame's metadata, whatever the number of
+expressions:
+
+    spec = HopperSpec(filters=[pl.col("a") > 1], addcols=[pl.col("a").alias("b")])
+    for df in frames:
+        out = spec.attach(df).hopper.apply_ready_exprs()
+
+The spec's registry is never mutated: as with any registry shared between frames
+(see `ExprRegistry`), a frame's hopper takes its own copy before adding or
+applying expressions, so only its applied/pending state is per frame.
+"""
+
+from __future__ import annotations
+
+import threading
+import uuid
+from collections.abc import Iterable
+
+import polars as pl
+
+from .ordering import hoist_filters
+from .planner import (
+    HopperPlan,
+    IntoExprs,
+    Record,
+    aggregation,
+    build_plan,
+    record_expr,
+)
+from .registry import ExprRegistry, RegistryEntry
+
+
+class HopperSpec:
+    """A compiled, immutable set of hopper expressions to attach to frames.
+
+    Expressions are registered in the order filters, selects, addcols, aggregations
+    (as if added with `add_filters`, `add_selects`, `add_addcols` and
+    `add_aggregations` in turn). Use `from_frame` to capture a hopper with its
+    expressions in any other order.
+    """
+
+    __slots__ = ("registry", "max_idx", "lists", "records", "lock", "_plans")
+
+    # The number of input schemas whose plans are kept
+    plan_cache_size = 16
+
+    def __init__(
+        self,
+        *,
+        filters: Iterable[pl.Expr] = (),
+        selects: Iterable[pl.Expr] = (),
+        addcols: Iterable[pl.Expr] = (),
+        aggregations: Iterable[tuple[IntoExprs, IntoExprs]] = (),
+    ):
+        """Register the expressions once, computing their static properties.
+
+        Each aggregation is a `(by, aggs)` pair, as passed to `add_aggregations`.
+        """
+        records = {
+            uuid.uuid4().hex[:12]: aggregation(by, aggs) for by, aggs in aggregations
+        }
+        packed = [record_expr(rid, record) for rid, record in records.items()]
+        exprs = [
+            (kind, expr)
+            for kind, group in (
+                ("f", filters),
+                ("s", selects),
+                ("a", addcols),
+                ("g", packed),
+            )
+            for expr in group
+        ]
+        registry = ExprRegistry(
+            RegistryEntry.from_expr(idx, kind, expr)
+            for idx, (kind, expr) in enumerate(exprs)
+        )
+        self._compile(registry, len(exprs) - 1, records)
+
+    def _compile(
+        self,
+        registry: ExprRegistry,
+        max_idx: int,
+        records: dict[str, Record],
+    ) -> None:
+        """Take `registry` and `records` (never mutated from now on) as the state."""
+        self.registry = registry
+        self.max_idx = max_idx
+        self.records = records
+        self.lists = {kind: registry.exprs(kind) for kind in "fsagj"}
+        self._plans: dict[tuple, HopperPlan] = {}
+        # Shared as the hopper lock of every frame the spec is attached to
+        self.lock = threading.RLock()
+
+    @classmethod
+    def from_frame(cls, df: pl.DataFrame | pl.LazyFrame) -> HopperSpec:
+        """Capture the pending expressions of a frame's hopper as a spec."""
+        registry = df.hopper._get_expr_registry()
+        if registry is not None and registry.entries("j"):
+            # The frames to join are not part of the compiled state
+            raise ValueError("A HopperSpec cannot hold joins: apply them first")
+        spec = cls.__new__(cls)
+        if registry is None:
+            spec._compile(ExprRegistry(), -1, {})
+        else:
+            max_idx = df.config_meta.get_metadata().get("hopper_max_idx", -1)
+            spec._compile(registry.snapshot(), max_idx, dict(df.hopper._records()))
+        return spec
+
+    def plan(
+        self,
+        schema: pl.Schema | dict,
+        kinds: Iterable[str] = ("f", "s", "a", "g", "j"),
+        schedule: str = "idx",
+    ) -> HopperPlan:
+        """Return the plan for frames of `schema`, built once per schema and kinds.
+
+        The plan is shared by every frame it is used for, so must not be mutated.
+        With `schedule="filters_first"`, filters are hoisted (see `hoist_filters`).
+        """
+        schema = pl.Schema(schema)
+        kinds = tuple(kinds)
+        key = (tuple(schema.items()), kinds, schedule)
+        with self.lock:
+            plan = self._plans.get(key)
+            if plan is None:
+                if len(self._plans) >= self.plan_cache_size:
+                    del self._plans[next(iter(self._plans))]
+                plan = build_plan(self.registry, schema, kinds, self.records)
+                if schedule == "filters_first":
+                    plan = hoist_filters(plan)
+                self._plans[key] = plan
+            return plan
+
+    def attach(self, df: pl.DataFrame | pl.LazyFrame) -> pl.DataFrame | pl.LazyFrame:
+        """Give `df` a hopper holding the spec's expressions, in O(1), returning it.
+
+        Any hopper state `df` already had is replaced.
+        """
+        df.hopper.use(self)
+        return df
+
+    def __len__(self) -> int:
+        """Count the spec's expressions."""
+        return len(self.registry)
+
+    def __repr__(self) -> str:
+        """Show the number of expressions of each kind."""
+        counts = ", ".join(f"{k}={len(v)}" for k, v in self.lists.items())
+        return f"HopperSpec({counts})"
@@ -0,0 +1,90 @@
+"""Apply a hopper plan batch by batch, for inputs too large to hold in memory.
+
+The plan is built once, from the source's schema, and then each batch of rows
+is run through it in turn, so only one batch (and its output) is in memory at a
+time. This gives the same rows as applying the plan to the whole frame only if
+every step decides each row from that row alone: a filter or select that
+aggregates or windows over the frame (e.g. `pl.col("a") > pl.col("a").mean()`)
+would see one batch instead of the whole frame, so such plans are rejected (see
+`check_streamable`).
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterable, Iterator
+
+import polars as pl
+
+from .ordering import is_row_separable
+from .planner import HopperPlan
+
+
+def check_streamable(plan: HopperPlan) -> None:
+    """Raise a ValueError if any step of `plan` cannot be applied batch by batch."""
+    offending = [
+        step
+        for step in plan
+        if step.kind in ("g", "j") or not is_row_separable(step.expr)
+    ]
+    if offending:
+        listed = ", ".join(f"{step.idx}: {step.expr}" for step in offending)
+        raise ValueError(
+            "Cannot apply the hopper batch by batch: these expressions aggregate or "
+            f"look across rows, so need the whole frame ({listed})",
+        )
+
+
+def _lazy_batches(lf: pl.LazyFrame, batch_size: int) -> Iterator[pl.DataFrame]:
+    """Stream a LazyFrame's result in batches of about `batch_size` rows."""
+    if hasattr(lf, "collect_batches"):
+        yield from lf.collect_batches(chunk_size=batch_size, lazy=True)
+        return
+    # Older Polars: re-run the query for each slice (memory stays bounded)
+    offset = 0
+    while (batch := lf.slice(offset, batch_size).collect()).height:
+        yield batch
+        offset += batch.height
+
+
+def iter_source_batches(
+    source: pl.LazyFrame | pl.DataFrame | Iterable[pl.DataFrame],
+    batch_size: int,
+) -> Iterator[pl.DataFrame]:
+    """Iterate over the DataFrame batches of `source`.
+
+    The source may be a LazyFrame (e.g. from `pl.scan_csv`), streamed in batches of
+    about `batch_size` rows; a DataFrame, sliced into batches of `batch_size`
+    rows; the reader from `pl.read_csv_batched`; or any iterable of DataFrames.
+    """
+    if isinstance(source, pl.LazyFrame):
+        yield from _lazy_batches(source, batch_size)
+    elif isinstance(source, pl.DataFrame):
+        yield from source.iter_slices(batch_size)
+    elif hasattr(source, "next_batches"):
+        while batches := source.next_batches(1):
+            yield from batches
+    else:
+        yield from source
+
+
+def peek_schema(
+    source: pl.LazyFrame | pl.DataFrame | Iterable[pl.DataFrame],
+    batches: Iterator[pl.DataFrame],
+) -> tuple[pl.Schema | None, Iterator[pl.DataFrame]]:
+    """Return the schema of the source's batches, and the batches to iterate.
+
+    A Lazy/DataFrame's schema is known up front; otherwise the first batch is
+    read (and put back at the front of the batches). An empty source has no
+    schema (None).
+    """
+    if isinstance(source, (pl.LazyFrame, pl.DataFrame)):
+        return source.collect_schema(), batches
+    first = next(batches, None)
+    if first is None:
+        return None, batches
+    return first.collect_schema(), _chain(first, batches)
+
+
+def _chain(first: pl.DataFrame, rest: Iterator[pl.DataFrame]) -> Iterator[pl.DataFrame]:
+    yield first
+    yield from rest
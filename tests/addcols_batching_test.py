@@ -0,0 +1,80 @@
+"""Tests for batching independent ready addcols into single `with_columns` calls."""
+
+import polars as pl
+import pytest
+
+
+def _sequential(df, exprs):
+    for expr in exprs:
+        df = df.with_columns(expr)
+    return df
+
+
+ADDCOLS_CASES = {
+    "independent": [
+        (pl.col("a") + 1).alias("b"),
+        (pl.col("a") * 2).alias("c"),
+        (pl.col("a") - 1).alias("d"),
+    ],
+    "reads_earlier_output": [
+        (pl.col("a") + 1).alias("b"),
+        (pl.col("b") * 2).alias("c"),
+        (pl.col("a") * 3).alias("d"),
+    ],
+    "overwrites_earlier_output": [
+        (pl.col("a") + 1).alias("b"),
+        (pl.col("b") * 10).alias("b"),
+    ],
+    "overwrites_earlier_input": [
+        (pl.col("a") + 1).alias("b"),
+        (pl.col("a") * 100).alias("a"),
+    ],
+    "wildcard_barrier": [
+        (pl.col("a") + 1).alias("b"),
+        pl.sum_horizontal(pl.all()).alias("total"),
+        (pl.col("a") * 2).alias("c"),
+    ],
+}
+
+
+@pytest.mark.parametrize("fuse", [True, False])
+@pytest.mark.parametrize("case", list(ADDCOLS_CASES))
+def test_batched_addcols_match_sequential(case, fuse):
+    """Batching never changes the result of applying addcols one by one."""
+    exprs = ADDCOLS_CASES[case]
+    df = pl.DataFrame({"a": [1, 2, 3]})
+    df.hopper.add_addcols(*exprs)
+    out = df.hopper.apply_ready_addcols(fuse=fuse)
+    assert out.equals(_sequential(pl.DataFrame({"a": [1, 2, 3]}), exprs))
+
+
+def test_addcols_batches_respect_dependencies():
+    """Independent addcols share a batch; dependent ones come after their inputs."""
+    plans = {}
+    for case, exprs in ADDCOLS_CASES.items():
+        df = pl.DataFrame({"a": [1, 2, 3]})
+        df.hopper.add_addcols(*exprs)
+        plans[case] = [[s.idx for s in b.steps] for b in df.hopper.plan().batches]
+
+    assert plans["independent"] == [[0, 1, 2]]
+    assert plans["reads_earlier_output"] == [[0, 2], [1]]
+    assert plans["overwrites_earlier_output"] == [[0], [1]]
+    assert plans["overwrites_earlier_input"] == [[0, 1]]
+    assert plans["wildcard_barrier"] == [[0], [1], [2]]
+
+
+def test_independent_addcols_use_one_with_columns_call(monkeypatch):
+    """Three independent addcols run in a single `with_columns` call."""
+    calls = []
+    original = pl.DataFrame.with_columns
+
+    def counting_with_columns(self, *args, **kwargs):
+        calls.append(args)
+        return original(self, *args, **kwargs)
+
+    monkeypatch.setattr(pl.DataFrame, "with_columns", counting_with_columns)
+
+    df = pl.DataFrame({"a": [1, 2, 3]})
+    df.hopper.add_addcols(*ADDCOLS_CASES["independent"])
+    df.hopper.apply_ready_addcols(fuse=False)
+    assert len(calls) == 1 and len(calls[0]) == 3
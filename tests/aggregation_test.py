@@ -0,0 +1,160 @@
+"""Tests for group-by aggregations (kind 'g') in the hopper."""
+
+import polars as pl
+import pytest
+
+import polars_hopper
+from polars_hopper import HopperSpec, aggregation, record_expr, record_id
+
+
+def _sales():
+    return pl.DataFrame(
+        {"shop": ["a", "b", "a", "c", "b"], "price": [1, 2, 3, 4, 5]},
+    )
+
+
+def test_aggregation_record():
+    """The record keeps the keys and aggregations as given, under its id."""
+    by = ["shop", pl.col("day")]
+    aggs = [pl.col("price").sum().alias("total"), pl.len().alias("n")]
+    record = aggregation(by, aggs)
+    assert [k.meta.output_name() for k in record.by] == ["shop", "day"]
+    assert [a.meta.output_name() for a in record.aggs] == ["total", "n"]
+    expr = record_expr("abc", record)
+    assert record_id(expr) == "abc"
+    assert sorted(expr.meta.root_names()) == ["day", "price", "shop"]
+    with pytest.raises(ValueError, match="at least one key"):
+        aggregation([], aggs)
+
+
+def test_aliases_survive():
+    """Aliased keys and aggregations keep their names when applied."""
+    df = _sales()
+    df.hopper.add_aggregations(
+        pl.col("shop").alias("store"),
+        [pl.col("price").sum().alias("total"), pl.col("price").max().alias("top")],
+    )
+    out = df.hopper.apply_ready_exprs()
+    assert out.to_dict(as_series=False) == {
+        "store": ["a", "b", "c"],
+        "total": [4, 7, 4],
+        "top": [3, 5, 4],
+    }
+
+
+def test_aggregation_waits_for_its_columns():
+    """An aggregation stays pending until its keys and values exist."""
+    df = pl.DataFrame({"price": [1, 2, 3]})
+    df.hopper.add_aggregations("shop", pl.col("price").sum().alias("total"))
+    assert df.hopper.apply_ready_exprs() is df
+    assert len(df.hopper.list_aggregations()) == 1
+
+    with_shop = df.with_columns(shop=pl.Series(["a", "b", "a"]))
+    out = with_shop.hopper.apply_ready_aggregations()
+    assert out.to_dict(as_series=False) == {"shop": ["a", "b"], "total": [4, 2]}
+    assert with_shop.hopper.list_aggregations() == []
+
+
+def test_wildcard_aggregation_needs_every_column():
+    """An aggregation over a wildcard keeps the columns it may read from pruning."""
+    df = pl.DataFrame({"k": [1, 1, 2], "v": [1, 2, 3], "junk": [0, 0, 0]})
+    df.hopper.add_aggregations(by="k", aggs=pl.exclude("k", "junk").sum())
+    [expr] = df.hopper.list_aggregations()
+    assert expr.meta.root_names() == ["k"]
+    assert df.hopper.prune_columns(keep=[]) is df
+    out = df.hopper.apply_ready_exprs()
+    assert out.to_dict(as_series=False) == {"k": [1, 2], "v": [3, 3]}
+
+
+def test_regex_aggregation_waits_for_the_columns_it_names():
+    """An aggregation on a regex is ready once the columns it names exist."""
+    df = pl.DataFrame({"shop": ["a", "b", "a"]})
+    df.hopper.add_aggregations(by=pl.col("^sh.*$"), aggs=pl.col("price").sum())
+    assert df.hopper.apply_ready_exprs() is df
+
+    with_price = df.with_columns(price=pl.Series([1, 2, 3]))
+    out = with_price.hopper.apply_ready_exprs()
+    assert out.to_dict(as_series=False) == {"shop": ["a", "b"], "price": [4, 2]}
+
+
+@pytest.mark.parametrize("fuse", [True, False])
+def test_cascade_through_aggregation(fuse):
+    """Row filters, then the aggregation, then filters on its output, in one call."""
+    df = _sales()
+    df.hopper.add_filters(pl.col("total") > 4)
+    df.hopper.add_addcols((pl.col("price") * 10).alias("cents"))
+    df.hopper.add_filters(pl.col("price") > 1)
+    df.hopper.add_aggregations(
+        "shop",
+        [pl.col("cents").sum().alias("total_cents"), pl.col("price").sum()],
+    )
+    df.hopper.add_addcols(pl.col("price").alias("total"))
+
+    out = df.hopper.apply_ready_exprs(fuse=fuse)
+    assert out.to_dict(as_series=False) == {
+        "shop": ["b"],
+        "total_cents": [70],
+        "price": [7],
+        "total": [7],
+    }
+    assert df.hopper.list_aggregations() == []
+
+
+def test_plan_shows_aggregation_step():
+    """The plan schedules the aggregation, with the filter it enables after it."""
+    df = _sales()
+    df.hopper.add_filters(pl.col("total") > 4)
+    df.hopper.add_aggregations("shop", pl.col("price").sum().alias("total"))
+    plan = df.hopper.plan()
+    assert [(step.idx, step.kind) for step in plan] == [(1, "g"), (0, "f")]
+    assert plan.steps[1].depends_on == [1]
+    assert plan.schema == pl.Schema({"shop": pl.String, "total": pl.Int64})
+
+
+def test_lazyframe_aggregation():
+    """Aggregations apply to LazyFrames, staying lazy."""
+    lf = _sales().lazy()
+    lf.hopper.add_aggregations("shop", pl.col("price").max().alias("top"))
+    lf.hopper.add_filters(pl.col("top") >= 4)
+    out = lf.hopper.apply_ready_exprs()
+    assert isinstance(out, pl.LazyFrame)
+    assert out.collect().to_dict(as_series=False) == {
+        "shop": ["b", "c"],
+        "top": [5, 4],
+    }
+
+
+def test_spec_aggregations():
+    """Specs take aggregations as (by, aggs) pairs, registered last."""
+    spec = HopperSpec(
+        filters=[pl.col("price") > 1],
+        aggregations=[("shop", pl.col("price").sum().alias("total"))],
+    )
+    assert repr(spec) == "HopperSpec(f=1, s=0, a=0, g=1, j=0)"
+    out = spec.attach(_sales()).hopper.apply_ready_exprs()
+    assert out.to_dict(as_series=False) == {
+        "shop": ["b", "a", "c"],
+        "total": [7, 3, 4],
+    }
+
+
+def test_parquet_roundtrip(tmp_path):
+    """Pending aggregations are written to parquet and restored."""
+    pytest.importorskip("pyarrow")
+    df = pl.DataFrame({"price": [1, 2, 3]})
+    df.hopper.add_aggregations("shop", pl.col("price").sum().alias("total"))
+    path = tmp_path / "agg.parquet"
+    df.hopper.write_parquet(str(path))
+
+    restored = polars_hopper.read_parquet(path)
+    assert len(restored.hopper.list_aggregations()) == 1
+    out = restored.with_columns(shop=pl.lit("a")).hopper.apply_ready_exprs()
+    assert out.to_dict(as_series=False) == {"shop": ["a"], "total": [6]}
+
+
+def test_streaming_rejects_aggregations():
+    """Batch-by-batch application refuses a ready aggregation."""
+    df = _sales()
+    df.hopper.add_aggregations("shop", pl.col("price").first())
+    with pytest.raises(ValueError, match="batch by batch"):
+        list(df.hopper.apply_batches(batch_size=2))
@@ -0,0 +1,58 @@
+"""Tests for applying many frames' hoppers at once with `apply_many`."""
+
+import polars as pl
+
+import polars_hopper
+from polars_hopper import HopperSpec, apply_many, record_stats
+
+
+def _spec():
+    return HopperSpec(
+        filters=[pl.col("a") > 1, pl.col("b") < 10, pl.col("zz") > 1],
+        addcols=[(pl.col("a") * 2).alias("b")],
+    )
+
+
+def _frames():
+    return [pl.DataFrame({"a": list(range(i, i + 8))}) for i in range(5)]
+
+
+def test_matches_serial_loop():
+    """Each frame comes out as the serial loop gives it, pending metadata included."""
+    spec = _spec()
+    serial = [spec.attach(df).hopper.apply_ready_exprs() for df in _frames()]
+    many = apply_many(_frames(), spec)
+
+    assert len(many) == len(serial)
+    for a, b in zip(many, serial):
+        assert a.equals(b)
+        assert [str(e) for e in a.hopper.list_filters()] == [
+            str(e) for e in b.hopper.list_filters()
+        ]
+        assert a.config_meta.get_metadata()["hopper_max_idx"] == 3
+
+
+def test_mixed_hoppers():
+    """Frames keep their own hoppers without a spec, and their other metadata."""
+    plain = pl.DataFrame({"a": [1, 2, 3]})
+    own = pl.DataFrame({"a": [1, 2, 3]})
+    own.hopper.add_filters(pl.col("a") != 2)
+    own.config_meta.set(source="tenant-1")
+    blocked = pl.DataFrame({"a": [1]})
+    blocked.hopper.add_filters(pl.col("x") > 0)
+
+    out = apply_many([plain, own, blocked])
+    assert out[0] is plain
+    assert out[1]["a"].to_list() == [1, 3]
+    assert out[1].config_meta.get_metadata()["source"] == "tenant-1"
+    assert out[1].hopper.list_filters() == []
+    assert out[2] is blocked
+    assert len(blocked.hopper.list_filters()) == 1
+
+
+def test_instrumented_one_by_one():
+    """With listeners registered, every frame's expressions are measured."""
+    with record_stats() as stats:
+        apply_many(_frames()[:2], _spec())
+    assert [s.idx for s in stats.records] == [0, 3, 1] * 2
+    assert polars_hopper.listeners == []
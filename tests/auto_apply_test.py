@@ -0,0 +1,80 @@
+"""Tests for the opt-in auto-apply mode of proxied calls."""
+
+import polars as pl
+
+import polars_hopper
+
+
+def test_off_by_default():
+    """Without auto mode, proxied calls leave ready filters pending."""
+    df = pl.DataFrame({"user": ["a", "b", "c"], "repos": [1, 5, 3]})
+    df.hopper.add_filters(pl.col("repos") > 1, pl.col("stars") >= 10)
+    df.hopper.add_addcols((pl.col("stars") * 2).alias("double"))
+    out = df.hopper.with_columns(stars=pl.lit(20))
+    assert out.height == 3
+    assert len(out.hopper.list_filters()) == 2
+
+
+def test_applies_filters_when_columns_appear():
+    """With auto mode, filters made ready by a proxied call apply straight away."""
+    df = pl.DataFrame({"user": ["a", "b", "c"], "repos": [1, 5, 3]})
+    df.hopper.add_filters(pl.col("repos") > 1, pl.col("stars") >= 10)
+    df.hopper.add_addcols((pl.col("stars") * 2).alias("double"))
+    df.hopper.auto_apply()
+    stars = pl.DataFrame({"user": ["a", "b", "c"], "stars": [50, 5, 20]})
+    out = df.hopper.join(stars, on="user")
+
+    assert out["user"].to_list() == ["c"]
+    assert out.hopper.list_filters() == []
+    # Only filters by default: the addcols stays pending
+    assert "double" not in out.columns
+    assert len(out.hopper.list_addcols()) == 1
+
+
+def test_addcols_and_lazy():
+    """Auto mode can include addcols, and works on LazyFrames (staying lazy)."""
+    df = pl.DataFrame({"user": ["a", "b", "c"], "repos": [1, 5, 3]})
+    df.hopper.add_filters(pl.col("repos") > 1, pl.col("stars") >= 10)
+    df.hopper.add_addcols((pl.col("stars") * 2).alias("double"))
+    lf = df.lazy()
+    lf.hopper.auto_apply("f", "a")
+    out = lf.hopper.with_columns(stars=pl.col("repos") * 4)
+    assert isinstance(out, pl.LazyFrame)
+    assert out.collect()["double"].to_list() == [40, 24]
+
+
+def test_no_planning_unless_needed(monkeypatch):
+    """Calls gaining no needed columns return their result without planning."""
+    calls = []
+    original = polars_hopper.build_plan
+
+    def counting_build_plan(*args, **kwargs):
+        calls.append(args[1])
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(polars_hopper, "build_plan", counting_build_plan)
+    df = pl.DataFrame({"user": ["a", "b", "c"], "repos": [1, 5, 3]})
+    df.hopper.add_filters(pl.col("repos") > 1, pl.col("stars") >= 10)
+    df.hopper.add_addcols((pl.col("stars") * 2).alias("double"))
+    df.hopper.auto_apply()
+    out = df.hopper.with_columns(other=pl.lit(1))
+    out = out.hopper.sort("repos")
+    assert calls == []
+    assert out.height == 3
+
+    out = out.hopper.with_columns(stars=pl.lit(10))
+    assert len(calls) == 1
+    assert out["user"].to_list() == ["c", "b"]
+
+
+def test_inherited_and_disabled():
+    """Derived frames keep the setting, until turned off."""
+    df = pl.DataFrame({"user": ["a", "b", "c"], "repos": [1, 5, 3]})
+    df.hopper.add_filters(pl.col("repos") > 1, pl.col("stars") >= 10)
+    df.hopper.add_addcols((pl.col("stars") * 2).alias("double"))
+    df.hopper.auto_apply()
+    derived = df.hopper.with_columns(other=pl.lit(1))
+    derived.hopper.auto_apply(enabled=False)
+    out = derived.hopper.with_columns(stars=pl.lit(20))
+    assert len(out.hopper.list_filters()) == 2
+    assert df.hopper.with_columns(stars=pl.lit(20)).height == 2
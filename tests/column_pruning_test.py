@@ -0,0 +1,130 @@
+"""Tests for pruning the columns no pending expression needs."""
+
+import polars as pl
+import pytest
+
+from polars_hopper import apply_many
+
+
+def test_needed_columns():
+    """Pending expressions' root names and the keep-list are needed, in frame order."""
+    df = pl.DataFrame({f"c{i}": [i, i + 1, i + 2] for i in range(10)})
+    df.hopper.add_filters(pl.col("c1") > 1, pl.col("x") > 0)
+    df.hopper.add_addcols((pl.col("c2") * 10).alias("x"))
+    assert df.hopper.needed_columns() == ["c1", "c2"]
+    assert df.hopper.needed_columns(keep=["c9", "c0", "new"]) == [
+        "c0",
+        "c1",
+        "c2",
+        "c9",
+    ]
+
+
+def test_prune_columns_keeps_the_hopper():
+    """Pruned frames keep their pending expressions, which still apply."""
+    df = pl.DataFrame({f"c{i}": [i, i + 1, i + 2] for i in range(10)})
+    df.hopper.add_filters(pl.col("c1") > 1, pl.col("x") > 0)
+    df.hopper.add_addcols((pl.col("c2") * 10).alias("x"))
+    pruned = df.hopper.prune_columns(keep=["c0"])
+    assert pruned.columns == ["c0", "c1", "c2"]
+    out = pruned.hopper.apply_ready_exprs()
+    assert out.columns == ["c0", "c1", "c2", "x"]
+    assert out["x"].to_list() == [30, 40]
+    # Once applied, only the keep-list is left; then there is nothing to drop
+    final = out.hopper.prune_columns(keep=["c0", "x"])
+    assert final.columns == ["c0", "x"]
+    assert final.hopper.prune_columns(keep=["c0", "x"]) is final
+
+
+def test_wildcards_need_everything():
+    """An expression that may read any column stops pruning."""
+    df = pl.DataFrame({f"c{i}": [i, i + 1, i + 2] for i in range(10)})
+    df.hopper.add_filters(pl.col("c1") > 1, pl.col("x") > 0)
+    df.hopper.add_addcols((pl.col("c2") * 10).alias("x"))
+    df.hopper.add_selects(pl.all().exclude("c3"))
+    assert df.hopper.needed_columns() == df.columns
+    assert df.hopper.prune_columns(keep=[]) is df
+
+
+@pytest.mark.parametrize(
+    "select",
+    [pl.col("^c[3-5]$"), pl.col("c1", "^c[3-5]$"), pl.exclude("c0"), pl.all()],
+)
+def test_regexes_need_everything(select):
+    """A pending regex (or wildcard) select keeps the columns it may match."""
+    df = pl.DataFrame({f"c{i}": [i, i + 1, i + 2] for i in range(10)})
+    df.hopper.add_filters(pl.col("c1") > 1, pl.col("x") > 0)
+    df.hopper.add_addcols((pl.col("c2") * 10).alias("x"))
+    df.hopper.add_selects(select)
+    assert df.hopper.prune_columns(keep=["c0"]) is df
+
+
+def test_auto_prune_on_apply():
+    """With auto-prune, each application drops what is no longer needed."""
+    df = pl.DataFrame({f"c{i}": [i, i + 1, i + 2] for i in range(10)})
+    df.hopper.add_filters(pl.col("c1") > 1, pl.col("x") > 0)
+    df.hopper.add_addcols((pl.col("c2") * 10).alias("x"))
+    df.hopper.auto_prune(keep=["c0", "x"])
+    out = df.hopper.apply_ready_exprs()
+    assert out.columns == ["c0", "x"]
+    assert out["x"].to_list() == [30, 40]
+    assert out.hopper.list_filters() == []
+
+    # Lazily, the projection goes into the query
+    df = pl.DataFrame({f"c{i}": [i, i + 1, i + 2] for i in range(10)})
+    df.hopper.add_filters(pl.col("c1") > 1, pl.col("x") > 0)
+    df.hopper.add_addcols((pl.col("c2") * 10).alias("x"))
+    lf = df.lazy()
+    lf.hopper.auto_prune(keep=["c5"])
+    out = lf.hopper.apply_ready_filters()
+    assert out.collect_schema().names() == ["c2", "c5"]
+
+
+def test_auto_prune_without_ready_steps():
+    """Auto-prune also drops unneeded columns when nothing is ready."""
+    df = pl.DataFrame({"a": [1], "b": [2], "c": [3]})
+    df.hopper.add_filters(pl.col("z") > 0, pl.col("a") > 5)
+    df.hopper.auto_prune(keep=["b"], enabled=True)
+    out = df.hopper.apply_ready_selects()
+    assert out.columns == ["a", "b"]
+    df.hopper.auto_prune(enabled=False)
+    assert df.hopper.apply_ready_selects() is df
+
+
+def test_apply_many_prunes():
+    """apply_many prunes as applying each frame would."""
+    frames = []
+    for _ in range(2):
+        df = pl.DataFrame({f"c{i}": [i, i + 1, i + 2] for i in range(10)})
+        df.hopper.add_filters(pl.col("c1") > 1, pl.col("x") > 0)
+        df.hopper.add_addcols((pl.col("c2") * 10).alias("x"))
+        df.hopper.auto_prune(keep=["c0", "x"])
+        frames.append(df)
+    outs = apply_many(frames)
+    assert all(out.columns == ["c0", "x"] for out in outs)
+
+
+@pytest.mark.parametrize(
+    "predicate",
+    [
+        pl.col("c1") > pl.all().min(),
+        pl.col("c1") > pl.exclude("c1").max(),
+        pl.col("c1").filter(pl.col("^c[3-5]$") > 3).sum() > 0,
+        pl.sum_horizontal(pl.col("c1"), pl.nth(4)) > 0,
+        pl.col("c1").over(pl.all().exclude("c1", "c2")) > 0,
+    ],
+)
+def test_nested_wildcards_need_everything(predicate):
+    """A wildcard, regex or selector inside an expression keeps every column."""
+    df = pl.DataFrame({f"c{i}": [i, i + 1, i + 2] for i in range(10)})
+    df.hopper.add_filters(predicate)
+    assert df.hopper.needed_columns() == df.columns
+    assert df.hopper.prune_columns(keep=[]) is df
+
+
+def test_nested_wildcard_keeps_the_columns_it_reads():
+    """The columns a nested wildcard reads are still there when it applies."""
+    df = pl.DataFrame({"zz": [1, 5], "a": [0, 9]})
+    df.hopper.add_filters(pl.col("zz") > pl.min_horizontal(pl.all().min()))
+    out = df.hopper.prune_columns(keep=[]).hopper.apply_ready_exprs()
+    assert out.to_dict(as_series=False) == {"zz": [1, 5], "a": [0, 9]}
@@ -0,0 +1,85 @@
+"""Tests for the copy-on-write sharing of hopper state between derived frames."""
+
+import polars as pl
+
+from polars_hopper.registry import ExprRegistry, RegistryEntry
+
+
+def _registry(df):
+    return df.config_meta.get_metadata()["hopper_expr_register"]
+
+
+def test_derived_frames_share_state():
+    """Deriving frames copies no hopper state, however long the pipeline."""
+    df = pl.DataFrame({"a": [1, 2, 3, 7]})
+    df.hopper.add_filters(pl.col("a") > 1)
+    derived = df
+    for i in range(5):
+        derived = derived.hopper.with_columns(pl.lit(i).alias(f"x{i}"))
+
+    assert _registry(derived) is _registry(df)
+    filters = df.config_meta.get_metadata()["hopper_filters"]
+    assert derived.config_meta.get_metadata()["hopper_filters"] is filters
+    assert derived.hopper.version == df.hopper.version == 1
+
+
+def test_derived_mutation_does_not_leak():
+    """Adding to a derived frame's hopper leaves the source's untouched."""
+    df = pl.DataFrame({"a": [1, 2, 3, 7]})
+    df.hopper.add_filters(pl.col("a") > 1)
+    derived = df.hopper.with_columns(b=pl.lit(1))
+    derived.hopper.add_filters(pl.col("b") > 0)
+
+    assert len(df.hopper.list_filters()) == 1
+    assert len(_registry(df)) == 1
+    assert len(derived.hopper.list_filters()) == 2
+    assert _registry(derived) is not _registry(df)
+
+
+def test_owner_mutation_does_not_leak():
+    """Frames derived before the source's hopper changes keep what they saw."""
+    df = pl.DataFrame({"a": [1, 2, 3, 7]})
+    df.hopper.add_filters(pl.col("a") > 1)
+    derived = df.hopper.with_columns(b=pl.lit(1))
+    df.hopper.add_filters(pl.col("a") < 5)
+    out = df.hopper.apply_ready_filters()
+
+    assert out["a"].to_list() == [2, 3]
+    assert df.hopper.list_filters() == []
+    assert df.hopper.version == 4
+    # The derived frame still sees only the first filter, at version 1
+    assert [str(e) for e in derived.hopper.list_filters()] == [str(pl.col("a") > 1)]
+    assert derived.hopper.version == 1
+    assert derived.hopper.apply_ready_filters()["a"].to_list() == [2, 3, 7]
+
+
+def test_snapshot_at_version():
+    """A registry can be viewed as it was at any earlier version."""
+    registry = ExprRegistry()
+    for idx in range(3):
+        registry.append(RegistryEntry.from_expr(idx, "f", pl.col("a") > idx))
+    registry.pop(0)
+    registry.pop(2)
+
+    assert registry.version == 5
+    assert [e.idx for e in registry.snapshot(0)] == []
+    assert [e.idx for e in registry.snapshot(3)] == [0, 1, 2]
+    assert [e.idx for e in registry.snapshot(4)] == [1, 2]
+    assert [e.idx for e in registry.snapshot()] == [1]
+    assert registry.snapshot(3).version == 3
+
+
+def test_owner_drops_tombstones():
+    """The owner moves to a fresh registry once popped entries pile up."""
+    df = pl.DataFrame({"a": [1]})
+    df.hopper.add_filters(*(pl.col("a") > -i for i in range(100)))
+    derived = df.hopper.with_columns(b=pl.lit(1))
+    first = _registry(df)
+    df.hopper.apply_ready_filters()
+
+    # The pops went to the shared registry, then the next mutation compacts it
+    assert _registry(df) is first
+    df.hopper.add_filters(pl.col("a") > 0)
+    assert _registry(df) is not first
+    assert len(_registry(df)) == 1
+    assert len(derived.hopper.list_filters()) == 100
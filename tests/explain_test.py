@@ -0,0 +1,61 @@
+"""Tests for the `explain()` dry run of pending hopper expressions."""
+
+import polars as pl
+
+
+def test_explain_sections():
+    """The report lists ready steps, blocked ones, the schema and the Polars plan."""
+    df = pl.DataFrame({"a": list(range(10))})
+    df.hopper.add_filters(pl.col("a") > 1, pl.col("b") < 10, pl.col("zz") > 1)
+    df.hopper.add_addcols((pl.col("a") * 2).alias("b"))
+    report = df.hopper.explain()
+    sections = [line for line in report.splitlines() if line and line[0] != " "]
+
+    assert sections[0] == "HOPPER PLAN: 3 ready, 1 pending"
+    assert "READY (in order of application)" in sections
+    assert "POLARS PLAN (optimized)" in sections
+    ready = report.split("READY (in order of application)\n")[1].split("\n\n")[0]
+    assert [line.split()[2] for line in ready.splitlines()[1:]] == ["0", "3", "1"]
+    pending = report.split("PENDING\n")[1].split("\n\n")[0]
+    assert pending.splitlines()[1].split()[:3] == ["2", "f", "zz"]
+    assert "  b: Int64" in report
+    assert "WITH_COLUMNS" in report
+
+
+def test_explain_does_not_mutate():
+    """Explaining leaves the pending expressions and the registry untouched."""
+    df = pl.DataFrame({"a": list(range(10))})
+    df.hopper.add_filters(pl.col("a") > 1, pl.col("b") < 10, pl.col("zz") > 1)
+    df.hopper.add_addcols((pl.col("a") * 2).alias("b"))
+    before = [str(e) for e in df.hopper.list_filters()]
+    df.hopper.explain()
+    df.hopper.explain("f", optimized=False)
+
+    assert [str(e) for e in df.hopper.list_filters()] == before
+    assert len(df.config_meta.get_metadata()["hopper_expr_register"]) == 4
+    assert df.hopper.apply_ready_exprs()["a"].to_list() == [2, 3, 4]
+
+
+def test_plan_blocked_columns():
+    """The plan maps each pending expression to the columns it still lacks."""
+    df = pl.DataFrame({"a": list(range(10))})
+    df.hopper.add_filters(pl.col("a") > 1, pl.col("b") < 10, pl.col("zz") > 1)
+    df.hopper.add_addcols((pl.col("a") * 2).alias("b"))
+    plan = df.hopper.plan()
+    assert plan.pending == [2]
+    assert plan.blocked == {2: ["zz"]}
+    # Only filters: the addcols never runs, so the filter on 'b' is blocked too
+    df = pl.DataFrame({"a": list(range(10))})
+    df.hopper.add_filters(pl.col("a") > 1, pl.col("b") < 10, pl.col("zz") > 1)
+    df.hopper.add_addcols((pl.col("a") * 2).alias("b"))
+    assert df.hopper.plan("f").blocked == {1: ["b"], 2: ["zz"]}
+
+
+def test_explain_lazyframe():
+    """A LazyFrame hopper can be explained without collecting it."""
+    df = pl.DataFrame({"a": list(range(10))})
+    df.hopper.add_filters(pl.col("a") > 1, pl.col("b") < 10, pl.col("zz") > 1)
+    df.hopper.add_addcols((pl.col("a") * 2).alias("b"))
+    report = df.lazy().hopper.explain()
+    assert report.startswith("HOPPER PLAN: 3 ready, 1 pending\n\n")
+    assert "FILTER" in report
@@ -0,0 +1,150 @@
+"""Tests for selectivity-aware ordering of ready filters (`order="selectivity"`)."""
+
+import polars as pl
+import pytest
+
+from polars_hopper import expr_cost, is_row_separable
+
+
+@pytest.mark.filterwarnings("ignore::polars.exceptions.PolarsInefficientMapWarning")
+def test_cost_classes():
+    """Comparisons are cheaper than is_in, string functions, regexes and UDFs."""
+    costs = [
+        expr_cost(pl.col("a") > 1),
+        expr_cost(pl.col("a").is_in([1, 2])),
+        expr_cost(pl.col("s").str.starts_with("x")),
+        expr_cost(pl.col("s").str.contains("x", literal=True)),
+        expr_cost(pl.col("s").str.contains("x.*")),
+        expr_cost(pl.col("a").map_elements(lambda x: x > 1, return_dtype=pl.Boolean)),
+    ]
+    assert costs == sorted(costs)
+    assert len(set(costs)) == len(costs) - 1  # a literal contains is a plain one
+
+
+def test_list_contains_is_not_a_regex():
+    """`list.contains` is costed as a list function, and orders like any filter."""
+    assert expr_cost(pl.col("l").list.contains(1)) < expr_cost(
+        pl.col("s").str.contains("x.*"),
+    )
+    df = pl.DataFrame({"a": [1, 2, 3], "l": [[1], [2], [1, 3]]})
+    df.hopper.add_filters(pl.col("l").list.contains(1), pl.col("a") > 1)
+    assert "list.contains" in df.hopper.explain(order="selectivity")
+    out = df.hopper.apply_ready_filters(order="selectivity")
+    assert out["a"].to_list() == [3]
+
+
+@pytest.mark.parametrize(
+    ("expr", "separable"),
+    [
+        (pl.col("a") > 1, True),
+        (pl.col("a").is_in([1, 2]) & pl.col("s").is_not_null(), True),
+        (pl.col("s").str.contains("x"), True),
+        (pl.col("a") > pl.col("a").mean(), False),
+        ((pl.col("a") > 1).over("s"), False),
+        (pl.col("a").shift() > 1, False),
+        (pl.col("a").is_unique(), False),
+        (pl.len() > 1, False),
+        (pl.all().name.suffix("_x"), True),
+    ],
+)
+def test_row_separability(expr, separable):
+    """Filters that aggregate or look across rows are not reorderable."""
+    try:
+        expr.meta.serialize(format="json")
+    except pl.exceptions.ComputeError:
+        # Expressions this Polars version cannot serialize are never reordered
+        separable = False
+    assert is_row_separable(expr) is separable
+
+
+def test_selectivity_order_is_inspectable():
+    """The plan shows the chosen filter order with its estimates."""
+    df = pl.DataFrame({"a": list(range(100)), "s": [f"row-{i}" for i in range(100)]})
+    df.hopper.add_filters(
+        pl.col("s").str.contains(r"^row-\d+$"),
+        pl.col("a") >= 0,
+        pl.col("a") < 10,
+        pl.col("a").is_in([1, 2, 3, 50]),
+        pl.col("b") > 0,
+    )
+    steps = df.hopper.plan("f", order="selectivity").to_frame()
+
+    assert steps["idx"].to_list() == [2, 3, 1, 0]
+    assert steps["selectivity"].to_list() == [0.1, 0.04, 1.0, 1.0]
+    assert steps["cost"].is_not_null().all()
+    # The default plan keeps registry order, without estimates
+    default = df.hopper.plan("f").to_frame()
+    assert default["idx"].to_list() == [0, 1, 2, 3]
+    assert default["selectivity"].is_null().all()
+
+
+def test_selectivity_order_matches_default_result():
+    """Reordering the filters does not change the result or the pending state."""
+    df = pl.DataFrame({"a": list(range(100)), "s": [f"row-{i}" for i in range(100)]})
+    df.hopper.add_filters(
+        pl.col("s").str.contains(r"^row-\d+$"),
+        pl.col("a") >= 0,
+        pl.col("a") < 10,
+        pl.col("a").is_in([1, 2, 3, 50]),
+        pl.col("b") > 0,
+    )
+    ordered = df.hopper.apply_ready_filters(order="selectivity")
+    df = pl.DataFrame({"a": list(range(100)), "s": [f"row-{i}" for i in range(100)]})
+    df.hopper.add_filters(
+        pl.col("s").str.contains(r"^row-\d+$"),
+        pl.col("a") >= 0,
+        pl.col("a") < 10,
+        pl.col("a").is_in([1, 2, 3, 50]),
+        pl.col("b") > 0,
+    )
+    default = df.hopper.apply_ready_filters()
+
+    assert ordered.equals(default)
+    assert ordered["a"].to_list() == [1, 2, 3]
+    assert [str(e) for e in ordered.hopper.list_filters()] == [
+        str(pl.col("b") > 0),
+    ]
+
+
+def test_non_separable_filter_stays_in_place():
+    """An aggregating filter splits the run; filters never cross it."""
+    df = pl.DataFrame({"a": list(range(10))})
+    df.hopper.add_filters(
+        pl.col("a") > 0,
+        pl.col("a") < 5,
+        pl.col("a") > pl.col("a").mean(),  # sees the rows left by the two above
+        pl.col("a") != 0,
+        pl.col("a") > 3,
+    )
+    plan = df.hopper.plan(order="selectivity")
+
+    assert [step.idx for step in plan] == [1, 0, 2, 4, 3]
+    assert plan.steps[2].selectivity is None
+    out = df.hopper.apply_ready_filters(order="selectivity")
+    assert out["a"].to_list() == [4]
+
+
+def test_selectivity_order_with_cascade():
+    """Filters made ready by an addcols are estimated on the sample after it."""
+    df = pl.DataFrame({"a": list(range(20))})
+    df.hopper.add_filters(pl.col("b") > 0, pl.col("b") < 4)
+    df.hopper.add_addcols((pl.col("a") % 5).alias("b"))
+
+    plan = df.hopper.plan(order="selectivity")
+    assert [step.idx for step in plan] == [2, 0, 1]
+    out = df.hopper.apply_ready_exprs(order="selectivity")
+    assert out["b"].to_list() == [1, 2, 3] * 4
+
+
+def test_unknown_order():
+    """An unknown ordering policy is rejected."""
+    df = pl.DataFrame({"a": list(range(100)), "s": [f"row-{i}" for i in range(100)]})
+    df.hopper.add_filters(
+        pl.col("s").str.contains(r"^row-\d+$"),
+        pl.col("a") >= 0,
+        pl.col("a") < 10,
+        pl.col("a").is_in([1, 2, 3, 50]),
+        pl.col("b") > 0,
+    )
+    with pytest.raises(ValueError, match="Unknown filter order"):
+        df.hopper.apply_ready_filters(order="random")
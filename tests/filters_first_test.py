@@ -0,0 +1,90 @@
+"""Tests for the filters-first scheduling policy (`schedule="filters_first"`)."""
+
+import polars as pl
+import pytest
+
+from polars_hopper import HopperSpec, is_row_separable, record_stats
+
+
+def test_filters_run_before_addcols_they_do_not_need():
+    """Each filter moves ahead of the addcols it does not read from."""
+    df = pl.DataFrame({"a": list(range(100)), "s": [f"row-{i}" for i in range(100)]})
+    df.hopper.add_addcols(
+        pl.col("s").str.replace(r"row-(\d+)", "r$1").alias("t"),  # costly
+        (pl.col("a") * 2).alias("b"),
+    )
+    df.hopper.add_filters(
+        pl.col("a") < 10,  # needs no addcols
+        pl.col("b") > 4,  # needs "b"
+    )
+    assert [s.idx for s in df.hopper.plan()] == [0, 1, 2, 3]
+    assert [s.idx for s in df.hopper.plan(schedule="filters_first")] == [2, 0, 1, 3]
+
+
+def test_same_result_fewer_rows():
+    """The result is unchanged, and the addcols only see the filtered rows."""
+    df = pl.DataFrame({"a": list(range(100)), "s": [f"row-{i}" for i in range(100)]})
+    df.hopper.add_addcols(
+        pl.col("s").str.replace(r"row-(\d+)", "r$1").alias("t"),
+        (pl.col("a") * 2).alias("b"),
+    )
+    df.hopper.add_filters(pl.col("a") < 10, pl.col("b") > 4)
+    expected = df.hopper.apply_ready_exprs()
+    df = pl.DataFrame({"a": list(range(100)), "s": [f"row-{i}" for i in range(100)]})
+    df.hopper.add_addcols(
+        pl.col("s").str.replace(r"row-(\d+)", "r$1").alias("t"),
+        (pl.col("a") * 2).alias("b"),
+    )
+    df.hopper.add_filters(pl.col("a") < 10, pl.col("b") > 4)
+    with record_stats() as stats:
+        out = df.hopper.apply_ready_exprs(schedule="filters_first")
+
+    assert out.equals(expected)
+    assert out["a"].to_list() == [3, 4, 5, 6, 7, 8, 9]
+    rows_in = {s.idx: s.rows_in for s in stats.records}
+    assert rows_in == {2: 100, 0: 10, 1: 10, 3: 10}
+
+
+def test_not_past_cross_row_addcols():
+    """A filter stays behind an addcols computed across rows."""
+    df = pl.DataFrame({"a": [5, 1, 4, 2, 3]})
+    df.hopper.add_addcols(pl.col("a").rank().alias("r"))
+    df.hopper.add_filters(pl.col("a") > 2)
+    plan = df.hopper.plan(schedule="filters_first")
+    assert [s.idx for s in plan] == [0, 1]
+    out = df.hopper.apply_ready_exprs(schedule="filters_first", fuse=False)
+    assert out["r"].to_list() == [5.0, 4.0, 3.0]
+
+
+def test_python_udfs():
+    """Elementwise Python functions are row-separable, batch ones are not."""
+    assert is_row_separable(pl.col("s").map_elements(len, return_dtype=pl.Int64))
+    assert not is_row_separable(
+        pl.col("s").map_batches(lambda s: s, return_dtype=pl.String),
+    )
+
+
+def test_spec_plans_per_schedule():
+    """A spec caches its plan for each schedule separately."""
+    template = pl.DataFrame(
+        {"a": list(range(100)), "s": [f"row-{i}" for i in range(100)]}
+    )
+    template.hopper.add_addcols(
+        pl.col("s").str.replace(r"row-(\d+)", "r$1").alias("t"),
+        (pl.col("a") * 2).alias("b"),
+    )
+    template.hopper.add_filters(pl.col("a") < 10, pl.col("b") > 4)
+    spec = HopperSpec.from_frame(template)
+    df = spec.attach(pl.DataFrame(template.to_dict()))
+    first = df.hopper.plan(schedule="filters_first")
+    assert [s.idx for s in first] == [2, 0, 1, 3]
+    assert [s.idx for s in df.hopper.plan()] == [0, 1, 2, 3]
+    assert df.hopper.plan(schedule="filters_first") is first
+
+
+def test_unknown_schedule():
+    """An unknown schedule raises."""
+    df = pl.DataFrame({"a": [1, 2, 3]})
+    df.hopper.add_filters(pl.col("a") > 1)
+    with pytest.raises(ValueError, match="Unknown schedule"):
+        df.hopper.apply_ready_exprs(schedule="cheapest")
@@ -0,0 +1,76 @@
+"""Tests for fused application of ready filters (`fuse=True`)."""
+
+import polars as pl
+import pytest
+
+
+def test_fused_filters_match_sequential():
+    """Fused and one-by-one application give the same frame and pending state."""
+    df = pl.DataFrame({"a": [1, 2, 3, 4, 5, 6], "b": [6, 5, 4, 3, 2, 1]})
+    df.hopper.add_filters(
+        pl.col("a") > 1,
+        pl.col("b") > 1,
+        pl.col("a") > pl.col("a").mean(),
+        pl.col("c") > 0,
+    )
+    fused = df.hopper.apply_ready_filters(fuse=True)
+    df = pl.DataFrame({"a": [1, 2, 3, 4, 5, 6], "b": [6, 5, 4, 3, 2, 1]})
+    df.hopper.add_filters(
+        pl.col("a") > 1,
+        pl.col("b") > 1,
+        pl.col("a") > pl.col("a").mean(),
+        pl.col("c") > 0,
+    )
+    sequential = df.hopper.apply_ready_filters(fuse=False)
+
+    assert fused.equals(sequential)
+    assert fused["a"].to_list() == [4, 5]
+    assert len(fused.hopper.list_filters()) == 1
+    assert [
+        e.idx for e in fused.config_meta.get_metadata()["hopper_expr_register"]
+    ] == [3]
+
+
+def test_fused_filters_scan_the_frame_once(monkeypatch):
+    """With fuse=True the ready filters are applied as one query, not per filter."""
+    calls = []
+    original = pl.DataFrame.filter
+
+    def counting_filter(self, *args, **kwargs):
+        calls.append(args)
+        return original(self, *args, **kwargs)
+
+    monkeypatch.setattr(pl.DataFrame, "filter", counting_filter)
+
+    df = pl.DataFrame({"a": [1, 2, 3, 4, 5, 6], "b": [6, 5, 4, 3, 2, 1]})
+    df.hopper.add_filters(
+        pl.col("a") > 1,
+        pl.col("b") > 1,
+        pl.col("a") > pl.col("a").mean(),
+        pl.col("c") > 0,
+    )
+    df.hopper.apply_ready_filters(fuse=True)
+    assert calls == [], "Fused filters should run as a single lazy query."
+
+    df = pl.DataFrame({"a": [1, 2, 3, 4, 5, 6], "b": [6, 5, 4, 3, 2, 1]})
+    df.hopper.add_filters(
+        pl.col("a") > 1,
+        pl.col("b") > 1,
+        pl.col("a") > pl.col("a").mean(),
+        pl.col("c") > 0,
+    )
+    df.hopper.apply_ready_filters(fuse=False)
+    assert len(calls) == 3, "Unfused filters each call df.filter."
+
+
+@pytest.mark.parametrize("fuse", [True, False])
+def test_fused_filters_respect_cascade_order(fuse):
+    """Filters either side of an applied addcols are not fused across it."""
+    df = pl.DataFrame({"x": [1, 2, 3, 4]})
+    df.hopper.add_filters(pl.col("x") > 1)
+    df.hopper.add_addcols((pl.col("x").sum()).alias("total"))
+    df.hopper.add_filters(pl.col("total") > 5, pl.col("x") < 4)
+
+    out = df.hopper.apply_ready_exprs(fuse=fuse)
+    assert out["x"].to_list() == [2, 3]
+    assert out["total"].to_list() == [9, 9], "The sum must see the first filter only."
@@ -2,6 +2,8 @@
 
 import polars as pl
 
+from polars_hopper.registry import ExprRegistry, expr_fingerprint
+
 
 def test_hopper_max_idx_initialization():
     """Ensures the plugin sets hopper_max_idx to -1 if it is absent.
@@ -83,9 +85,10 @@ def test_hopper_max_idx_increments_existing():
 
 
 def test_expr_registry_creation_and_schema():
-    """Verify that adding expressions creates 'hopper_expr_register' NDJSON in metadata.
+    """Verify that adding expressions creates 'hopper_expr_register' in metadata.
 
-    Correct schema columns: idx, kind, expr, applied, root_names.
+    Correct schema columns: idx, kind, expr, applied, root_names, fingerprint,
+    output_name.
     """
     df = pl.DataFrame({"num": [1, 2, 3]})
     meta_before = df.config_meta.get_metadata()
@@ -109,16 +112,23 @@ def test_expr_registry_creation_and_schema():
         "Registry should be created upon first addition."
     )
 
-    json_str = meta_after_add["hopper_expr_register"]
-    reg_df = pl.read_json(json_str.encode())
+    reg_df = meta_after_add["hopper_expr_register"].to_frame()
 
     # Confirm the columns
-    expected_cols = {"idx", "kind", "expr", "applied", "root_names"}
+    expected_cols = {
+        "idx",
+        "kind",
+        "expr",
+        "applied",
+        "root_names",
+        "fingerprint",
+        "output_name",
+    }
     assert set(reg_df.columns) == expected_cols, (
         "Registry must have the correct schema columns."
     )
     # We have exactly 1 row
-    assert reg_df.shape == (1, 5)
+    assert reg_df.shape == (1, 7)
     row = reg_df.to_dicts()[0]
     assert row["idx"] == 0, (
         "First expression should have idx=0 (hopper_max_idx started at -1)."
@@ -131,6 +141,10 @@ def test_expr_registry_creation_and_schema():
     )
     # 'root_names' must reflect the columns the expression references
     assert row["root_names"] == ["num"], "Should detect the 'num' column as root name."
+    assert row["output_name"] == "num", "Should record the expression's output name."
+    assert row["fingerprint"] == expr_fingerprint(pl.col("num") > 1), (
+        "Should record the fingerprint of the expression's binary serialisation."
+    )
 
 
 def test_expr_registry_multiple_additions_kinds_and_max_idx():
@@ -156,10 +170,9 @@ def test_expr_registry_multiple_additions_kinds_and_max_idx():
     )
 
     # Parse the registry
-    json_str = meta["hopper_expr_register"]
-    reg_df = pl.read_json(json_str.encode())
+    reg_df = meta["hopper_expr_register"].to_frame()
     # We added 2 filter, 2 select, 1 addcols => total 5 new rows
-    assert reg_df.shape == (5, 5), "We should have 5 total expressions in the registry."
+    assert reg_df.shape == (5, 7), "We should have 5 total expressions in the registry."
 
     # Sort by idx to see them in ascending order
     reg_sorted = reg_df.sort("idx")
@@ -197,9 +210,8 @@ def test_expr_registry_root_names_for_various_exprs():
     )
 
     meta = df.config_meta.get_metadata()
-    json_str = meta["hopper_expr_register"]
-    reg_df = pl.read_json(json_str.encode())
-    assert reg_df.shape == (4, 5), "We added 4 expressions total."
+    reg_df = meta["hopper_expr_register"].to_frame()
+    assert reg_df.shape == (4, 7), "We added 4 expressions total."
 
     # We'll map the 'expr' to the 'root_names' in the registry
     # Because .sort() might reorder them, let's just examine them in the order added
@@ -235,3 +247,57 @@ def test_expr_registry_root_names_for_various_exprs():
         assert not r["applied"], (
             "No expressions have been applied yet, so 'applied' is false."
         )
+
+
+def test_expr_registry_is_live_and_json_roundtrips():
+    """The registry is held as a live object, and parsed once if persisted as JSON."""
+    df = pl.DataFrame({"a": [1, 2, 3]})
+    df.hopper.add_filters(pl.col("a") > 1, pl.col("a") < 3)
+    registry = df.config_meta.get_metadata()["hopper_expr_register"]
+    assert isinstance(registry, ExprRegistry)
+    assert [e.idx for e in registry] == [0, 1]
+
+    # Simulate metadata read back from a file: the registry is a JSON string
+    df2 = pl.DataFrame({"a": [1, 2, 3]})
+    df2.config_meta.set(
+        hopper_filters=df.hopper.list_filters(),
+        hopper_expr_register=registry.to_json(),
+        hopper_max_idx=1,
+    )
+    assert df2.hopper._read_expr_registry().equals(registry.to_frame())
+    assert isinstance(
+        df2.config_meta.get_metadata()["hopper_expr_register"],
+        ExprRegistry,
+    ), "JSON registry should be parsed once and kept live."
+    assert df2.hopper.apply_ready_filters()["a"].to_list() == [2]
+
+
+def test_expr_registry_copy_on_write_between_frames():
+    """A derived DF shares its parent's registry until it mutates it."""
+    df = pl.DataFrame({"a": [1, 2, 3]})
+    df.hopper.add_filters(pl.col("a") > 1)
+    df2 = df.hopper.select(pl.col("a"))
+    reg = df.config_meta.get_metadata()["hopper_expr_register"]
+    assert df2.config_meta.get_metadata()["hopper_expr_register"] is reg
+
+    df2.hopper.add_filters(pl.col("a") < 3)
+    assert len(reg) == 1, "The parent's registry must not see the child's addition."
+    assert len(df2.config_meta.get_metadata()["hopper_expr_register"]) == 2
+
+
+def test_expr_registry_idx_index_and_fingerprint_lookup():
+    """Registry entries keep the live expr, and pop matches by fingerprint."""
+    df = pl.DataFrame({"a": [1, 2, 3]})
+    gt = pl.col("a") > 1
+    df.hopper.add_filters(gt, pl.col("a") < 3, pl.col("a") > 1)
+    registry = df.config_meta.get_metadata()["hopper_expr_register"]
+    assert registry.get(0).pl_expr is gt, (
+        "Entry should hold the expr it was added with."
+    )
+    assert registry.get(0).fingerprint == registry.get(2).fingerprint
+
+    # An equal (but distinct) expr object pops the earliest matching idx
+    assert df.hopper.pop_expr_from_registry(pl.col("a") > 1)
+    assert [e.idx for e in registry] == [1, 2]
+    assert registry.find(pl.col("a") > 1).idx == 2
+    assert not df.hopper.pop_expr_from_registry(pl.col("a") > 100)
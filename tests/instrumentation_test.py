@@ -0,0 +1,91 @@
+"""Tests for per-expression instrumentation (listeners and `record_stats`)."""
+
+import polars as pl
+
+import polars_hopper
+from polars_hopper import record_stats
+
+
+def test_record_stats_per_expression():
+    """Every applied expression is recorded, with its pass, rows and sizes."""
+    df = pl.DataFrame({"a": list(range(10))})
+    df.hopper.add_filters(pl.col("a") > 1, pl.col("b") < 10)
+    df.hopper.add_addcols((pl.col("a") * 2).alias("b"))
+    with record_stats() as stats:
+        out = df.hopper.apply_ready_exprs()
+
+    frame = stats.to_frame()
+    assert frame["idx"].to_list() == [0, 2, 1]
+    assert frame["kind"].to_list() == ["f", "a", "f"]
+    assert frame["expr"][0] == str(pl.col("a") > 1)
+    assert frame["pass_no"].to_list() == [0, 0, 1]
+    assert frame["rows_in"].to_list() == [10, 8, 8]
+    assert frame["rows_out"].to_list() == [8, 8, 3]
+    # The addcols grows the frame, the filters shrink it
+    assert frame["size_out"][1] > frame["size_in"][1]
+    assert (frame["wall_s"] >= 0).all()
+    expected = pl.DataFrame({"a": list(range(10))})
+    expected.hopper.add_filters(pl.col("a") > 1, pl.col("b") < 10)
+    expected.hopper.add_addcols((pl.col("a") * 2).alias("b"))
+    assert out.equals(expected.hopper.apply_ready_exprs())
+
+
+def test_cascade_pass_numbers():
+    """Expressions made ready by a later one are reported in the next pass."""
+    df = pl.DataFrame({"a": [1, 2, 3]})
+    df.hopper.add_filters(pl.col("b") > 2)
+    df.hopper.add_addcols((pl.col("a") + 1).alias("b"))
+    with record_stats() as stats:
+        df.hopper.apply_ready_exprs()
+    assert [(s.idx, s.pass_no) for s in stats.records] == [(1, 0), (0, 1)]
+
+
+def test_listener_lifecycle():
+    """Listeners are called while registered, and the recorder detaches itself."""
+    seen = []
+    polars_hopper.add_listener(seen.append)
+    try:
+        df = pl.DataFrame({"a": list(range(10))})
+        df.hopper.add_filters(pl.col("a") > 1, pl.col("b") < 10)
+        df.hopper.add_addcols((pl.col("a") * 2).alias("b"))
+        df.hopper.apply_ready_filters()
+    finally:
+        polars_hopper.remove_listener(seen.append)
+    assert [s.idx for s in seen] == [0]
+
+    df = pl.DataFrame({"a": list(range(10))})
+    df.hopper.add_filters(pl.col("a") > 1, pl.col("b") < 10)
+    df.hopper.add_addcols((pl.col("a") * 2).alias("b"))
+    df.hopper.apply_ready_filters()
+    assert len(seen) == 1
+    assert polars_hopper.listeners == []
+
+
+def test_uninstrumented_apply_stays_fused(monkeypatch):
+    """Without listeners, the ready filters still run as one fused query."""
+    calls = []
+    original = pl.DataFrame.filter
+
+    def counting_filter(self, *args, **kwargs):
+        calls.append(args)
+        return original(self, *args, **kwargs)
+
+    monkeypatch.setattr(pl.DataFrame, "filter", counting_filter)
+    df = pl.DataFrame({"a": list(range(10))})
+    df.hopper.add_filters(pl.col("a") > 1, pl.col("b") < 10)
+    df.hopper.add_addcols((pl.col("a") * 2).alias("b"))
+    df.hopper.apply_ready_exprs()
+    assert calls == []
+
+
+def test_lazyframes_are_not_instrumented():
+    """A LazyFrame hopper executes nothing, so reports no stats."""
+    df = pl.DataFrame({"a": list(range(10))})
+    df.hopper.add_filters(pl.col("a") > 1, pl.col("b") < 10)
+    df.hopper.add_addcols((pl.col("a") * 2).alias("b"))
+    lf = df.lazy()
+    with record_stats() as stats:
+        out = lf.hopper.apply_ready_exprs()
+    assert isinstance(out, pl.LazyFrame)
+    assert stats.records == []
+    assert stats.to_frame().columns == list(polars_hopper.ExprStats._fields)
@@ -0,0 +1,231 @@
+"""Tests for deferred joins (kind 'j') in the hopper."""
+
+import polars as pl
+import pytest
+from polars.testing import assert_frame_equal
+
+import polars_hopper
+from polars_hopper import HopperSpec, join, record_expr, record_id
+
+
+def _users():
+    return pl.DataFrame(
+        {
+            "uid": [1, 2, 3, 4],
+            "country": ["FR", "DE", "FR", "US"],
+            "age": [30, 40, 50, 20],
+        },
+    )
+
+
+def _events():
+    return pl.DataFrame({"uid": [1, 1, 2, 3, 4, 4, 5], "n": [1, 2, 3, 4, 5, 6, 7]})
+
+
+def test_join_record():
+    """The record keeps the frame to join lazily, the keys and the strategy."""
+    record = join(_users(), ["uid", pl.col("day")], "left")
+    assert isinstance(record.other, pl.LazyFrame)
+    assert record.how == "left"
+    assert [k.meta.output_name() for k in record.on] == ["uid", "day"]
+    assert record_id(record_expr("abc", record)) == "abc"
+    with pytest.raises(ValueError, match="Unknown join strategy"):
+        join(_users(), "uid", "sideways")
+
+
+def test_join_waits_for_its_keys():
+    """A join stays pending until its keys exist, and holds the other side lazily."""
+    df = pl.DataFrame({"n": [1, 2]})
+    df.hopper.add_joins(_users(), on="uid")
+    assert df.hopper.apply_ready_exprs() is df
+    [record] = df.config_meta.get_metadata()["hopper_records"].values()
+    assert isinstance(record.other, pl.LazyFrame)
+
+    with_uid = df.with_columns(uid=pl.Series([3, 9]))
+    out = with_uid.hopper.apply_ready_joins()
+    assert out.to_dict(as_series=False) == {
+        "n": [1],
+        "uid": [3],
+        "country": ["FR"],
+        "age": [50],
+    }
+    # The applied join lets go of the frame it joined with
+    assert out.config_meta.get_metadata()["hopper_records"] == {}
+
+
+@pytest.mark.parametrize("fuse", [True, False])
+def test_ready_filters_run_first_and_push_down(fuse):
+    """Ready filters run before the join, and other-side filters are pushed down."""
+    df = _events()
+    df.hopper.add_filters(pl.col("country") == "FR")
+    df.hopper.add_joins(_users(), on="uid")
+    df.hopper.add_filters(pl.col("n") > 1)
+
+    plan = df.hopper.plan()
+    assert [(step.idx, step.kind) for step in plan] == [(2, "f"), (1, "j"), (0, "f")]
+    pushed = _users().filter(*plan.steps[1].pushdown)
+    assert pushed["uid"].to_list() == [1, 3]
+
+    out = df.hopper.apply_ready_exprs(fuse=fuse)
+    assert out.to_dict(as_series=False) == {
+        "uid": [1, 3],
+        "n": [2, 4],
+        "country": ["FR", "FR"],
+        "age": [30, 50],
+    }
+    assert df.hopper.list_joins() == []
+
+
+def test_push_down_only_other_side_row_filters():
+    """Filters reading the frame's own columns, or whole columns, are not pushed."""
+    df = _events().with_columns(age=pl.lit(0))
+    df.hopper.add_joins(_users(), on="uid")
+    df.hopper.add_filters(
+        pl.col("age") == 0,
+        pl.col("country") != "US",
+        pl.col("country").n_unique() > 1,
+        pl.col("country").is_not_null() | (pl.col("n") > 5),
+    )
+    plan = df.hopper.plan()
+    assert [step.kind for step in plan] == ["f", "j", "f", "f", "f"]
+    pushed = _users().filter(*plan.steps[1].pushdown)
+    assert pushed["uid"].to_list() == [1, 2, 3]
+
+    out = df.hopper.apply_ready_exprs()
+    assert out.to_dict(as_series=False) == {
+        "uid": [1, 1, 2, 3],
+        "n": [1, 2, 3, 4],
+        "age": [0, 0, 0, 0],
+        "country": ["FR", "FR", "DE", "FR"],
+        "age_right": [30, 30, 40, 50],
+    }
+
+
+@pytest.mark.parametrize("fuse", [True, False])
+def test_push_down_stops_at_an_aggregating_filter(fuse):
+    """A filter after one that aggregates over the joined frame is not pushed."""
+    df = pl.DataFrame({"k": [1, 2, 3], "a": [1, 2, 3]})
+    other = pl.DataFrame(
+        {"k": [1, 2, 3], "country": ["FR", "FR", "DE"], "w": [1, 5, 10]}
+    )
+    df.hopper.add_joins(other, on="k")
+    df.hopper.add_filters(pl.col("w") > pl.col("w").mean(), pl.col("country") == "FR")
+    plan = df.hopper.plan()
+    assert [step.kind for step in plan] == ["j", "f", "f"]
+    assert plan.steps[0].pushdown == []
+    assert df.hopper.apply_ready_exprs(fuse=fuse).height == 0
+
+
+@pytest.mark.parametrize("how", ["inner", "left", "right", "full", "semi", "anti"])
+@pytest.mark.parametrize(
+    "predicate",
+    [
+        pl.col("n") > 5,
+        pl.col("n") > pl.col("n").mean(),
+        pl.col("country") != "US",
+        pl.col("country").is_null(),
+    ],
+)
+def test_filters_through_joins_keep_the_result(how, predicate):
+    """Filters moved through a join keep the rows they would keep after it."""
+    df = _events()
+    df.hopper.add_joins(_users(), on="uid", how=how)
+    df.hopper.add_filters(predicate)
+    expected = _events().join(_users(), on="uid", how=how)
+    if set(predicate.meta.root_names()) <= set(expected.columns):
+        expected = expected.filter(predicate)
+    out = df.hopper.apply_ready_exprs()
+    assert_frame_equal(out, expected, check_row_order=False)
+
+
+def test_filters_stay_after_outer_joins():
+    """Filters on the frame's columns run after a right or full join."""
+    for how, height in [("right", 1), ("full", 2)]:
+        df = _events()
+        df.hopper.add_joins(_users(), on="uid", how=how)
+        df.hopper.add_filters(pl.col("n") > 5)
+        assert [step.kind for step in df.hopper.plan()] == ["j", "f"]
+        assert df.hopper.apply_ready_exprs().height == height
+
+
+def test_filter_stays_after_the_addcols_it_reads():
+    """A filter does not move ahead of a join past an addcols it reads from."""
+    df = _events()
+    df.hopper.add_joins(_users(), on="uid")
+    df.hopper.add_addcols(pl.col("n") * 10)
+    df.hopper.add_filters(pl.col("n") > 50)
+    assert [step.kind for step in df.hopper.plan()] == ["j", "a", "f"]
+    assert df.hopper.apply_ready_exprs()["n"].to_list() == [60]
+
+
+def test_aggregating_filter_stays_after_join():
+    """A filter over the whole frame sees the joined rows, not the frame's."""
+    df = _events()
+    df.hopper.add_joins(_users().filter(pl.col("uid") < 3), on="uid")
+    df.hopper.add_filters(pl.col("n") > pl.col("n").mean())
+    out = df.hopper.apply_ready_exprs()
+    assert out["n"].to_list() == [3]
+
+
+def test_lazyframe_join():
+    """Joins apply to LazyFrames, joining with a lazy scan, staying lazy."""
+    lf = _events().lazy()
+    lf.hopper.add_joins(_users().lazy(), on="uid", how="semi")
+    lf.hopper.add_filters(pl.col("n") < 6)
+    out = lf.hopper.apply_ready_exprs()
+    assert isinstance(out, pl.LazyFrame)
+    assert out.collect().to_dict(as_series=False) == {
+        "uid": [1, 1, 2, 3, 4],
+        "n": [1, 2, 3, 4, 5],
+    }
+
+
+def test_parquet_roundtrip(tmp_path):
+    """Pending joins are written to parquet with the plan of their other side."""
+    pytest.importorskip("pyarrow")
+    users = tmp_path / "users.parquet"
+    _users().write_parquet(users)
+    df = pl.DataFrame({"n": [1, 2]})
+    df.hopper.add_joins(pl.scan_parquet(users), on="uid")
+    df.hopper.add_filters(pl.col("age") > 35)
+    path = tmp_path / "events.parquet"
+    df.hopper.write_parquet(str(path))
+    assert isinstance(df.hopper.list_joins()[0], pl.Expr)
+
+    restored = polars_hopper.read_parquet(path)
+    assert len(restored.hopper.list_joins()) == 1
+    out = restored.with_columns(uid=pl.Series([2, 3])).hopper.apply_ready_exprs()
+    assert out.to_dict(as_series=False) == {
+        "n": [1, 2],
+        "uid": [2, 3],
+        "country": ["DE", "FR"],
+        "age": [40, 50],
+    }
+
+
+def test_parquet_stores_the_plan_not_the_data(tmp_path):
+    """A scan is written as its plan, and an in-memory frame to join is refused."""
+    pytest.importorskip("pyarrow")
+    users = tmp_path / "users.parquet"
+    big = pl.DataFrame({"uid": range(200_000), "age": range(200_000)})
+    big.write_parquet(users)
+    df = pl.DataFrame({"n": [1, 2]})
+    df.hopper.add_joins(pl.scan_parquet(users), on="uid")
+    path = tmp_path / "events.parquet"
+    df.hopper.write_parquet(str(path))
+    assert path.stat().st_size < users.stat().st_size / 10
+
+    df.hopper.add_joins(big, on="uid")
+    with pytest.raises(ValueError, match="in-memory frame"):
+        df.hopper.write_parquet(str(tmp_path / "copied.parquet"))
+    assert not (tmp_path / "copied.parquet").exists()
+
+
+def test_joins_are_not_captured_by_specs_or_streamed():
+    """Specs cannot hold joins, and a ready join cannot be applied batch by batch."""
+    df = _events()
+    df.hopper.add_joins(_users(), on="uid")
+    with pytest.raises(ValueError, match="cannot hold joins"):
+        HopperSpec.from_frame(df)
+    with pytest.raises(ValueError, match="batch by batch"):
+        list(df.hopper.apply_batches(batch_size=2))
@@ -0,0 +1,48 @@
+"""Tests for the `.hopper` namespace on Polars LazyFrames."""
+
+import polars as pl
+
+
+def test_lazy_apply_returns_lazy_plan_without_executing():
+    """Ready expressions are appended to the plan, pending ones stay in the hopper."""
+    lf = pl.LazyFrame({"a": [1, 2, 3], "b": [3, 2, 1]})
+    lf.hopper.add_filters(pl.col("a") > 1, pl.col("c") > 4)
+    lf.hopper.add_addcols((pl.col("a") * 2).alias("c"))
+    lf.hopper.add_filters(pl.col("missing") > 0)
+
+    lf2 = lf.hopper.apply_ready_exprs()
+    assert isinstance(lf2, pl.LazyFrame), "Applying on a LazyFrame must stay lazy."
+    assert lf2.collect_schema().names() == ["a", "b", "c"]
+
+    pending = lf2.hopper.list_filters()
+    assert len(pending) == 1 and pending[0].meta.root_names() == ["missing"]
+
+    df = lf2.hopper.collect()
+    assert df["a"].to_list() == [3], "Cascade: addcol 'c' then the filter on 'c'."
+    assert len(df.hopper.list_filters()) == 1, "Pending filter carries to the DF."
+    assert [e.idx for e in df.config_meta.get_metadata()["hopper_expr_register"]] == [3]
+
+
+def test_lazy_apply_matches_eager():
+    """The lazy hopper gives the same result as the eager one."""
+    data = {"x": [5, 1, 4, 2, 3], "y": ["a", "b", "a", "b", "a"]}
+
+    def fill(frame):
+        frame.hopper.add_filters(pl.col("x") > 1, pl.col("x") < pl.col("x").max())
+        frame.hopper.add_selects(pl.col("x"), pl.col("y").alias("z"))
+        return frame
+
+    eager = fill(pl.DataFrame(data)).hopper.apply_ready_exprs()
+    lazy = fill(pl.LazyFrame(data)).hopper.apply_ready_exprs().collect()
+    assert lazy.equals(eager)
+
+
+def test_lazy_filters_push_down_into_scan(tmp_path):
+    """Hopper filters applied to a scan are pushed down into the scan itself."""
+    path = tmp_path / "data.parquet"
+    pl.DataFrame({"a": [1, 2, 3], "b": [3, 2, 1]}).write_parquet(path)
+
+    lf = pl.scan_parquet(path)
+    lf.hopper.add_filters(pl.col("a") > 1)
+    plan = lf.hopper.apply_ready_filters().explain()
+    assert "SELECTION" in plan and not plan.startswith("FILTER"), plan
@@ -0,0 +1,109 @@
+"""Tests for the lifetime tracking, memory report and bound of hopper state."""
+
+import gc
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import polars as pl
+import pytest
+
+import polars_hopper
+from polars_hopper import lifetime
+
+
+@pytest.fixture(autouse=True)
+def unbounded():
+    """Start from collected frames, and lift any bound a test sets."""
+    gc.collect()
+    yield
+    polars_hopper.set_max_hoppers(None)
+
+
+def test_report_counts_and_releases():
+    """Live hoppers and their bytes are reported, and released with the frames."""
+    before = polars_hopper.memory_report()
+    frames = []
+    for _ in range(10):
+        frame = pl.DataFrame({"a": [0]})
+        frame.hopper.add_filters(pl.col("a") > 0, pl.col("b").is_in(list(range(100))))
+        frames.append(frame)
+    report = polars_hopper.memory_report()
+
+    assert report.live_hoppers - before.live_hoppers == 10
+    assert report.registries - before.registries == 10
+    assert report.entries - before.entries == 20
+    assert report.bytes > before.bytes
+
+    del frames, frame
+    gc.collect()
+    assert polars_hopper.memory_report() == before
+
+
+def test_shared_state_counted_once():
+    """Derived frames sharing a registry count as hoppers, but not as more state."""
+    before = polars_hopper.memory_report()
+    df = pl.DataFrame({"a": [0]})
+    df.hopper.add_filters(pl.col("a") > 0, pl.col("b").is_in(list(range(100))))
+    derived = [df.with_columns(pl.lit(i).alias("x")) for i in range(5)]
+    for frame in derived:
+        frame.hopper.list_filters()  # Only frames whose hopper is used are tracked
+    report = polars_hopper.memory_report()
+
+    assert report.live_hoppers - before.live_hoppers == 6
+    assert report.registries - before.registries == 1
+    assert report.entries - before.entries == 2
+    assert len(derived) == 5
+
+
+def test_bound_evicts_least_recently_used():
+    """Over the bound, the least recently used frame's hopper state is dropped."""
+    evicted = polars_hopper.memory_report().evicted
+    polars_hopper.set_max_hoppers(2)
+    first = pl.DataFrame({"a": [0]})
+    first.hopper.add_filters(pl.col("a") > 0, pl.col("b").is_in(list(range(100))))
+    second = pl.DataFrame({"a": [0]})
+    second.hopper.add_filters(pl.col("a") > 0, pl.col("b").is_in(list(range(100))))
+    first.hopper.list_filters()  # Now `second` is the least recently used
+    third = pl.DataFrame({"a": [0]})
+    third.hopper.add_filters(pl.col("a") > 0, pl.col("b").is_in(list(range(100))))
+
+    assert not any(k.startswith("hopper_") for k in second.config_meta.get_metadata())
+    assert len(first.hopper.list_filters()) == 2
+    assert len(third.hopper.list_filters()) == 2
+    # Using an evicted hopper again starts it empty (and evicts another)
+    assert second.hopper.list_filters() == []
+    report = polars_hopper.memory_report()
+    assert report.evicted > evicted
+    assert report.max_hoppers == 2
+    with pytest.raises(ValueError, match="at least 1"):
+        polars_hopper.set_max_hoppers(0)
+
+
+def test_reused_id_does_not_inherit_stale_state():
+    """A frame reusing the id of a collected, unreleased one starts empty."""
+
+    class Gone:
+        pass
+
+    gone = Gone()
+    dead = weakref.ref(gone)
+    del gone
+
+    df = pl.DataFrame({"a": [1, 2]})
+    df.config_meta.update({"hopper_filters": [pl.col("a") > 1]})
+    lifetime._tracked[id(df)] = (dead, df.config_meta.get_metadata())
+
+    assert df.hopper.list_filters() == []
+    assert lifetime._tracked[id(df)][0]() is df
+
+
+def test_unbounded_tracking_takes_no_lock():
+    """Without a bound, using a hopper never waits on the tracking lock."""
+
+    def use_hopper(_):
+        df = pl.DataFrame({"a": [1, 2, 3]})
+        df.hopper.add_filters(pl.col("a") > 1)
+        return df.hopper.apply_ready_exprs()["a"].to_list()
+
+    with ThreadPoolExecutor(max_workers=1) as pool, lifetime._tracking_lock:
+        assert pool.submit(use_hopper, 0).result(timeout=10) == [2, 3]
@@ -6,6 +6,8 @@ import polars as pl
 import pytest
 from polars_config_meta import read_parquet_with_meta
 
+import polars_hopper
+
 
 HAS_PYARROW = False
 try:
@@ -58,3 +60,76 @@ def test_parquet_roundtrip_json(tmp_path):
     # Now apply filters
     df_filtered = df_in.hopper.apply_ready_filters()
     assert df_filtered.shape == (2, 1), "Should remove rows with col <= 5"
+
+
+def _hopper_file(tmp_path):
+    df = pl.DataFrame({"a": [1, 2, 3, 4]})
+    df.hopper.add_filters(pl.col("a") > 1, pl.col("b") < 8)
+    df.hopper.add_addcols((pl.col("a") * 2).alias("b"))
+    df.hopper.add_selects(pl.col("c"))
+    path = tmp_path / "hopper.parquet"
+    df.hopper.write_parquet(str(path))
+    return path
+
+
+@pytest.mark.skipif(not HAS_PYARROW, reason="pyarrow not installed for Parquet")
+def test_read_parquet_restores_every_kind(tmp_path):
+    """`polars_hopper.read_parquet` restores all kinds, the registry and max idx."""
+    df = polars_hopper.read_parquet(_hopper_file(tmp_path))
+    meta = df.config_meta.get_metadata()
+
+    assert not any(key.endswith("_serialised") for key in meta)
+    assert meta["hopper_max_idx"] == 3
+    assert [str(e) for e in df.hopper.list_filters()] == [
+        str(pl.col("a") > 1),
+        str(pl.col("b") < 8),
+    ]
+    assert [str(e) for e in df.hopper.list_addcols()] == [
+        str((pl.col("a") * 2).alias("b")),
+    ]
+    assert [str(e) for e in df.hopper.list_selects()] == [str(pl.col("c"))]
+
+    out = df.hopper.apply_ready_exprs()
+    assert out.to_dict(as_series=False) == {"a": [2, 3], "b": [4, 6]}
+    assert [str(e) for e in out.hopper.list_selects()] == [str(pl.col("c"))]
+    # New expressions continue the idx sequence
+    out.hopper.add_filters(pl.col("a") > 2)
+    assert out.config_meta.get_metadata()["hopper_max_idx"] == 4
+
+
+@pytest.mark.skipif(not HAS_PYARROW, reason="pyarrow not installed for Parquet")
+def test_read_parquet_deserialises_lazily(tmp_path, monkeypatch):
+    """Only the expressions that are applied (or listed) get deserialised."""
+    df = pl.DataFrame({"a": [1, 2, 3]})
+    df.hopper.add_filters(pl.col("a") > 1, *(pl.col("z") > i for i in range(50)))
+    path = tmp_path / "many.parquet"
+    df.hopper.write_parquet(str(path))
+
+    calls = []
+    original = pl.Expr.deserialize
+
+    def counting_deserialize(*args, **kwargs):
+        calls.append(args)
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(pl.Expr, "deserialize", counting_deserialize)
+
+    df_in = polars_hopper.read_parquet(path)
+    assert calls == []
+    out = df_in.hopper.apply_ready_filters()
+    assert out["a"].to_list() == [2, 3]
+    assert len(calls) == 1
+    # Writing back reuses the stored serialisations
+    out.hopper.write_parquet(str(tmp_path / "again.parquet"))
+    assert len(calls) == 1
+    assert len(out.hopper.list_filters()) == 50
+    assert len(calls) == 51
+
+
+@pytest.mark.skipif(not HAS_PYARROW, reason="pyarrow not installed for Parquet")
+def test_scan_parquet_restores_lazy_hopper(tmp_path):
+    """`polars_hopper.scan_parquet` gives a LazyFrame with its hopper."""
+    lf = polars_hopper.scan_parquet(_hopper_file(tmp_path))
+    assert isinstance(lf, pl.LazyFrame)
+    out = lf.hopper.apply_ready_exprs().collect()
+    assert out["b"].to_list() == [4, 6]
@@ -0,0 +1,124 @@
+"""Tests for staged pipelines applying the hopper between (async) stages."""
+
+import asyncio
+import functools
+
+import polars as pl
+import pytest
+
+from polars_hopper import Pipeline, StageStats, fan_out
+
+
+def add_repos(df):
+    """Add repo counts with plain Polars, dropping the metadata (a sync stage)."""
+    return df.with_columns(repos=pl.Series([0, 2, 3, 1, 5, 4][: df.height]))
+
+
+def test_filters_prune_between_stages():
+    """Each stage only sees the rows surviving the filters ready before it."""
+    seen = []
+
+    async def fetch_stars(row):
+        seen.append(row["user"])
+        await asyncio.sleep(0)
+        return {"stars": {"b": 5, "c": 10, "e": 20, "f": 30}[row["user"]]}
+
+    stats = []
+    pipeline = Pipeline(add_repos, fan_out(fetch_stars, concurrency=2))
+    users = pl.DataFrame({"user": ["a", "b", "c", "d", "e", "f"]})
+    users.hopper.add_filters(pl.col("repos") > 1, pl.col("stars") >= 10)
+    out = pipeline.run_sync(users, stats=stats)
+
+    assert sorted(seen) == ["b", "c", "e", "f"]
+    assert out["user"].to_list() == ["c", "e", "f"]
+    assert out.hopper.list_filters() == []
+    assert [(s.stage, s.rows_pruned, s.rows_in, s.calls) for s in stats] == [
+        ("add_repos", 0, 6, 1),
+        ("fetch_stars", 2, 4, 4),
+        ("(final)", 1, 3, 0),
+    ]
+    assert all(isinstance(s, StageStats) for s in stats)
+
+
+def test_concurrency_limit():
+    """No more than `concurrency` calls are in flight at once."""
+    in_flight = []
+    peak = []
+
+    async def slow(row):
+        in_flight.append(row)
+        peak.append(len(in_flight))
+        await asyncio.sleep(0.001)
+        in_flight.remove(row)
+        return {"b": row["a"] * 2}
+
+    df = pl.DataFrame({"a": list(range(20))})
+    out = Pipeline(fan_out(slow, concurrency=3)).run_sync(df)
+    assert max(peak) == 3
+    assert out["b"].to_list() == list(range(0, 40, 2))
+
+
+def test_chunks_and_sync_functions():
+    """Chunked fan-outs keep row order; sync functions run in worker threads."""
+
+    def enrich(chunk):
+        return chunk.with_columns(b=pl.col("a") + 100)
+
+    df = pl.DataFrame({"a": list(range(10))})
+    df.hopper.add_filters(pl.col("b") % 2 == 0)
+    stats = []
+    out = Pipeline(fan_out(enrich, chunk_size=4)).run_sync(df, stats=stats)
+    assert out["b"].to_list() == [100, 102, 104, 106, 108]
+    assert stats[0].calls == 3
+
+
+def test_async_callables():
+    """Callable objects with an async `__call__`, and partials, are awaited."""
+
+    class Lookup:
+        def __init__(self, name):
+            self.name = name
+
+        async def __call__(self, row, offset=0):
+            await asyncio.sleep(0)
+            return {self.name: row["a"] + offset}
+
+    async def lookup(row, offset):
+        await asyncio.sleep(0)
+        return {"c": row["a"] + offset}
+
+    df = pl.DataFrame({"a": [1, 2, 3]})
+    pipeline = Pipeline(
+        fan_out(Lookup("b")),
+        fan_out(functools.partial(lookup, offset=10)),
+        fan_out(functools.partial(Lookup("d"), offset=100)),
+    )
+    out = pipeline.run_sync(df)
+    assert out.to_dict(as_series=False) == {
+        "a": [1, 2, 3],
+        "b": [1, 2, 3],
+        "c": [11, 12, 13],
+        "d": [101, 102, 103],
+    }
+
+
+def test_no_rows_left():
+    """A fan-out with no rows left makes no calls, adding its schema's columns."""
+
+    async def never(row):
+        raise AssertionError("called")
+
+    df = pl.DataFrame({"a": [1, 2]})
+    df.hopper.add_filters(pl.col("a") > 5, pl.col("b") > 0)
+    stage = fan_out(never, schema={"b": pl.Int64})
+    out = asyncio.run(Pipeline(stage).run(df))
+    assert out.schema == pl.Schema({"a": pl.Int64, "b": pl.Int64})
+    assert out.hopper.list_filters() == []
+
+
+def test_invalid_fan_out():
+    """Concurrency and chunk size must be positive."""
+    with pytest.raises(ValueError, match="concurrency"):
+        fan_out(lambda row: row, concurrency=0)
+    with pytest.raises(ValueError, match="chunk_size"):
+        fan_out(lambda row: row, chunk_size=0)
@@ -0,0 +1,59 @@
+"""Tests for planning a hopper's cascade of ready expressions (`df.hopper.plan`)."""
+
+import polars as pl
+
+
+def test_plan_orders_cascade_by_pass_and_idx():
+    """Steps run in idx order per pass; lower idxs made ready later wait a pass."""
+    df = pl.DataFrame({"a": [1, 2, 3, 4]})
+    df.hopper.add_addcols((pl.col("b") * 10).alias("c"))  # idx 0: needs 'b'
+    df.hopper.add_addcols((pl.col("a") + 1).alias("b"))  # idx 1: makes 'b'
+    df.hopper.add_filters(pl.col("c") > 35)  # idx 2: needs 'c'
+    df.hopper.add_filters(pl.col("a") > 1)  # idx 3: ready now
+    df.hopper.add_filters(pl.col("zzz") > 1)  # idx 4: never ready
+    plan = df.hopper.plan()
+
+    assert [(s.idx, s.pass_no) for s in plan] == [(1, 0), (3, 0), (0, 1), (2, 1)]
+    assert plan.pending == [4]
+    assert plan.schema.names() == ["a", "b", "c"]
+    assert plan.dependencies == {1: [], 3: [], 0: [1], 2: [0]}
+    assert plan.to_frame()["idx"].to_list() == [1, 3, 0, 2]
+
+
+def test_plan_does_not_apply_anything():
+    """Planning leaves the frame's hopper and registry untouched."""
+    df = pl.DataFrame({"a": [1, 2, 3, 4]})
+    df.hopper.add_addcols((pl.col("b") * 10).alias("c"), (pl.col("a") + 1).alias("b"))
+    df.hopper.add_filters(pl.col("c") > 35, pl.col("a") > 1, pl.col("zzz") > 1)
+    df.hopper.plan()
+    assert len(df.hopper.list_filters()) == 3
+    assert len(df.hopper.list_addcols()) == 2
+    assert len(df.config_meta.get_metadata()["hopper_expr_register"]) == 5
+
+
+def test_apply_executes_the_plan():
+    """Applying gives the planned result, leaving only the pending idxs."""
+    for fuse in (True, False):
+        df = pl.DataFrame({"a": [1, 2, 3, 4]})
+        df.hopper.add_addcols(
+            (pl.col("b") * 10).alias("c"),
+            (pl.col("a") + 1).alias("b"),
+        )
+        df.hopper.add_filters(pl.col("c") > 35, pl.col("a") > 1, pl.col("zzz") > 1)
+        plan = df.hopper.plan()
+        out = df.hopper.apply_ready_exprs(fuse=fuse)
+        assert out.columns == plan.schema.names()
+        assert out["a"].to_list() == [3, 4]
+        assert out["c"].to_list() == [40, 50]
+        registry = out.config_meta.get_metadata()["hopper_expr_register"]
+        assert [e.idx for e in registry] == plan.pending
+
+
+def test_plan_limits_to_kinds():
+    """Only the requested kinds are planned (so cascades need their producers)."""
+    df = pl.DataFrame({"a": [1, 2, 3, 4]})
+    df.hopper.add_addcols((pl.col("b") * 10).alias("c"), (pl.col("a") + 1).alias("b"))
+    df.hopper.add_filters(pl.col("c") > 35, pl.col("a") > 1, pl.col("zzz") > 1)
+    plan = df.hopper.plan("f")
+    assert [s.idx for s in plan] == [3]
+    assert plan.pending == [2, 4]
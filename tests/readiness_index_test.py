@@ -0,0 +1,58 @@
+"""Tests for the registry's column -> expression readiness index."""
+
+import polars as pl
+
+from polars_hopper.registry import ExprRegistry, RegistryEntry
+
+
+def _registry(*exprs):
+    return ExprRegistry(
+        RegistryEntry.from_expr(idx, "f", expr) for idx, expr in enumerate(exprs)
+    )
+
+
+def test_sync_columns_reports_newly_ready_entries():
+    """Only entries whose last missing column appears become ready."""
+    reg = _registry(
+        pl.col("a") > 0,
+        pl.col("b") > pl.col("c"),
+        pl.col("c") > 0,
+        pl.col("d") > 0,
+    )
+    assert reg.sync_columns(["a"]) == [0], "Initial sync returns all ready entries."
+    assert reg.sync_columns(["a", "b"]) == [], "idx 1 still misses 'c'."
+    assert reg.sync_columns(["a", "b", "c"]) == [1, 2]
+    assert reg.ready() == [0, 1, 2]
+
+    # Columns that disappear make their dependents wait again
+    assert reg.sync_columns(["a", "c"]) == []
+    assert reg.ready() == [0, 2]
+    assert not reg.is_ready(1)
+
+
+def test_readiness_index_follows_append_and_pop():
+    """Entries added or popped after the first sync keep the index consistent."""
+    reg = _registry(pl.col("a") > 0)
+    reg.sync_columns(["a"])
+    reg.append(RegistryEntry.from_expr(1, "f", pl.col("a") < 5))
+    reg.append(RegistryEntry.from_expr(2, "f", pl.col("z") < 5))
+    assert reg.ready() == [0, 1]
+
+    reg.pop(0)
+    assert reg.ready() == [1]
+    assert reg.sync_columns(["a", "z"]) == [2]
+
+    copied = reg.copy()
+    copied.pop(2)
+    assert reg.ready() == [1, 2], "A copy's index is independent of the original."
+
+
+def test_select_drops_columns_needed_later_in_the_same_pass():
+    """An expression whose column is selected away stays pending."""
+    df = pl.DataFrame({"a": [1, 2, 3], "b": [3, 2, 1]})
+    df.hopper.add_selects(pl.col("a"))
+    df.hopper.add_filters(pl.col("b") > 1)
+
+    out = df.hopper.apply_ready_exprs()
+    assert out.columns == ["a"]
+    assert len(out.hopper.list_filters()) == 1, "'b' was dropped before the filter ran."
@@ -0,0 +1,115 @@
+"""Tests for the compact (Arrow IPC) encoding of the expression registry."""
+
+import polars as pl
+import pytest
+
+import polars_hopper
+from polars_hopper.registry import ExprRegistry, ipc_prefix
+
+
+HAS_PYARROW = False
+try:
+    import pyarrow  # noqa: F401
+
+    HAS_PYARROW = True
+except ImportError:
+    pass
+
+
+def _registry(df):
+    return df.config_meta.get_metadata()["hopper_expr_register"]
+
+
+@pytest.mark.parametrize("compression", ["uncompressed", "lz4", "zstd"])
+def test_ipc_roundtrip(compression):
+    """A registry survives Arrow IPC, each expression staying serialised."""
+    df = pl.DataFrame({"a": list(range(10)), "s": ["x", "v1"] * 5})
+    df.hopper.add_filters(
+        pl.col("a") > 1,
+        pl.col("s").is_in([f"v{i}" for i in range(500)]),
+        pl.col("zz") > 1,
+    )
+    df.hopper.add_addcols((pl.col("a") * 2).alias("b"))
+    registry = _registry(df)
+    restored = ExprRegistry.from_ipc(registry.to_ipc(compression))
+
+    entry = next(iter(restored))
+    assert entry._pl_expr is None
+    assert entry.pl_expr.meta.eq(pl.col("a") > 1)
+    assert restored.to_frame().equals(registry.to_frame())
+
+
+def test_encode_is_smaller_and_decodes_either_format():
+    """The IPC encoding is far smaller than JSON, and `decode` reads both."""
+    df = pl.DataFrame({"a": list(range(10)), "s": ["x", "v1"] * 5})
+    df.hopper.add_filters(
+        pl.col("a") > 1,
+        pl.col("s").is_in([f"v{i}" for i in range(500)]),
+        pl.col("zz") > 1,
+    )
+    df.hopper.add_addcols((pl.col("a") * 2).alias("b"))
+    registry = _registry(df)
+    as_json = registry.encode("json")
+    as_ipc = registry.encode("ipc")
+
+    assert as_ipc.startswith(ipc_prefix)
+    assert len(as_ipc) * 3 < len(as_json)
+    for encoded in (as_json, as_ipc):
+        assert ExprRegistry.decode(encoded).to_frame().equals(registry.to_frame())
+    with pytest.raises(ValueError, match="Unknown registry format"):
+        registry.encode("xml")
+
+
+@pytest.mark.skipif(not HAS_PYARROW, reason="pyarrow not installed")
+def test_parquet_binary_format(tmp_path):
+    """`format="binary"` stores only the compact registry, and reads back."""
+    df = pl.DataFrame({"a": list(range(10)), "s": ["x", "v1"] * 5})
+    df.hopper.add_filters(
+        pl.col("a") > 1,
+        pl.col("s").is_in([f"v{i}" for i in range(500)]),
+        pl.col("zz") > 1,
+    )
+    df.hopper.add_addcols((pl.col("a") * 2).alias("b"))
+    json_file, binary_file = tmp_path / "json.parquet", tmp_path / "bin.parquet"
+    df.hopper.write_parquet(str(json_file), format="json")
+    df.hopper.write_parquet(str(binary_file), format="binary")
+
+    assert binary_file.stat().st_size < json_file.stat().st_size
+    # The frame's own hopper is restored after writing
+    assert isinstance(_registry(df), ExprRegistry)
+    assert len(df.hopper.list_filters()) == 3
+
+    df_in = polars_hopper.read_parquet(binary_file)
+    assert [str(e) for e in df_in.hopper.list_filters()] == [
+        str(e) for e in df.hopper.list_filters()
+    ]
+    out = df_in.hopper.apply_ready_exprs()
+    assert out.columns == ["a", "s", "b"]
+    assert out["a"].to_list() == [3, 5, 7, 9]
+    assert [str(e) for e in out.hopper.list_filters()] == [str(pl.col("zz") > 1)]
+
+
+def test_compact_in_memory():
+    """A compacted hopper keeps an encoded registry until it is next used."""
+    df = pl.DataFrame({"a": list(range(10)), "s": ["x", "v1"] * 5})
+    df.hopper.add_filters(
+        pl.col("a") > 1,
+        pl.col("s").is_in([f"v{i}" for i in range(500)]),
+        pl.col("zz") > 1,
+    )
+    df.hopper.add_addcols((pl.col("a") * 2).alias("b"))
+    reference = pl.DataFrame({"a": list(range(10)), "s": ["x", "v1"] * 5})
+    reference.hopper.add_filters(
+        pl.col("a") > 1,
+        pl.col("s").is_in([f"v{i}" for i in range(500)]),
+        pl.col("zz") > 1,
+    )
+    reference.hopper.add_addcols((pl.col("a") * 2).alias("b"))
+    expected = reference.hopper.apply_ready_exprs()
+    df.hopper.compact()
+
+    meta = df.config_meta.get_metadata()
+    assert meta["hopper_expr_register"].startswith(ipc_prefix)
+    assert "hopper_filters" not in meta
+    assert len(df.hopper.list_filters()) == 3
+    assert df.hopper.apply_ready_exprs().equals(expected)
@@ -0,0 +1,104 @@
+"""Tests for `HopperSpec` templates attached to many frames."""
+
+import polars as pl
+import pytest
+
+import polars_hopper
+from polars_hopper import HopperSpec
+
+
+HAS_PYARROW = False
+try:
+    import pyarrow  # noqa: F401
+
+    HAS_PYARROW = True
+except ImportError:
+    pass
+
+
+FILTERS = [pl.col("a") > 1, pl.col("b") < 10, pl.col("zz") > 1]
+ADDCOLS = [(pl.col("a") * 2).alias("b")]
+
+
+def _spec():
+    return HopperSpec(filters=FILTERS, addcols=ADDCOLS)
+
+
+def test_attach_shares_compiled_state():
+    """Attaching stores references to the spec's state, not copies of it."""
+    spec = _spec()
+    df = spec.attach(pl.DataFrame({"a": [1, 2, 3]}))
+    meta = df.config_meta.get_metadata()
+
+    assert meta["hopper_expr_register"] is spec.registry
+    assert meta["hopper_filters"] is spec.lists["f"]
+    assert meta["hopper_max_idx"] == 3
+    assert repr(spec) == "HopperSpec(f=3, s=0, a=1, g=0, j=0)"
+
+
+def test_attached_apply_matches_added():
+    """Each attached frame applies as if its expressions were added to it."""
+    spec = _spec()
+    for values in ([1, 2, 3, 7], [5, 6, 0]):
+        out = spec.attach(pl.DataFrame({"a": values})).hopper.apply_ready_exprs()
+        added = pl.DataFrame({"a": values})
+        added.hopper.add_filters(*FILTERS)
+        added.hopper.add_addcols(*ADDCOLS)
+        expected = added.hopper.apply_ready_exprs()
+        assert out.equals(expected)
+        assert [str(e) for e in out.hopper.list_filters()] == [str(FILTERS[2])]
+
+    # The spec itself is never mutated
+    assert len(spec) == 4
+    assert spec.registry.version == 0
+
+
+def test_plan_built_once_per_schema(monkeypatch):
+    """Frames of the same schema share the spec's plan."""
+    calls = []
+    original = polars_hopper.spec.build_plan
+
+    def counting_build_plan(*args, **kwargs):
+        calls.append(args[1])
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(polars_hopper.spec, "build_plan", counting_build_plan)
+    spec = _spec()
+    for values in ([1, 2], [3, 4], [5, 6]):
+        spec.attach(pl.DataFrame({"a": values})).hopper.apply_ready_exprs()
+    spec.attach(pl.DataFrame({"a": [1.5]})).hopper.apply_ready_exprs()
+    assert len(calls) == 2
+
+
+def test_frame_diverges_from_spec():
+    """Adding to an attached frame's hopper copies it, leaving the spec intact."""
+    spec = _spec()
+    df = spec.attach(pl.DataFrame({"a": [1, 2, 3]}))
+    df.hopper.add_filters(pl.col("a") != 2)
+
+    assert len(spec) == 4
+    assert spec.lists["f"] == FILTERS
+    assert df.hopper.apply_ready_exprs()["a"].to_list() == [3]
+
+
+def test_from_frame_keeps_order():
+    """A spec captured from a hopper keeps its idxs and kinds."""
+    df = pl.DataFrame({"a": [1, 2, 3]})
+    df.hopper.add_addcols(ADDCOLS[0])
+    df.hopper.add_filters(pl.col("b") > 2)
+    spec = HopperSpec.from_frame(df)
+
+    assert [(e.idx, e.kind) for e in spec.registry] == [(0, "a"), (1, "f")]
+    out = spec.attach(pl.DataFrame({"a": [1, 2, 3]})).hopper.apply_ready_exprs()
+    assert out["b"].to_list() == [4, 6]
+
+
+@pytest.mark.skipif(not HAS_PYARROW, reason="pyarrow not installed")
+def test_attached_frame_parquet(tmp_path):
+    """An attached frame writes its hopper to parquet like any other."""
+    df = _spec().attach(pl.DataFrame({"a": [1, 2, 3]}))
+    df.hopper.write_parquet(str(tmp_path / "spec.parquet"))
+    df_in = polars_hopper.read_parquet(tmp_path / "spec.parquet")
+
+    assert len(df_in.hopper.list_filters()) == 3
+    assert df.config_meta.get_metadata()["hopper_spec"] is not None
@@ -0,0 +1,102 @@
+"""Tests for batch-by-batch application (`apply_batches` / `apply_streaming`)."""
+
+import polars as pl
+import pytest
+from polars_config_meta import read_parquet_with_meta
+
+
+HAS_PYARROW = False
+try:
+    import pyarrow  # noqa: F401
+
+    HAS_PYARROW = True
+except ImportError:
+    pass
+
+
+def _hopper(df):
+    df.hopper.add_filters(pl.col("a") % 3 != 0, pl.col("c") > 0)
+    df.hopper.add_addcols((pl.col("a") * 2).alias("b"))
+    df.hopper.add_filters(pl.col("b") > 10)
+    return df
+
+
+def _source():
+    return pl.DataFrame({"a": list(range(50))})
+
+
+@pytest.mark.parametrize(
+    "make_source",
+    [
+        lambda df: df,
+        lambda df: df.lazy(),
+        lambda df: iter(list(df.iter_slices(7))),
+    ],
+    ids=["dataframe", "lazyframe", "iterable"],
+)
+def test_batches_match_whole_frame(make_source):
+    """Applying batch by batch gives the same rows as applying to the whole frame."""
+    expected = _hopper(_source()).hopper.apply_ready_exprs()
+
+    template = _hopper(pl.DataFrame(schema={"a": pl.Int64}))
+    batches = list(
+        template.hopper.apply_batches(make_source(_source()), batch_size=7),
+    )
+
+    assert len(batches) > 1
+    assert pl.concat(batches).equals(expected)
+
+
+def test_pending_metadata_carries_through():
+    """Each output batch carries the still-pending expressions; the hopper is intact."""
+    template = _hopper(pl.DataFrame(schema={"a": pl.Int64}))
+    batches = list(template.hopper.apply_batches(_source(), batch_size=20))
+
+    for batch in batches:
+        assert [str(e) for e in batch.hopper.list_filters()] == [
+            str(pl.col("c") > 0),
+        ]
+        assert batch.hopper.list_addcols() == []
+        assert batch.config_meta.get_metadata()["hopper_max_idx"] == 3
+    assert len(template.hopper.list_filters()) == 3
+    # Mutating one batch's hopper leaves the others' alone
+    batches[0].hopper.apply_ready_exprs()
+    batches[0].hopper.pop_expr_from_registry(pl.col("c") > 0)
+    assert len(batches[1].config_meta.get_metadata()["hopper_expr_register"]) == 1
+
+
+def test_lazyframe_streams_its_own_query():
+    """Without a source, a LazyFrame's hopper streams its own query."""
+    lf = pl.LazyFrame({"a": list(range(10))})
+    lf.hopper.add_filters(pl.col("a") > 4)
+    rows = []
+    assert lf.hopper.apply_streaming(None, rows.append, batch_size=3) == 5
+    assert pl.concat(rows)["a"].to_list() == [5, 6, 7, 8, 9]
+
+
+@pytest.mark.parametrize(
+    "expr",
+    [pl.col("a") > pl.col("a").mean(), pl.col("a").cum_sum() > 3],
+)
+def test_whole_frame_expressions_rejected(expr):
+    """Expressions needing the whole frame are rejected when the plan is built."""
+    template = pl.DataFrame(schema={"a": pl.Int64})
+    template.hopper.add_filters(expr)
+
+    with pytest.raises(ValueError, match="need the whole frame"):
+        template.hopper.apply_batches(pl.LazyFrame(schema={"a": pl.Int64}))
+    with pytest.raises(ValueError, match="need the whole frame"):
+        template.hopper.apply_batches(_source(), batch_size=10)
+
+
+@pytest.mark.skipif(not HAS_PYARROW, reason="pyarrow not installed for Parquet")
+def test_apply_streaming_to_directory(tmp_path):
+    """Batches are written as parquet parts, each with the hopper metadata."""
+    template = _hopper(pl.DataFrame(schema={"a": pl.Int64}))
+    rows = template.hopper.apply_streaming(_source(), tmp_path / "out", batch_size=20)
+
+    parts = sorted((tmp_path / "out").glob("*.parquet"))
+    assert len(parts) == 3
+    assert rows == pl.scan_parquet(tmp_path / "out" / "*.parquet").collect().height
+    meta = read_parquet_with_meta(str(parts[0])).config_meta.get_metadata()
+    assert len(meta["hopper_filters_serialised"][0]) == 1
@@ -0,0 +1,129 @@
+"""Stress tests of hopper state shared between threads."""
+
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import polars as pl
+import pytest
+
+from polars_hopper import HopperSpec
+
+
+THREADS = 8
+
+pytestmark = [
+    pytest.mark.filterwarnings("error::pytest.PytestUnraisableExceptionWarning"),
+    # polars-config-meta's cleanup of collected frames is not thread-safe (see
+    # `polars_hopper.locking`)
+    pytest.mark.filterwarnings(
+        "ignore:Exception ignored in.*ConfigMetaPlugin._cleanup"
+        ":pytest.PytestUnraisableExceptionWarning",
+    ),
+]
+
+
+@pytest.fixture(autouse=True)
+def frequent_switches():
+    """Switch threads as often as possible, to provoke any race."""
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+
+def _run(func, n=THREADS):
+    with ThreadPoolExecutor(max_workers=n) as pool:
+        return list(pool.map(func, range(n)))
+
+
+def test_concurrent_adds_are_not_lost():
+    """Adds from many threads to one frame all land, each with its own idx."""
+    df = pl.DataFrame({"a": [1, 2, 3]})
+
+    def add(t):
+        for i in range(50):
+            df.hopper.add_filters(pl.col("a") != t * 1000 + i)
+
+    _run(add)
+    registry = df.config_meta.get_metadata()["hopper_expr_register"]
+    assert len(df.hopper.list_filters()) == THREADS * 50
+    assert [e.idx for e in registry] == list(range(THREADS * 50))
+    assert df.config_meta.get_metadata()["hopper_max_idx"] == THREADS * 50 - 1
+
+
+def test_frames_derived_during_adds_see_whole_adds():
+    """A frame derived while another thread adds sees its list and registry agree."""
+    df = pl.DataFrame({"a": [1, 2, 3]})
+
+    def add_or_derive(t):
+        mismatches = 0
+        for i in range(300):
+            if t % 2:
+                df.hopper.add_filters(pl.col("a") != t * 1000 + i)
+                continue
+            derived = df.hopper.with_columns(b=pl.lit(i))
+            # Each expression added bumps the version once
+            listed = len(derived.hopper.list_filters())
+            mismatches += listed != derived.hopper.version
+        return mismatches
+
+    assert _run(add_or_derive) == [0] * THREADS
+
+
+def test_concurrent_applies_pop_once():
+    """Applying one frame from many threads consumes each expression once."""
+    df = pl.DataFrame({"a": list(range(100))})
+    df.hopper.add_filters(*(pl.col("a") != i for i in range(0, 100, 2)))
+    df.hopper.add_addcols((pl.col("a") * 2).alias("b"))
+
+    results = _run(lambda _: df.hopper.apply_ready_exprs())
+    applied = [out for out in results if out is not df]
+    assert len(applied) == 1
+    assert applied[0]["a"].to_list() == list(range(1, 100, 2))
+    assert applied[0].columns == ["a", "b"]
+    assert df.hopper.list_filters() == []
+    assert len(df.config_meta.get_metadata()["hopper_expr_register"]) == 0
+
+
+def test_concurrent_pipelines_on_shared_state():
+    """Threads deriving from, adding to and applying shared hoppers stay isolated."""
+    base = pl.DataFrame({"a": list(range(20))})
+    base.hopper.add_filters(pl.col("a") > 1, pl.col("b") < 30)
+    spec = HopperSpec(
+        filters=[pl.col("a") < 15], addcols=[(pl.col("a") * 2).alias("b")]
+    )
+
+    def pipeline(t):
+        outs = []
+        for i in range(20):
+            derived = base.hopper.with_columns((pl.col("a") * 2).alias("b"))
+            derived.hopper.add_filters(pl.col("a") != t)
+            outs.append(derived.hopper.apply_ready_exprs()["a"].to_list())
+            attached = spec.attach(pl.DataFrame({"a": [i, t, 20]}))
+            outs.append(attached.hopper.apply_ready_exprs()["a"].to_list())
+        return t, outs
+
+    for t, outs in _run(pipeline):
+        for i in range(20):
+            assert outs[2 * i] == [a for a in range(2, 15) if a != t]
+            assert outs[2 * i + 1] == [a for a in (i, t) if a < 15]
+    assert len(base.hopper.list_filters()) == 2
+
+
+def test_unrelated_hoppers_do_not_wait_on_each_other(tmp_path):
+    """Each hopper has its own lock, shared with the frames derived from it."""
+    pytest.importorskip("pyarrow")
+    busy = pl.DataFrame({"a": [1, 2]})
+    busy.hopper.add_filters(pl.col("a") > 1)
+    derived = busy.with_columns(b=pl.lit(0))
+    lock = busy.config_meta.get_metadata()["hopper_lock"]
+    assert derived.config_meta.get_metadata()["hopper_lock"] is lock
+
+    def use_another(_):
+        df = pl.DataFrame({"a": [1, 2, 3]})
+        df.hopper.add_filters(pl.col("a") > 1)
+        df.hopper.write_parquet(str(tmp_path / "other.parquet"))
+        return df.hopper.apply_ready_exprs()["a"].to_list()
+
+    with lock, ThreadPoolExecutor(max_workers=1) as pool:
+        assert pool.submit(use_another, 0).result(timeout=10) == [2, 3]